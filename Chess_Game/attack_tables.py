@@ -0,0 +1,111 @@
+"""
+This module contains the attack and ray tables of every square, they are built once when the module is imported
+Facilitates the following:
+- Knight and king target squares, as (row, col) lists and as bitboards
+- Pawn attack bitboards for pawns moving up and down the board
+- The ordered sliding rays going out of each square in the 8 directions, as square lists and as bitboards
+- The squares between two squares that share a row, column or diagonal
+- Looking up rook, bishop and queen attacks by cutting the rays at the first blocker
+
+Note: squares are bit indices (row * 8 + col) and directions are the bit offsets defined in bitboard.py
+"""
+
+from bitboard import UP, DOWN, LEFT, RIGHT, UP_LEFT, UP_RIGHT, DOWN_LEFT, DOWN_RIGHT
+
+# (row offset, col offset) of one step in each direction
+_STEPS = {UP: (-1, 0), DOWN: (1, 0), LEFT: (0, -1), RIGHT: (0, 1),
+          UP_LEFT: (-1, -1), UP_RIGHT: (-1, 1), DOWN_LEFT: (1, -1), DOWN_RIGHT: (1, 1)}
+_KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, 1), (2, -1))
+
+
+def _targets(row, col, offsets):
+    return [(row + row_change, col + col_change) for row_change, col_change in offsets
+            if 0 <= row + row_change < 8 and 0 <= col + col_change < 8]
+
+
+def _ray(row, col, step):
+    _squares = []
+    row, col = row + step[0], col + step[1]
+    while 0 <= row < 8 and 0 <= col < 8:
+        _squares.append(row * 8 + col)
+        row, col = row + step[0], col + step[1]
+    return tuple(_squares)
+
+
+def _to_bitboard(targets):
+    _bitboard = 0
+    for row, col in targets:
+        _bitboard |= 1 << (row * 8 + col)
+    return _bitboard
+
+
+KNIGHT_TARGETS = [_targets(square // 8, square % 8, _KNIGHT_OFFSETS) for square in range(64)]
+KING_TARGETS = [_targets(square // 8, square % 8, _STEPS.values()) for square in range(64)]
+KNIGHT_ATTACKS = [_to_bitboard(targets) for targets in KNIGHT_TARGETS]
+KING_ATTACKS = [_to_bitboard(targets) for targets in KING_TARGETS]
+
+# PAWN_ATTACKS[forward][square], forward is UP for the player at the bottom and DOWN for the one at the top
+PAWN_ATTACKS = {
+    UP: [_to_bitboard(_targets(square // 8, square % 8, ((-1, -1), (-1, 1)))) for square in range(64)],
+    DOWN: [_to_bitboard(_targets(square // 8, square % 8, ((1, -1), (1, 1)))) for square in range(64)],
+}
+
+# RAYS[square][direction] is the tuple of squares from the closest to the furthest one
+RAYS = [{direction: _ray(square // 8, square % 8, step) for direction, step in _STEPS.items()}
+        for square in range(64)]
+RAY_MASKS = [{direction: sum(1 << ray_square for ray_square in ray) for direction, ray in rays.items()}
+             for rays in RAYS]
+
+# BETWEEN[a][b] holds the squares strictly between a and b, it is empty when they are not on a common ray
+BETWEEN = [[0] * 64 for _ in range(64)]
+for _square in range(64):
+    for _ray_squares in RAYS[_square].values():
+        for _i, _ray_square in enumerate(_ray_squares):
+            BETWEEN[_square][_ray_square] = sum(1 << between_square for between_square in _ray_squares[:_i])
+
+
+def first_blocker(square, direction, occupied):
+    """
+    returns the closest occupied square on the ray, or -1 if the ray is empty
+    rays in a positive direction go towards higher squares, so the closest blocker is the lowest bit
+    """
+    blockers = RAY_MASKS[square][direction] & occupied
+    if not blockers:
+        return -1
+    if direction > 0:
+        return (blockers & -blockers).bit_length() - 1
+    return blockers.bit_length() - 1
+
+
+def ray_attacks(square, direction, occupied):
+    """
+    returns the squares a slider attacks in one direction, up to and including the first blocker
+    """
+    ray = RAY_MASKS[square][direction]
+    blocker = first_blocker(square, direction, occupied)
+    if blocker >= 0:
+        ray ^= RAY_MASKS[blocker][direction]
+    return ray
+
+
+def rook_attacks(square, occupied):
+    """
+    returns the squares a rook attacks from the square
+    """
+    return ray_attacks(square, UP, occupied) | ray_attacks(square, DOWN, occupied) | \
+        ray_attacks(square, LEFT, occupied) | ray_attacks(square, RIGHT, occupied)
+
+
+def bishop_attacks(square, occupied):
+    """
+    returns the squares a bishop attacks from the square
+    """
+    return ray_attacks(square, UP_LEFT, occupied) | ray_attacks(square, UP_RIGHT, occupied) | \
+        ray_attacks(square, DOWN_LEFT, occupied) | ray_attacks(square, DOWN_RIGHT, occupied)
+
+
+def queen_attacks(square, occupied):
+    """
+    returns the squares a queen attacks from the square
+    """
+    return rook_attacks(square, occupied) | bishop_attacks(square, occupied)
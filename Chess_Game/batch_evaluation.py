@@ -0,0 +1,200 @@
+"""
+This module contains the batched position evaluation, whole arrays of positions scored with NumPy at once, run it
+from the command line to measure the positions per second
+Facilitates the following:
+- Converting GameState boards into the int8 board layout of batch_playouts, one row of 64 squares per position
+- Material and piece-square values tapered by the game phase, the same tables and the same taper as
+  GameState.evaluate, so for a position this part is its score, mobility and king safety come on top of it
+- A mobility proxy: the empty squares next to every rook, bishop and queen in its directions and the empty squares
+  a knight jumps to, counting what is behind the first square would cost more than it tells in a batch
+- King safety: own pawns in front of the king and enemy pieces near it, both counted in the middlegame only
+- Scoring the positions in chunks, so a million positions don't need gigabytes of temporaries
+
+Note: every score is in centipawns and positive when white is better, like GameState.evaluate
+
+Usage: python batch_evaluation.py [--positions 1000000] [--games 1000] [--plies 40]
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import evaluation
+from batch_playouts import BoardBatch, START_FEN, EMPTY, ROOK, KNIGHT, BISHOP, QUEEN, KING, PAWN
+from enums import Player
+
+# centipawns for every empty square a piece reaches in one step (one jump for a knight)
+MOBILITY_WEIGHTS = {KNIGHT: 4, BISHOP: 5, ROOK: 3, QUEEN: 2}
+SHIELD_BONUS = 12  # for every own pawn on the three squares in front of the king
+ZONE_PENALTY = 8  # for every enemy knight, bishop, rook or queen within two squares of the king
+CHUNK_SIZE = 1 << 12  # small enough for the temporaries of a chunk to stay in the cache
+
+ORTHOGONAL_STEPS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+DIAGONAL_STEPS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+KNIGHT_STEPS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+
+
+def _code_table(tables):
+    """
+    returns the values of the tables of Player.PIECES (12 x 64) as a 13 x 64 array indexed by square value + 6
+    """
+    table = np.zeros((13, 64), dtype=np.int32)
+    for index, values in enumerate(tables):
+        kind = index % 6 + 1
+        table[6 + (kind if index < 6 else -kind)] = values
+    return table
+
+
+def _step_weights(kinds):
+    """
+    returns the mobility weights of the kinds by square value + 6, negative for black
+    """
+    weights = np.zeros(13, dtype=np.int16)
+    for kind in kinds:
+        weights[6 + kind] = MOBILITY_WEIGHTS[kind]
+        weights[6 - kind] = -MOBILITY_WEIGHTS[kind]
+    return weights
+
+
+KNIGHT_STEP_WEIGHTS = _step_weights((KNIGHT,))
+ORTHOGONAL_STEP_WEIGHTS = _step_weights((ROOK, QUEEN))
+DIAGONAL_STEP_WEIGHTS = _step_weights((BISHOP, QUEEN))
+MIDDLEGAME_TABLE = _code_table(evaluation.MIDDLEGAME)
+ENDGAME_TABLE = _code_table(evaluation.ENDGAME)
+PHASE_TABLE = _code_table([[weight] * 64 for weight in evaluation.PHASE_WEIGHTS])[:, 0]
+
+# SHIELD_TABLE[0][square] are the three squares in front of a white king on square (up the board), [1] a black one's,
+# and ZONE_TABLE[square] the squares within two squares of it, both padded with square 64
+SHIELD_TABLE = np.array([[[(square // 8 + forward) * 8 + col if 0 <= square // 8 + forward < 8 and 0 <= col < 8
+                           else 64 for col in range(square % 8 - 1, square % 8 + 2)] for square in range(64)]
+                         for forward in (-1, 1)], dtype=np.intp)
+ZONE_TABLE = np.zeros((64, 65), dtype=bool)
+for _square in range(64):
+    for _other in range(64):
+        ZONE_TABLE[_square, _other] = 0 < max(abs(_square // 8 - _other // 8), abs(_square % 8 - _other % 8)) <= 2
+ZONE_TABLE = ZONE_TABLE[:, :64]
+
+
+def board_tensor(game_state):
+    """
+    returns the game state's board as 64 int8 squares in the layout of batch_playouts
+    """
+    tensor = np.zeros(64, dtype=np.int8)
+    for row in range(8):
+        for col in range(8):
+            piece = game_state.board[row][col]
+            if piece != Player.EMPTY:
+                index = piece.get_piece_index()
+                tensor[row * 8 + col] = index % 6 + 1 if index < 6 else -(index % 6 + 1)
+    return tensor
+
+
+def stack_boards(game_states):
+    """
+    returns the boards of the game states as an (N, 64) int8 array
+    """
+    return np.stack([board_tensor(game_state) for game_state in game_states]) if game_states else \
+        np.zeros((0, 64), dtype=np.int8)
+
+
+def _neighbour_counts(mask, steps):
+    """
+    returns for every square of the (N, 8, 8) mask how many of the squares a step away are set
+    """
+    padded = np.pad(mask, ((0, 0), (2, 2), (2, 2)))
+    counts = np.zeros(mask.shape, dtype=np.int8)
+    for row_step, col_step in steps:
+        counts += padded[:, 2 + row_step:10 + row_step, 2 + col_step:10 + col_step]
+    return counts
+
+
+def piece_square_scores(boards):
+    """
+    returns (middlegame score, endgame score, phase) arrays of the (N, 64) boards
+    """
+    codes = boards.astype(np.intp) + 6
+    squares = np.arange(64)
+    return (MIDDLEGAME_TABLE[codes, squares].sum(axis=1), ENDGAME_TABLE[codes, squares].sum(axis=1),
+            PHASE_TABLE[codes].sum(axis=1))
+
+
+def mobility(boards):
+    """
+    returns the mobility proxy of the (N, 64) boards, white's minus black's
+    every square is weighted by what its piece gets for an empty square in each kind of step (a queen gets its
+    weight for both the orthogonal and the diagonal steps), so no piece kind has to be picked out
+    """
+    squares = boards.reshape(-1, 8, 8)
+    empty = squares == EMPTY
+    codes = squares.astype(np.intp) + 6
+    score = np.zeros(squares.shape, dtype=np.int16)
+    for weights, steps in ((KNIGHT_STEP_WEIGHTS, KNIGHT_STEPS), (ORTHOGONAL_STEP_WEIGHTS, ORTHOGONAL_STEPS),
+                           (DIAGONAL_STEP_WEIGHTS, DIAGONAL_STEPS)):
+        score += weights[codes] * _neighbour_counts(empty, steps)
+    return score.reshape(len(boards), 64).sum(axis=1, dtype=np.int32)
+
+
+def king_safety(boards):
+    """
+    returns the king safety of the (N, 64) boards, white's minus black's, for the middlegame
+    """
+    padded = np.pad(boards, ((0, 0), (0, 1)))
+    rows = np.arange(len(boards))[:, None]
+    pieces = np.abs(boards)
+    attackers = (pieces >= ROOK) & (pieces <= QUEEN)
+    score = np.zeros(len(boards), dtype=np.int32)
+    for sign, forward in ((1, 0), (-1, 1)):
+        kings = np.argmax(boards == sign * KING, axis=1)
+        shield = (padded[rows, SHIELD_TABLE[forward, kings]] == sign * PAWN).sum(axis=1)
+        near = (attackers & (boards * sign < 0) & ZONE_TABLE[kings]).sum(axis=1)
+        score += sign * (shield * SHIELD_BONUS - near * ZONE_PENALTY)
+    return score
+
+
+def taper(middlegame, endgame, phase):
+    """
+    returns the scores between the middlegame and endgame score arrays by the phases, like evaluation.taper
+    """
+    phase = np.minimum(phase, evaluation.TOTAL_PHASE)
+    return (middlegame * phase + endgame * (evaluation.TOTAL_PHASE - phase)) // evaluation.TOTAL_PHASE
+
+
+def _evaluate_chunk(boards):
+    middlegame, endgame, phase = piece_square_scores(boards)
+    return taper(middlegame, endgame, phase) + taper(king_safety(boards), 0, phase) + mobility(boards)
+
+
+def evaluate_batch(positions, chunk_size=CHUNK_SIZE):
+    """
+    returns the evaluations of the positions as a float array, positions is an int8 array of boards, (N, 64) or
+    (N, 8, 8), like the board of a BoardBatch or the result of stack_boards
+    """
+    boards = np.asarray(positions, dtype=np.int8).reshape(-1, 64)
+    scores = np.empty(len(boards), dtype=np.float64)
+    for start in range(0, len(boards), chunk_size):
+        scores[start:start + chunk_size] = _evaluate_chunk(boards[start:start + chunk_size])
+    return scores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate positions in a batch and measure the positions per second")
+    parser.add_argument("--positions", type=int, default=1000000, help="positions to evaluate")
+    parser.add_argument("--games", type=int, default=1000, help="random games the positions are taken from")
+    parser.add_argument("--plies", type=int, default=40, help="half moves of the random games")
+    args = parser.parse_args(argv)
+
+    batch = BoardBatch.from_fens([START_FEN] * args.games)
+    batch.play(args.plies, np.random.default_rng(0))
+    positions = np.resize(batch.board, (args.positions, 64))
+    start = time.perf_counter()
+    scores = evaluate_batch(positions)
+    seconds = time.perf_counter() - start
+    print("positions {}  mean {:.1f}  {:.2f}s  {:,.0f} positions/s".format(
+        len(scores), scores.mean(), seconds, len(scores) / seconds))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
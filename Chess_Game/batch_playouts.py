@@ -0,0 +1,411 @@
+"""
+This module contains the batched random playouts, thousands of games played at once with NumPy arrays instead of
+one GameState at a time, run it from the command line to measure the games per second
+Facilitates the following:
+- BoardBatch: the boards of N games as an (N, 64) int8 array with one entry per square (row * 8 + col), and the
+  side to move, castling rights, en passant square, half move clock, move number and status as arrays of N
+- Generating the pseudo-legal moves of all games together, by piece kind: knight and king target tables, sliding
+  rays cut at their first blocker, pawn pushes, captures and promotions, and castling
+- Keeping the legal ones: every move is made on a copy of its board and dropped when it leaves the mover's king
+  attacked
+- Advancing every game that isn't over by one random legal move per step, and finding checkmate and stalemate
+- Converting between the batch and FEN strings or GameState objects
+
+Note: a square holds 0 when it is empty, otherwise the kind of its piece (the index in Player.PIECES % 6 + 1,
+      so ROOK to PAWN below) positive for white and negative for black, white plays up the board like in GameState
+      a game that reaches the ply limit of play is left ONGOING, the same draws as GameState are known (none by
+      repetition or the fifty move rule)
+
+Usage: python batch_playouts.py [--games 1000] [--plies 200] [--fen FEN] [--seed N]
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import attack_tables
+from bitboard import ROOK_DIRECTIONS, BISHOP_DIRECTIONS
+from chess_engine import GameState
+from enums import GameStatus
+
+EMPTY, ROOK, KNIGHT, BISHOP, QUEEN, KING, PAWN = range(7)
+PIECE_LETTERS = " rnbqkp"
+PROMOTIONS = (QUEEN, ROOK, BISHOP, KNIGHT)
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+OFF_BOARD = 64  # the tables are padded with this square, a padded board holds 0 there
+
+
+def _padded_table(rows, width):
+    return np.array([list(row) + [OFF_BOARD] * (width - len(row)) for row in rows], dtype=np.intp)
+
+
+KNIGHT_TABLE = _padded_table([[row * 8 + col for row, col in targets] for targets in attack_tables.KNIGHT_TARGETS], 8)
+KING_TABLE = _padded_table([[row * 8 + col for row, col in targets] for targets in attack_tables.KING_TARGETS], 8)
+# RAY_TABLE[square, direction] holds the squares of the ray from the closest one, the rook directions come first
+RAY_TABLE = np.stack([_padded_table([attack_tables.RAYS[square][direction] for direction in
+                                     ROOK_DIRECTIONS + BISHOP_DIRECTIONS], 7) for square in range(64)])
+# DIRECTION[a, b] is the ray of RAY_TABLE[a] that b is on, -1 when it isn't on any, only a piece moving away from
+# a square on a ray of the king can uncover an attack on it, and only along that ray
+DIRECTION = np.full((64, 65), -1, dtype=np.intp)
+DIRECTION[np.arange(64)[:, None, None], RAY_TABLE] = np.arange(8)[None, :, None]
+DIRECTION = DIRECTION[:, :64]
+SLIDER_DIRECTIONS = np.zeros((7, 8), dtype=bool)  # which of the rays a piece kind slides along
+SLIDER_DIRECTIONS[ROOK, :4] = SLIDER_DIRECTIONS[BISHOP, 4:] = SLIDER_DIRECTIONS[QUEEN] = True
+# PAWN_TARGETS[0][square] are the squares a white pawn on square takes on (up the board), [1] a black pawn's
+PAWN_TARGETS = np.stack([
+    _padded_table([[square + step for step in steps if 0 <= square + step < 64 and
+                    abs((square + step) % 8 - square % 8) == 1] for square in range(64)], 2)
+    for steps in ((-9, -7), (7, 9))])
+
+# castling: (white to move, king side) -> (FEN letter, king square, rook square, squares to be empty, square the
+# king crosses), the castling array's columns follow the letters
+CASTLING_LETTERS = "KQkq"
+CASTLES = [(60, 63, (61, 62), 61), (60, 56, (59, 58, 57), 59), (4, 7, (5, 6), 5), (4, 0, (3, 2, 1), 3)]
+# CASTLING_KEPT[square] are the rights that survive a move from or to the square
+CASTLING_KEPT = np.ones((65, 4), dtype=bool)
+for _right, (_king, _rook, _, _) in enumerate(CASTLES):
+    CASTLING_KEPT[_king, _right] = CASTLING_KEPT[_rook, _right] = False
+
+
+def _pad(boards):
+    """
+    returns the boards with an empty 65th square, where the padding of the tables points
+    """
+    return np.pad(boards, ((0, 0), (0, 1)))
+
+
+def attacked(boards, squares, by_white):
+    """
+    returns for every board (M, 64) whether its square is attacked by white's pieces (by_white True) or black's
+    """
+    padded = _pad(boards)
+    sign = np.where(by_white, 1, -1).astype(np.int8)
+    games = np.arange(len(boards))[:, None]
+    result = (padded[games, KNIGHT_TABLE[squares]] == (sign * KNIGHT)[:, None]).any(axis=1)
+    result |= (padded[games, KING_TABLE[squares]] == (sign * KING)[:, None]).any(axis=1)
+    # a white pawn attacks the square from where a black pawn on it would take, and the other way round
+    result |= (padded[games, PAWN_TARGETS[by_white.astype(np.intp), squares]] == (sign * PAWN)[:, None]).any(axis=1)
+    rays = padded[games[:, :, None], RAY_TABLE[squares]]  # (M, 8, 7)
+    first = np.take_along_axis(rays, np.argmax(rays != 0, axis=2)[:, :, None], axis=2)[:, :, 0] * sign[:, None]
+    result |= ((first[:, :4] == ROOK) | (first[:, :4] == QUEEN)).any(axis=1)
+    result |= ((first[:, 4:] == BISHOP) | (first[:, 4:] == QUEEN)).any(axis=1)
+    return result
+
+
+def king_squares(boards, white):
+    """
+    returns the square of the white (white True) or black king of every board
+    """
+    return np.argmax(boards == np.where(white, KING, -KING)[:, None], axis=1)
+
+
+class BoardBatch:
+    """
+    N games kept as NumPy arrays, see the note of the module for the board
+    status holds the GameStatus of every game, white_turn, castling (N, 4) columns KQkq, en_passant (the square
+    behind a pawn that just moved two squares, -1 when there is none), half_move_clock and move_number are the
+    rest of the FEN
+    """
+
+    def __init__(self, count):
+        self.board = np.zeros((count, 64), dtype=np.int8)
+        self.white_turn = np.ones(count, dtype=bool)
+        self.castling = np.zeros((count, 4), dtype=bool)
+        self.en_passant = np.full(count, -1, dtype=np.int8)
+        self.half_move_clock = np.zeros(count, dtype=np.int16)
+        self.move_number = np.ones(count, dtype=np.int16)
+        self.status = np.full(count, GameStatus.ONGOING, dtype=np.int8)
+
+    def __len__(self):
+        return len(self.board)
+
+    @classmethod
+    def from_fens(cls, fens):
+        """
+        returns a batch with one game for every FEN string
+        """
+        batch = cls(len(fens))
+        for index, fen in enumerate(fens):
+            fields = fen.split() + ["-", "-", "0", "1"][len(fen.split()) - 2:]
+            square = 0
+            for char in fields[0].replace("/", ""):
+                if char.isdigit():
+                    square += int(char)
+                    continue
+                kind = PIECE_LETTERS.index(char.lower())
+                batch.board[index, square] = kind if char.isupper() else -kind
+                square += 1
+            batch.white_turn[index] = fields[1] == "w"
+            batch.castling[index] = [letter in fields[2] for letter in CASTLING_LETTERS]
+            if fields[3] != "-":
+                batch.en_passant[index] = (8 - int(fields[3][1])) * 8 + "abcdefgh".index(fields[3][0])
+            batch.half_move_clock[index] = int(fields[4])
+            batch.move_number[index] = int(fields[5])
+        return batch
+
+    @classmethod
+    def from_game_state(cls, game_state, count):
+        """
+        returns a batch of count games from the game state's position
+        """
+        return cls.from_fens([game_state.to_fen()] * count)
+
+    def fen(self, index):
+        """
+        returns the FEN string of one game
+        """
+        ranks = []
+        for row in range(8):
+            rank_text = ""
+            empty = 0
+            for piece in self.board[index, row * 8:row * 8 + 8]:
+                if piece == EMPTY:
+                    empty += 1
+                    continue
+                if empty:
+                    rank_text += str(empty)
+                    empty = 0
+                letter = PIECE_LETTERS[abs(piece)]
+                rank_text += letter.upper() if piece > 0 else letter
+            ranks.append(rank_text + (str(empty) if empty else ""))
+        castling = "".join(letter for letter, right in zip(CASTLING_LETTERS, self.castling[index]) if right)
+        square = self.en_passant[index]
+        en_passant = "-" if square < 0 else "abcdefgh"[square % 8] + str(8 - square // 8)
+        return " ".join(["/".join(ranks), "w" if self.white_turn[index] else "b", castling or "-", en_passant,
+                         str(self.half_move_clock[index]), str(self.move_number[index])])
+
+    def game_state(self, index):
+        """
+        returns a GameState with the position of one game
+        """
+        return GameState.from_fen(self.fen(index))
+
+    def to_game_states(self):
+        return [self.game_state(index) for index in range(len(self))]
+
+    def pseudo_legal_moves(self, games):
+        """
+        returns (game, starting square, ending square, promotion kind or 0) arrays of the moves of the player to
+        move in the games (indices into the batch), without checking what they leave their king in
+        """
+        boards = self.board[games]
+        padded = _pad(boards)
+        sign = np.where(self.white_turn[games], 1, -1).astype(np.int8)
+        local, squares = np.nonzero(boards * sign[:, None] > 0)
+        kinds = np.abs(boards[local, squares])
+        found = []
+
+        def add(owner, starts, ends, valid, promotion=0):
+            found.append((owner[valid], starts[valid], ends[valid], np.full(valid.sum(), promotion, dtype=np.int8)))
+
+        for kind, table in ((KNIGHT, KNIGHT_TABLE), (KING, KING_TABLE)):
+            chosen = kinds == kind
+            owner = np.repeat(local[chosen], 8)
+            ends = table[squares[chosen]].ravel()
+            add(owner, np.repeat(squares[chosen], 8), ends,
+                (ends != OFF_BOARD) & (padded[owner, ends] * sign[owner] <= 0))
+
+        chosen = (kinds == ROOK) | (kinds == BISHOP) | (kinds == QUEEN)
+        owner = local[chosen]
+        rays = RAY_TABLE[squares[chosen]]  # (K, 8, 7)
+        targets = padded[owner[:, None, None], rays] * sign[owner][:, None, None]
+        occupied = targets != 0
+        # a square is reached when nothing stands before it on the ray and it doesn't hold an own piece
+        reached = (np.cumsum(occupied, axis=2) - occupied == 0) & (targets <= 0) & (rays != OFF_BOARD)
+        reached &= SLIDER_DIRECTIONS[kinds[chosen]][:, :, None]
+        add(np.repeat(owner, 56), np.repeat(squares[chosen], 56), rays.ravel(), reached.ravel())
+
+        chosen = kinds == PAWN
+        owner = local[chosen]
+        starts = squares[chosen]
+        white = sign[owner] > 0
+        one = starts + np.where(white, -8, 8)
+        two = starts + np.where(white, -16, 16)
+        single = boards[owner, one] == 0
+        on_first_row = np.where(white, starts // 8 == 6, starts // 8 == 1)
+        double = single & on_first_row & (padded[owner, np.clip(two, 0, 64)] == 0)
+        side = np.where(white, 0, 1)
+        captures = PAWN_TARGETS[side, starts]  # (K, 2)
+        capture_owner = np.repeat(owner, 2)
+        capture_starts = np.repeat(starts, 2)
+        captures = captures.ravel()
+        en_passant = self.en_passant[games][capture_owner]
+        taking = (captures != OFF_BOARD) & ((padded[capture_owner, captures] * sign[capture_owner] < 0) |
+                                            (captures == en_passant))
+        add(owner, starts, two, double)
+        pushes = [(owner, starts, one, single), (capture_owner, capture_starts, captures, taking)]
+        for pawn_owner, pawn_starts, ends, valid in pushes:
+            last_row = (ends // 8 == 0) | (ends // 8 == 7)
+            add(pawn_owner, pawn_starts, ends, valid & ~last_row)
+            for promotion in PROMOTIONS:
+                add(pawn_owner, pawn_starts, ends, valid & last_row, promotion)
+
+        for right, (king, rook, between, crossed) in enumerate(CASTLES):
+            white_right = right < 2
+            can = self.castling[games, right] & (self.white_turn[games] == white_right)
+            for square in between:
+                can &= boards[:, square] == 0
+            candidates = np.nonzero(can)[0]
+            if len(candidates):
+                by_white = np.full(len(candidates), not white_right)
+                safe = ~attacked(boards[candidates], np.full(len(candidates), king), by_white) & \
+                    ~attacked(boards[candidates], np.full(len(candidates), crossed), by_white)
+                candidates = candidates[safe]
+                destination = king + (2 if rook > king else -2)
+                add(candidates, np.full(len(candidates), king), np.full(len(candidates), destination),
+                    np.ones(len(candidates), dtype=bool))
+
+        owner, starts, ends, promotions = (np.concatenate(arrays) for arrays in zip(*found))
+        return np.asarray(games)[owner], starts, ends, promotions
+
+    def make_moves(self, games, starts, ends, promotions):
+        """
+        returns the boards (M, 64) after each move, made on a copy of its game's board
+        """
+        boards = self.board[games]  # fancy indexing copies
+        rows = np.arange(len(games))
+        pieces = boards[rows, starts]
+        kinds = np.abs(pieces)
+        # a pawn moving sideways to an empty square takes en passant, the pawn it takes is beside it
+        en_passant = (kinds == PAWN) & (starts % 8 != ends % 8) & (boards[rows, ends] == 0)
+        boards[rows[en_passant], (starts // 8 * 8 + ends % 8)[en_passant]] = EMPTY
+        # a king moving two squares castles, the rook jumps over it
+        castle = (kinds == KING) & (np.abs(ends - starts) == 2)
+        rook_starts = np.where(ends > starts, starts + 3, starts - 4)[castle]
+        rook_ends = ((starts + ends) // 2)[castle]
+        castle_rows = rows[castle]
+        boards[castle_rows, rook_ends] = boards[castle_rows, rook_starts]
+        boards[castle_rows, rook_starts] = EMPTY
+        boards[rows, ends] = np.where(promotions > 0, np.sign(pieces) * promotions, pieces)
+        boards[rows, starts] = EMPTY
+        return boards
+
+    def legal_moves(self, games):
+        """
+        returns (game, starting square, ending square, promotion, boards after the move) arrays of the legal moves
+        of the player to move in the games
+        only the moves that can leave the king attacked are checked: king moves, en passant and all moves of a
+        player in check fully, moves from a square on a ray of the king (the piece could be pinned) along that ray
+        """
+        games = np.asarray(games)
+        white = self.white_turn[games]
+        kings = king_squares(self.board[games], white)
+        checked = np.zeros(len(self), dtype=bool)
+        kings_of = np.zeros(len(self), dtype=np.intp)
+        checked[games] = attacked(self.board[games], kings, ~white)
+        kings_of[games] = kings
+
+        games, starts, ends, promotions = self.pseudo_legal_moves(games)
+        boards = self.make_moves(games, starts, ends, promotions)
+        king_move = np.abs(self.board[games, starts]) == KING
+        en_passant = (np.abs(self.board[games, starts]) == PAWN) & (starts % 8 != ends % 8) & \
+            (self.board[games, ends] == EMPTY)
+        legal = np.ones(len(games), dtype=bool)
+        # the king moves, en passant and the moves in check can end in any attack
+        risky = np.nonzero(king_move | en_passant | checked[games])[0]
+        legal[risky] = ~attacked(boards[risky], np.where(king_move[risky], ends[risky], kings_of[games[risky]]),
+                                 ~self.white_turn[games[risky]])
+        # the others only in one along the ray from the king through the starting square
+        directions = DIRECTION[kings_of[games], starts]
+        pinnable = np.nonzero((directions >= 0) & ~king_move & ~en_passant & ~checked[games])[0]
+        rays = RAY_TABLE[kings_of[games[pinnable]], directions[pinnable]]  # (K, 7)
+        pieces = _pad(boards[pinnable])[np.arange(len(pinnable))[:, None], rays]
+        first = np.take_along_axis(pieces, np.argmax(pieces != 0, axis=1)[:, None], axis=1)[:, 0]
+        first = first * np.where(self.white_turn[games[pinnable]], -1, 1).astype(np.int8)  # positive for the enemy
+        slider = np.where(directions[pinnable] < 4, ROOK, BISHOP)
+        legal[pinnable] = (first != slider) & (first != QUEEN)
+        return games[legal], starts[legal], ends[legal], promotions[legal], boards[legal]
+
+    def move_list(self, index):
+        """
+        returns the legal moves of one game like GameState.get_legal_moves_with_promotions does
+        """
+        _, starts, ends, promotions, _ = self.legal_moves(np.array([index]))
+        return [((start // 8, start % 8), (end // 8, end % 8), PIECE_LETTERS[promotion] if promotion else None)
+                for start, end, promotion in zip(starts.tolist(), ends.tolist(), promotions.tolist())]
+
+    def step(self, rng):
+        """
+        plays one random legal move in every game that isn't over, the games without one are decided
+        returns the number of moves made
+        """
+        ongoing = np.nonzero(self.status == GameStatus.ONGOING)[0]
+        if not len(ongoing):
+            return 0
+        games, starts, ends, promotions, boards = self.legal_moves(ongoing)
+
+        counts = np.bincount(games, minlength=len(self))
+        finished = ongoing[counts[ongoing] == 0]
+        if len(finished):
+            white = self.white_turn[finished]
+            checked = attacked(self.board[finished], king_squares(self.board[finished], white), ~white)
+            self.status[finished] = np.where(checked, np.where(white, GameStatus.BLACK_WON, GameStatus.WHITE_WON),
+                                             GameStatus.STALEMATE)
+        if not len(games):
+            return 0
+
+        # the moves sorted by game, a random one of each game's moves is played
+        order = np.argsort(games, kind="stable")
+        playing = np.nonzero(counts)[0]
+        first = np.cumsum(counts) - counts
+        chosen = order[first[playing] + (rng.random(len(playing)) * counts[playing]).astype(np.intp)]
+        games, starts, ends = games[chosen], starts[chosen], ends[chosen]
+
+        pawn = np.abs(self.board[games, starts]) == PAWN
+        capture = (self.board[games, ends] != EMPTY) | (pawn & (starts % 8 != ends % 8))
+        self.board[games] = boards[chosen]
+        self.castling[games] &= CASTLING_KEPT[starts] & CASTLING_KEPT[ends]
+        self.en_passant[games] = np.where(pawn & (np.abs(ends - starts) == 16), (starts + ends) // 2, -1)
+        self.half_move_clock[games] = np.where(pawn | capture, 0, self.half_move_clock[games] + 1)
+        self.move_number[games] += ~self.white_turn[games]
+        self.white_turn[games] = ~self.white_turn[games]
+        return len(games)
+
+    def play(self, max_plies, rng=None):
+        """
+        plays random moves in all games until they are over or max_plies moves were made in them
+        returns the number of moves made
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        moves = 0
+        for _ in range(max_plies):
+            made = self.step(rng)
+            if not made:
+                break
+            moves += made
+        return moves
+
+    def results(self):
+        """
+        returns the result of every game for white: 1 for a win, 0 for a loss and 0.5 for a draw or a game that
+        isn't over
+        """
+        return np.select([self.status == GameStatus.WHITE_WON, self.status == GameStatus.BLACK_WON], [1.0, 0.0], 0.5)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play random games in a batch and measure the games per second")
+    parser.add_argument("--games", type=int, default=1000, help="games played at once")
+    parser.add_argument("--plies", type=int, default=200, help="most half moves of a game")
+    parser.add_argument("--fen", default=START_FEN, help="position the games start from")
+    parser.add_argument("--seed", type=int, help="seed of the random moves")
+    args = parser.parse_args(argv)
+
+    batch = BoardBatch.from_fens([args.fen] * args.games)
+    start = time.perf_counter()
+    moves = batch.play(args.plies, np.random.default_rng(args.seed))
+    seconds = time.perf_counter() - start
+    counts = {status: int((batch.status == value).sum()) for status, value in (
+        ("white won", GameStatus.WHITE_WON), ("black won", GameStatus.BLACK_WON),
+        ("stalemate", GameStatus.STALEMATE), ("unfinished", GameStatus.ONGOING))}
+    print(", ".join("{} {}".format(status, count) for status, count in counts.items()))
+    print("games {}  moves {}  {:.2f}s  {:,.0f} games/s  {:,.0f} moves/s".format(
+        args.games, moves, seconds, args.games / seconds, moves / seconds))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
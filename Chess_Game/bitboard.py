@@ -0,0 +1,75 @@
+"""
+This module contains helpers for working with bitboards
+A bitboard is a 64-bit integer where bit (row * 8 + col) is set when that square belongs to the set
+Facilitates the following:
+- Converting between (row, col) squares and bit indices
+- Iterating over the squares of a bitboard
+- Shifting a bitboard by one square without wrapping around the board
+
+Note: row 0 is the top of the board, so shifting by -8 moves a set one row up and +1 moves it one column right
+"""
+
+FULL = 0xFFFFFFFFFFFFFFFF
+COL_0 = 0x0101010101010101
+COL_7 = COL_0 << 7
+
+# sliding directions as bit index offsets
+UP, DOWN, LEFT, RIGHT = -8, 8, -1, 1
+UP_LEFT, UP_RIGHT, DOWN_LEFT, DOWN_RIGHT = -9, -7, 7, 9
+ROOK_DIRECTIONS = (UP, DOWN, LEFT, RIGHT)
+BISHOP_DIRECTIONS = (UP_LEFT, UP_RIGHT, DOWN_LEFT, DOWN_RIGHT)
+KING_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+# squares that are still on the board after a shift, anything else wrapped around to the other side
+_SHIFT_MASKS = {
+    UP: FULL, DOWN: FULL,
+    LEFT: FULL & ~COL_7, RIGHT: FULL & ~COL_0,
+    UP_LEFT: FULL & ~COL_7, DOWN_LEFT: FULL & ~COL_7,
+    UP_RIGHT: FULL & ~COL_0, DOWN_RIGHT: FULL & ~COL_0,
+}
+
+
+def square_index(row, col):
+    """
+    returns the bit index of the square
+    """
+    return row * 8 + col
+
+
+def square_bit(row, col):
+    """
+    returns a bitboard containing only that square
+    """
+    return 1 << (row * 8 + col)
+
+
+def squares(bitboard):
+    """
+    yields the bit index of every square in the bitboard, lowest first
+    """
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+def to_moves(bitboard):
+    """
+    returns the squares of the bitboard as a list of (row, col) tuples, the format used for valid moves
+    """
+    _moves = []
+    while bitboard:
+        lowest = bitboard & -bitboard
+        _moves.append(divmod(lowest.bit_length() - 1, 8))
+        bitboard ^= lowest
+    return _moves
+
+
+def shift(bitboard, direction):
+    """
+    moves every square of the bitboard by direction, dropping squares that would wrap around the board
+    """
+    if direction > 0:
+        return (bitboard << direction) & _SHIFT_MASKS[direction]
+    return (bitboard >> -direction) & _SHIFT_MASKS[direction]
+
@@ -1,16 +1,26 @@
 """
-This module contains the GameState and ChessMove classes
+This module contains the GameState class
 Facilitates the following:
 - Instantiating the pieces and board
+- Keeping a bitboard for every piece type and for each player's occupancy next to the board
+- Keeping the Zobrist key of the position up to date (position_key)
 - Finding legal moves
 - Handling moving of pieces
 - Handling castling and pawn promotion logic
 - Checking if king is in check
-- Undoing moves
+- Undoing moves, the move log holds packed moves (see move_encoding.py)
+- Loading and saving positions as FEN strings and counting the legal move tree (perft)
 """
 
 from Piece import Rook, Knight, Bishop, Queen, King, Pawn
-from enums import Player
+from enums import Player, GameStatus
+import attack_tables
+import bitboard
+import evaluation
+import magic
+import move_encoding
+import zobrist
+from array import array
 import csv
 
 '''
@@ -30,19 +40,26 @@ class GameState:
     # Initialize 2D array to represent the chess board
     def __init__(self, bottom_color):
         # The board is a 2D array
+        # the pieces each player has taken, in the order they were taken (undo_move takes them back off)
         self.white_captives = []
         self.black_captives = []
-        self.move_log = []
+        # the moves packed as 16-bit integers (see move_encoding), and next to each one the castling rights and
+        # en passant square from before it, which is all undo_move needs besides the captives
+        self.move_log = array('H')
+        self._undo_log = array('H')
         self.white_turn = True
         self.checkmate = False
         self.stalemate = False
-        self.bottom_color = bottom_color  # used to see if white or black will be on the bottom of the board
+        self._game_status = None  # cached by game_status until the next move or undo
+        self.bottom_color = bottom_color  # which color the GUI draws at the bottom, the engine doesn't depend on it
         self.board = []
 
         self._is_check = False
         # Has king not moved, has Rook1(col=0) not moved, has Rook2(col=7) not moved
         self.white_king_can_castle = [True, True, True]
         self.black_king_can_castle = [True, True, True]
+        # the square a pawn skipped by moving two squares on the last move, where it can be taken en passant
+        self.en_passant_square = None
 
         '''
         Reading from csv file
@@ -61,147 +78,97 @@ class GameState:
         #     for row in reader:
         #         self.black_pieces.append(row)
 
-        if self.bottom_color == 'w':
-
-            # Initialize White Pieces  - 1 indicates left piece, 2 indicates right piece (from our perspective)
-            white_rook_1 = Rook('r', 7, 0, Player.PLAYER_WHITE)
-            white_rook_2 = Rook('r', 7, 7, Player.PLAYER_WHITE)
-            white_knight_1 = Knight('n', 7, 1, Player.PLAYER_WHITE)
-            white_knight_2 = Knight('n', 7, 6, Player.PLAYER_WHITE)
-            white_bishop_1 = Bishop('b', 7, 2, Player.PLAYER_WHITE)
-            white_bishop_2 = Bishop('b', 7, 5, Player.PLAYER_WHITE)
-            white_queen = Queen('q', 7, 3, Player.PLAYER_WHITE)
-            white_king = King('k', 7, 4, Player.PLAYER_WHITE)
-            white_pawn_1 = Pawn('p', 6, 0, Player.PLAYER_WHITE)
-            white_pawn_2 = Pawn('p', 6, 1, Player.PLAYER_WHITE)
-            white_pawn_3 = Pawn('p', 6, 2, Player.PLAYER_WHITE)
-            white_pawn_4 = Pawn('p', 6, 3, Player.PLAYER_WHITE)
-            white_pawn_5 = Pawn('p', 6, 4, Player.PLAYER_WHITE)
-            white_pawn_6 = Pawn('p', 6, 5, Player.PLAYER_WHITE)
-            white_pawn_7 = Pawn('p', 6, 6, Player.PLAYER_WHITE)
-            white_pawn_8 = Pawn('p', 6, 7, Player.PLAYER_WHITE)
-
-            self._white_king_location = [7, 4]
-
-            # self.white_pieces = [white_rook_1, white_rook_2, white_knight_1, white_knight_2, white_bishop_1,
-            #                      white_bishop_2,
-            #                      white_queen, white_king, white_pawn_1, white_pawn_2, white_pawn_3, white_pawn_4,
-            #                      white_pawn_5,
-            #                      white_pawn_6, white_pawn_7, white_pawn_8]
-            # Initialize Black pieces
-            black_rook_1 = Rook('r', 0, 0, Player.PLAYER_BLACK)
-            black_rook_2 = Rook('r', 0, 7, Player.PLAYER_BLACK)
-            black_knight_1 = Knight('n', 0, 1, Player.PLAYER_BLACK)
-            black_knight_2 = Knight('n', 0, 6, Player.PLAYER_BLACK)
-            black_bishop_1 = Bishop('b', 0, 2, Player.PLAYER_BLACK)
-            black_bishop_2 = Bishop('b', 0, 5, Player.PLAYER_BLACK)
-            black_queen = Queen('q', 0, 3, Player.PLAYER_BLACK)
-            black_king = King('k', 0, 4, Player.PLAYER_BLACK)
-            black_pawn_1 = Pawn('p', 1, 0, Player.PLAYER_BLACK)
-            black_pawn_2 = Pawn('p', 1, 1, Player.PLAYER_BLACK)
-            black_pawn_3 = Pawn('p', 1, 2, Player.PLAYER_BLACK)
-            black_pawn_4 = Pawn('p', 1, 3, Player.PLAYER_BLACK)
-            black_pawn_5 = Pawn('p', 1, 4, Player.PLAYER_BLACK)
-            black_pawn_6 = Pawn('p', 1, 5, Player.PLAYER_BLACK)
-            black_pawn_7 = Pawn('p', 1, 6, Player.PLAYER_BLACK)
-            black_pawn_8 = Pawn('p', 1, 7, Player.PLAYER_BLACK)
-
-            self._black_king_location = [0, 4]
-
-            # self.black_pieces = [black_rook_1, black_rook_2, black_knight_1, black_knight_2, black_bishop_1,
-            #                      black_bishop_2,
-            #                      black_queen, black_king, black_pawn_1, black_pawn_2, black_pawn_3, black_pawn_4,
-            #                      black_pawn_5,
-            #                      black_pawn_6, black_pawn_7, black_pawn_8]
-            self.board = [
-                [black_rook_1, black_knight_1, black_bishop_1, black_queen, black_king, black_bishop_2, black_knight_2,
-                 black_rook_2],
-                [black_pawn_1, black_pawn_2, black_pawn_3, black_pawn_4, black_pawn_5, black_pawn_6, black_pawn_7,
-                 black_pawn_8],
-                [Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY,
-                 Player.EMPTY],
-                [Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY,
-                 Player.EMPTY],
-                [Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY,
-                 Player.EMPTY],
-                [Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY,
-                 Player.EMPTY],
-                [white_pawn_1, white_pawn_2, white_pawn_3, white_pawn_4, white_pawn_5, white_pawn_6, white_pawn_7,
-                 white_pawn_8],
-                [white_rook_1, white_knight_1, white_bishop_1, white_queen, white_king, white_bishop_2, white_knight_2,
-                 white_rook_2]
-            ]
-
-        else:
-            # Initialize White pieces
-            white_rook_1 = Rook('r', 0, 0, Player.PLAYER_WHITE)
-            white_rook_2 = Rook('r', 0, 7, Player.PLAYER_WHITE)
-            white_knight_1 = Knight('n', 0, 1, Player.PLAYER_WHITE)
-            white_knight_2 = Knight('n', 0, 6, Player.PLAYER_WHITE)
-            white_bishop_1 = Bishop('b', 0, 2, Player.PLAYER_WHITE)
-            white_bishop_2 = Bishop('b', 0, 5, Player.PLAYER_WHITE)
-            white_king = King('k', 0, 3, Player.PLAYER_WHITE)
-            white_queen = Queen('q', 0, 4, Player.PLAYER_WHITE)
-            white_pawn_1 = Pawn('p', 1, 0, Player.PLAYER_WHITE)
-            white_pawn_2 = Pawn('p', 1, 1, Player.PLAYER_WHITE)
-            white_pawn_3 = Pawn('p', 1, 2, Player.PLAYER_WHITE)
-            white_pawn_4 = Pawn('p', 1, 3, Player.PLAYER_WHITE)
-            white_pawn_5 = Pawn('p', 1, 4, Player.PLAYER_WHITE)
-            white_pawn_6 = Pawn('p', 1, 5, Player.PLAYER_WHITE)
-            white_pawn_7 = Pawn('p', 1, 6, Player.PLAYER_WHITE)
-            white_pawn_8 = Pawn('p', 1, 7, Player.PLAYER_WHITE)
-
-            self._white_king_location = [0, 3]
-
-            # self.white_pieces = [white_rook_1, white_rook_2, white_knight_1, white_knight_2,
-            #                      white_bishop_1, white_bishop_2,
-            #                      white_king, white_queen, white_pawn_1, white_pawn_2, white_pawn_3, white_pawn_4,
-            #                      white_pawn_5,
-            #                      white_pawn_6, white_pawn_7, white_pawn_8]
-
-            # Initialize Black Pieces
-            black_rook_1 = Rook('r', 7, 0, Player.PLAYER_BLACK)
-            black_rook_2 = Rook('r', 7, 7, Player.PLAYER_BLACK)
-            black_knight_1 = Knight('n', 7, 1, Player.PLAYER_BLACK)
-            black_knight_2 = Knight('n', 7, 6, Player.PLAYER_BLACK)
-            black_bishop_1 = Bishop('b', 7, 2, Player.PLAYER_BLACK)
-            black_bishop_2 = Bishop('b', 7, 5, Player.PLAYER_BLACK)
-            black_king = King('k', 7, 3, Player.PLAYER_BLACK)
-            black_queen = Queen('q', 7, 4, Player.PLAYER_BLACK)
-            black_pawn_1 = Pawn('p', 6, 0, Player.PLAYER_BLACK)
-            black_pawn_2 = Pawn('p', 6, 1, Player.PLAYER_BLACK)
-            black_pawn_3 = Pawn('p', 6, 2, Player.PLAYER_BLACK)
-            black_pawn_4 = Pawn('p', 6, 3, Player.PLAYER_BLACK)
-            black_pawn_5 = Pawn('p', 6, 4, Player.PLAYER_BLACK)
-            black_pawn_6 = Pawn('p', 6, 5, Player.PLAYER_BLACK)
-            black_pawn_7 = Pawn('p', 6, 6, Player.PLAYER_BLACK)
-            black_pawn_8 = Pawn('p', 6, 7, Player.PLAYER_BLACK)
-
-            self._black_king_location = [7, 3]
-
-            # self.black_pieces = [black_rook_1, black_rook_2, black_knight_1, black_knight_2,
-            #                      black_bishop_1, black_bishop_2,
-            #                      black_king, black_queen, black_pawn_1, black_pawn_2, black_pawn_3, black_pawn_4,
-            #                      black_pawn_5,
-            #                      black_pawn_6, black_pawn_7, black_pawn_8]
-            self.board = [
-                [white_rook_1, white_knight_1, white_bishop_1, white_king, white_queen, white_bishop_2, white_knight_2,
-                 white_rook_2],
-                [white_pawn_1, white_pawn_2, white_pawn_3, white_pawn_4, white_pawn_5, white_pawn_6, white_pawn_7,
-                 white_pawn_8],
-                [Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY,
-                 Player.EMPTY],
-                [Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY,
-                 Player.EMPTY],
-                [Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY,
-                 Player.EMPTY],
-                [Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY,
-                 Player.EMPTY],
-                [black_pawn_1, black_pawn_2, black_pawn_3, black_pawn_4, black_pawn_5, black_pawn_6, black_pawn_7,
-                 black_pawn_8],
-                [black_rook_1, black_knight_1, black_bishop_1, black_king, black_queen, black_bishop_2, black_knight_2,
-                 black_rook_2]
-            ]
+        # the engine always keeps white at the bottom (rows 6 and 7), the GUI flips the board when black is
+        # at the bottom, so bottom_color is only used to draw the board
+        # Initialize White Pieces  - 1 indicates left piece, 2 indicates right piece (from our perspective)
+        white_rook_1 = Rook('r', 7, 0, Player.PLAYER_WHITE)
+        white_rook_2 = Rook('r', 7, 7, Player.PLAYER_WHITE)
+        white_knight_1 = Knight('n', 7, 1, Player.PLAYER_WHITE)
+        white_knight_2 = Knight('n', 7, 6, Player.PLAYER_WHITE)
+        white_bishop_1 = Bishop('b', 7, 2, Player.PLAYER_WHITE)
+        white_bishop_2 = Bishop('b', 7, 5, Player.PLAYER_WHITE)
+        white_queen = Queen('q', 7, 3, Player.PLAYER_WHITE)
+        white_king = King('k', 7, 4, Player.PLAYER_WHITE)
+        white_pawn_1 = Pawn('p', 6, 0, Player.PLAYER_WHITE)
+        white_pawn_2 = Pawn('p', 6, 1, Player.PLAYER_WHITE)
+        white_pawn_3 = Pawn('p', 6, 2, Player.PLAYER_WHITE)
+        white_pawn_4 = Pawn('p', 6, 3, Player.PLAYER_WHITE)
+        white_pawn_5 = Pawn('p', 6, 4, Player.PLAYER_WHITE)
+        white_pawn_6 = Pawn('p', 6, 5, Player.PLAYER_WHITE)
+        white_pawn_7 = Pawn('p', 6, 6, Player.PLAYER_WHITE)
+        white_pawn_8 = Pawn('p', 6, 7, Player.PLAYER_WHITE)
+
+        # self.white_pieces = [white_rook_1, white_rook_2, white_knight_1, white_knight_2, white_bishop_1,
+        #                      white_bishop_2,
+        #                      white_queen, white_king, white_pawn_1, white_pawn_2, white_pawn_3, white_pawn_4,
+        #                      white_pawn_5,
+        #                      white_pawn_6, white_pawn_7, white_pawn_8]
+        # Initialize Black pieces
+        black_rook_1 = Rook('r', 0, 0, Player.PLAYER_BLACK)
+        black_rook_2 = Rook('r', 0, 7, Player.PLAYER_BLACK)
+        black_knight_1 = Knight('n', 0, 1, Player.PLAYER_BLACK)
+        black_knight_2 = Knight('n', 0, 6, Player.PLAYER_BLACK)
+        black_bishop_1 = Bishop('b', 0, 2, Player.PLAYER_BLACK)
+        black_bishop_2 = Bishop('b', 0, 5, Player.PLAYER_BLACK)
+        black_queen = Queen('q', 0, 3, Player.PLAYER_BLACK)
+        black_king = King('k', 0, 4, Player.PLAYER_BLACK)
+        black_pawn_1 = Pawn('p', 1, 0, Player.PLAYER_BLACK)
+        black_pawn_2 = Pawn('p', 1, 1, Player.PLAYER_BLACK)
+        black_pawn_3 = Pawn('p', 1, 2, Player.PLAYER_BLACK)
+        black_pawn_4 = Pawn('p', 1, 3, Player.PLAYER_BLACK)
+        black_pawn_5 = Pawn('p', 1, 4, Player.PLAYER_BLACK)
+        black_pawn_6 = Pawn('p', 1, 5, Player.PLAYER_BLACK)
+        black_pawn_7 = Pawn('p', 1, 6, Player.PLAYER_BLACK)
+        black_pawn_8 = Pawn('p', 1, 7, Player.PLAYER_BLACK)
+
+        # self.black_pieces = [black_rook_1, black_rook_2, black_knight_1, black_knight_2, black_bishop_1,
+        #                      black_bishop_2,
+        #                      black_queen, black_king, black_pawn_1, black_pawn_2, black_pawn_3, black_pawn_4,
+        #                      black_pawn_5,
+        #                      black_pawn_6, black_pawn_7, black_pawn_8]
+        self.board = [
+            [black_rook_1, black_knight_1, black_bishop_1, black_queen, black_king, black_bishop_2, black_knight_2,
+             black_rook_2],
+            [black_pawn_1, black_pawn_2, black_pawn_3, black_pawn_4, black_pawn_5, black_pawn_6, black_pawn_7,
+             black_pawn_8],
+            [Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY,
+             Player.EMPTY],
+            [Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY,
+             Player.EMPTY],
+            [Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY,
+             Player.EMPTY],
+            [Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY, Player.EMPTY,
+             Player.EMPTY],
+            [white_pawn_1, white_pawn_2, white_pawn_3, white_pawn_4, white_pawn_5, white_pawn_6, white_pawn_7,
+             white_pawn_8],
+            [white_rook_1, white_knight_1, white_bishop_1, white_queen, white_king, white_bishop_2, white_knight_2,
+             white_rook_2]
+        ]
+
+        # One bitboard per entry of Player.PIECES (white_r, white_n, ..., black_p) and the occupancy of each player
+        # They are kept in sync with self.board by _set_square, which every change of the board goes through
+        self.bitboards = [0] * len(Player.PIECES)
+        self.occupancy = {Player.PLAYER_WHITE: 0, Player.PLAYER_BLACK: 0}
+        self.occupied = 0
+        # The squares attacked by the piece on each square, and by each player (see get_attack_map)
+        # _set_square keeps them up to date too
+        self._piece_attacks = [0] * 64
+        self._attack_maps = {Player.PLAYER_WHITE: 0, Player.PLAYER_BLACK: 0}
+        self._attack_maps_stale = False
+        # Zobrist key of the position, _set_square adds and removes the pieces, see position_key
+        self._position_key = 0
+        # running totals of the evaluation (see the evaluation module), _set_square keeps them up to date too
+        self._middlegame_score = 0
+        self._endgame_score = 0
+        self._phase = 0
+        for row in range(0, 8):
+            for col in range(0, 8):
+                # the square is emptied first so _set_square sees the piece arrive on it
+                piece, self.board[row][col] = self.board[row][col], Player.EMPTY
+                if piece != Player.EMPTY:
+                    self._set_square(row, col, piece)
+        self._position_key ^= zobrist.castling_key(Player.PLAYER_WHITE, self.white_king_can_castle) ^ \
+            zobrist.castling_key(Player.PLAYER_BLACK, self.black_king_can_castle)
 
     def get_move_count(self):
         """
@@ -211,15 +178,22 @@ class GameState:
 
     def get_white_king_location(self):
         """
-        returns white king's location
+        returns white king's location as a (row, col) tuple, read from his bitboard so it is always up to date
         """
-        return self._white_king_location
+        return divmod(self.get_king_square(Player.PLAYER_WHITE), 8)
 
     def get_black_king_location(self):
         """
-        returns black king's location
+        returns black king's location as a (row, col) tuple
+        """
+        return divmod(self.get_king_square(Player.PLAYER_BLACK), 8)
+
+    def get_pieces(self, player):
+        """
+        returns the player's pieces, found through his occupancy bitboard which _set_square keeps up to date,
+        so only the squares that hold them are visited (at most 16) instead of the whole board
         """
-        return self._black_king_location
+        return [self.board[square >> 3][square & 7] for square in bitboard.squares(self.occupancy[player])]
 
     def is_check(self):
         """
@@ -229,7 +203,7 @@ class GameState:
 
     def get_bottom_color(self):
         """
-        returns color of pieces that are at bottom of board
+        returns color of pieces that the GUI draws at the bottom of board
         """
         return self.bottom_color
 
@@ -244,199 +218,566 @@ class GameState:
         """
         If there is a piece at this square, returns True, otherwise False
         """
-        evaluated_piece = self.get_piece(row, col)
-        return (evaluated_piece is not None) and (evaluated_piece != Player.EMPTY)
+        return (0 <= row < 8) and (0 <= col < 8) and (self.occupied >> (row * 8 + col)) & 1 == 1
 
-    def get_valid_moves(self, starting_square):
+    def _set_square(self, row, col, piece):
+        """
+        puts piece (or Player.EMPTY) on the square and updates the bitboards, the key and the evaluation totals of
+        what was there and what is there now
+        the attacks are updated incrementally: the piece on the square gets its own attacks, and when the square
+        is emptied or filled, only the sliders whose rays go through it have their attacks recomputed
+        """
+        square = row * 8 + col
+        bit = 1 << square
+        was_occupied = self.occupied & bit
+        old_piece = self.board[row][col]
+        if old_piece != Player.EMPTY:
+            index = old_piece.get_piece_index()
+            self.bitboards[index] &= ~bit
+            self.occupancy[old_piece.get_player()] &= ~bit
+            self.occupied &= ~bit
+            self._position_key ^= zobrist.PIECE_KEYS[index][square]
+            self._middlegame_score -= evaluation.MIDDLEGAME[index][square]
+            self._endgame_score -= evaluation.ENDGAME[index][square]
+            self._phase -= evaluation.PHASE_WEIGHTS[index]
+        self.board[row][col] = piece
+        if piece != Player.EMPTY:
+            index = piece.get_piece_index()
+            self._position_key ^= zobrist.PIECE_KEYS[index][square]
+            self._middlegame_score += evaluation.MIDDLEGAME[index][square]
+            self._endgame_score += evaluation.ENDGAME[index][square]
+            self._phase += evaluation.PHASE_WEIGHTS[index]
+            self.bitboards[index] |= bit
+            self.occupancy[piece.get_player()] |= bit
+            self.occupied |= bit
+            self._piece_attacks[square] = self._attacks_from(piece, square)
+        else:
+            self._piece_attacks[square] = 0
+        if was_occupied != self.occupied & bit:
+            boards = self.bitboards
+            queens = boards[3] | boards[9]
+            sliders = (magic.rook_attacks(square, self.occupied) & (boards[0] | boards[6] | queens)) | \
+                (magic.bishop_attacks(square, self.occupied) & (boards[2] | boards[8] | queens))
+            for slider in bitboard.squares(sliders):
+                self._piece_attacks[slider] = self._attacks_from(self.board[slider >> 3][slider & 7], slider)
+        self._attack_maps_stale = True
+
+    def _attacks_from(self, piece, square):
+        """
+        returns the squares the piece attacks from the square
+        the square is passed in because the piece's own row and column may not have been updated yet
         """
-        removes pins from valid moves (unless the pinned piece move can get rid of a check and checks is empty)
-        removes move from valid moves if the move falls within a check piece's valid move
-        if the moving piece is a king, the ending square cannot be in a check
+        kind = piece.get_piece_index() % 6
+        if kind == 0:
+            return magic.rook_attacks(square, self.occupied)
+        if kind == 1:
+            return attack_tables.KNIGHT_ATTACKS[square]
+        if kind == 2:
+            return magic.bishop_attacks(square, self.occupied)
+        if kind == 3:
+            return magic.queen_attacks(square, self.occupied)
+        if kind == 4:
+            return attack_tables.KING_ATTACKS[square]
+        return attack_tables.PAWN_ATTACKS[self.get_pawn_direction(piece.get_player())][square]
+
+    def position_key(self):
         """
+        returns the 64-bit Zobrist key of the position: the pieces on their squares, the side to move,
+        the castling rights and the en passant square
+        equal positions have equal keys, it is updated with every change instead of hashing the board
+        """
+        return self._position_key
+
+    def evaluate(self):
+        """
+        returns the evaluation of the position in centipawns, positive when white is better: material and
+        piece-square values, blended between the middlegame and endgame tables by the material left
+        the totals are kept up to date with every change of the board, so this doesn't look at the board
+        """
+        return evaluation.taper(self._middlegame_score, self._endgame_score, self._phase)
 
+    def _lose_castle_right(self, player, index):
+        """
+        clears one of the player's castling flags (0 king, 1 left rook, 2 right rook) and its part of the key
+        """
+        rights = self.white_king_can_castle if player == Player.PLAYER_WHITE else self.black_king_can_castle
+        if rights[index]:
+            rights[index] = False
+            self._position_key ^= zobrist.CASTLING_KEYS[player][index]
+
+    def _set_en_passant_square(self, square):
+        """
+        sets the square that can be taken en passant (or None) and updates the key
+        """
+        if self.en_passant_square is not None:
+            self._position_key ^= zobrist.EN_PASSANT_KEYS[self.en_passant_square[1]]
+        self.en_passant_square = square
+        if square is not None:
+            self._position_key ^= zobrist.EN_PASSANT_KEYS[square[1]]
+
+    def get_attack_map(self, player):
+        """
+        returns the bitboard of squares the player attacks, from the attacks _set_square keeps for every piece
+        the two maps are only put back together the first time they are asked for after the board changed
+        """
+        if self._attack_maps_stale:
+            for side in (Player.PLAYER_WHITE, Player.PLAYER_BLACK):
+                attacked = 0
+                for square in bitboard.squares(self.occupancy[side]):
+                    attacked |= self._piece_attacks[square]
+                self._attack_maps[side] = attacked
+            self._attack_maps_stale = False
+        return self._attack_maps[player]
+
+    def is_in_check(self, player):
+        """
+        returns True if the player's king is attacked, a lookup in the opponent's attack map
+        """
+        return (self.get_attack_map(self.get_opponent(player)) >> self.get_king_square(player)) & 1 == 1
+
+    def get_pawn_direction(self, player):
+        """
+        returns the bit offset of a pawn step forward for the player, white pawns go up the board
+        """
+        return bitboard.UP if player == Player.PLAYER_WHITE else bitboard.DOWN
+
+    def get_opponent(self, player):
+        """
+        returns the other player
+        """
+        return Player.PLAYER_BLACK if player == Player.PLAYER_WHITE else Player.PLAYER_WHITE
+
+    def get_home_row(self, player):
+        """
+        returns the row the player's king and rooks start on
+        """
+        return 7 if player == Player.PLAYER_WHITE else 0
+
+    def get_king_square(self, player):
+        """
+        returns the bit index of the player's king
+        """
+        return self.bitboards[self._piece_offset(player) + 4].bit_length() - 1
+
+    @staticmethod
+    def _piece_offset(player):
+        # a player's bitboards start at 0 (white_r) or 6 (black_r), in the order r, n, b, q, k, p
+        return 0 if player == Player.PLAYER_WHITE else 6
+
+    def get_attacked_squares(self, player, occupied=None):
+        """
+        returns the bitboard of all squares the player's pieces attack, computed from scratch
+        occupied can leave pieces out so sliders see through them
+        get_attack_map gives the same squares for the current occupancy without recomputing them
+        """
+        if occupied is None:
+            occupied = self.occupied
+        offset = self._piece_offset(player)
+        boards = self.bitboards
+        queens = boards[offset + 3]
+        forward = self.get_pawn_direction(player)
+        pawns = boards[offset + 5]
+        attacked = bitboard.shift(pawns, forward - 1) | bitboard.shift(pawns, forward + 1)
+        for square in bitboard.squares(boards[offset] | queens):
+            attacked |= magic.rook_attacks(square, occupied)
+        for square in bitboard.squares(boards[offset + 2] | queens):
+            attacked |= magic.bishop_attacks(square, occupied)
+        for square in bitboard.squares(boards[offset + 1]):
+            attacked |= attack_tables.KNIGHT_ATTACKS[square]
+        if boards[offset + 4]:
+            attacked |= attack_tables.KING_ATTACKS[boards[offset + 4].bit_length() - 1]
+        return attacked
+
+    def get_attackers(self, square, player, occupied=None):
+        """
+        returns the bitboard of the player's pieces that attack the square (a bit index)
+        """
+        if occupied is None:
+            occupied = self.occupied
+        offset = self._piece_offset(player)
+        boards = self.bitboards
+        queens = boards[offset + 3]
+        # a pawn attacks the square if a pawn of the other color standing there would attack the pawn
+        return (attack_tables.KNIGHT_ATTACKS[square] & boards[offset + 1]) | \
+            (attack_tables.KING_ATTACKS[square] & boards[offset + 4]) | \
+            (attack_tables.PAWN_ATTACKS[-self.get_pawn_direction(player)][square] & boards[offset + 5]) | \
+            (magic.rook_attacks(square, occupied) & (boards[offset] | queens)) | \
+            (magic.bishop_attacks(square, occupied) & (boards[offset + 2] | queens))
+
+    # the piece values static_exchange counts in (centipawns), in the order r, n, b, q, k, p
+    EXCHANGE_VALUES = (500, 320, 330, 900, 20000, 100)
+    # the order the attackers of a square take on it, least valuable first: p, n, b, r, q, k
+    _EXCHANGE_ORDER = (5, 1, 2, 0, 3, 4)
+
+    def static_exchange(self, square, starting_square=None):
+        """
+        returns what the player to move wins in centipawns when both sides keep taking on the square (row, col),
+        each time with their least valuable piece that attacks it, and each side stops when taking again would lose
+        pieces that move out of the way let the sliders behind them attack the square, pins are not looked at
+        with starting_square the first capture is made by the piece on it, and the result can be negative, without it
+        the least valuable attacker starts and not taking at all (0) is an option
+        """
+        target = square[0] * 8 + square[1]
+        player = Player.PLAYER_WHITE if self.white_turn else Player.PLAYER_BLACK
+        occupied = self.occupied
+        boards = self.bitboards
+        if starting_square is None:
+            attacker = self._least_valuable_attacker(target, player, occupied)
+            if attacker is None:
+                return 0
+        else:
+            attacker = starting_square[0] * 8 + starting_square[1]
+        victim = self.board[square[0]][square[1]]
+        if victim != Player.EMPTY:
+            gains = [self.EXCHANGE_VALUES[victim.get_piece_index() % 6]]
+        elif self.en_passant_square == square and \
+                self.board[attacker >> 3][attacker & 7].get_piece_index() % 6 == 5:
+            gains = [self.EXCHANGE_VALUES[5]]
+            occupied ^= 1 << (target - self.get_pawn_direction(player))  # the pawn taken en passant
+        else:
+            gains = [0]
+        on_square = self.EXCHANGE_VALUES[self.board[attacker >> 3][attacker & 7].get_piece_index() % 6]
+        occupied ^= 1 << attacker
+        side = self.get_opponent(player)
+        while True:
+            attacker = self._least_valuable_attacker(target, side, occupied)
+            if attacker is None:
+                break
+            if boards[self._piece_offset(side) + 4] >> attacker & 1 and \
+                    self._least_valuable_attacker(target, self.get_opponent(side), occupied) is not None:
+                break  # the king can't take a defended piece
+            gains.append(on_square - gains[-1])
+            on_square = self.EXCHANGE_VALUES[self.board[attacker >> 3][attacker & 7].get_piece_index() % 6]
+            occupied ^= 1 << attacker
+            side = self.get_opponent(side)
+        # going back through the captures, each side takes only when it is better than stopping
+        for index in range(len(gains) - 1, 0, -1):
+            gains[index - 1] = -max(-gains[index - 1], gains[index])
+        return gains[0] if starting_square is not None else max(gains[0], 0)
+
+    def _least_valuable_attacker(self, target, player, occupied):
+        """
+        returns the bit index of the player's least valuable piece left in occupied that attacks target, or None
+        """
+        attackers = self.get_attackers(target, player, occupied) & occupied
+        if not attackers:
+            return None
+        offset = self._piece_offset(player)
+        for kind in self._EXCHANGE_ORDER:
+            pieces = attackers & self.bitboards[offset + kind]
+            if pieces:
+                return (pieces & -pieces).bit_length() - 1
+        return None
+
+    def _find_pins(self, king_square, player):
+        """
+        returns (pinned square, pinning square) pairs for the player whose king is on king_square
+        the sliders that see the king once the first piece of ours on each ray is removed are pinning that piece
+        """
+        _pins = []
+        own = self.occupancy[player]
+        offset = self._piece_offset(self.get_opponent(player))
+        queens = self.bitboards[offset + 3]
+        for attacks, sliders in ((magic.rook_attacks, self.bitboards[offset] | queens),
+                                 (magic.bishop_attacks, self.bitboards[offset + 2] | queens)):
+            if not sliders:
+                continue
+            seen = attacks(king_square, self.occupied)
+            own_blockers = seen & own
+            if own_blockers:
+                for pinner in bitboard.squares(attacks(king_square, self.occupied ^ own_blockers) & ~seen & sliders):
+                    pinned = attack_tables.BETWEEN[king_square][pinner] & own_blockers
+                    _pins.append((pinned.bit_length() - 1, pinner))
+        return _pins
+
+    def _get_move_masks(self, player):
+        """
+        computes everything the legal move generator needs to know about a position, once per position:
+        - the squares the opponent attacks, looking through our king so he can't step back along a checking ray
+          (the attack map only has to be extended when the king is in check by a slider)
+        - the check mask, which holds the squares any other piece has to move to: everywhere when not in check,
+          the checking piece or a square in between when in check, and nowhere when in double check
+        - the pin masks, the ray (up to and including the pinning piece) each pinned piece has to stay on
+        returns (king square, attacked squares, checking pieces, check mask, pin masks)
+        """
+        opponent = self.get_opponent(player)
+        king_square = self.get_king_square(player)
+        attacked = self.get_attack_map(opponent)
+        checkers = 0
+        if (attacked >> king_square) & 1:
+            checkers = self.get_attackers(king_square, opponent)
+            occupied = self.occupied ^ (1 << king_square)
+            offset = self._piece_offset(opponent)
+            for checker in bitboard.squares(checkers & (self.bitboards[offset] | self.bitboards[offset + 3])):
+                attacked |= magic.rook_attacks(checker, occupied)
+            for checker in bitboard.squares(checkers & (self.bitboards[offset + 2] | self.bitboards[offset + 3])):
+                attacked |= magic.bishop_attacks(checker, occupied)
+        if not checkers:
+            check_mask = bitboard.FULL
+        elif checkers & (checkers - 1):
+            check_mask = 0
+        else:
+            check_mask = checkers | attack_tables.BETWEEN[king_square][checkers.bit_length() - 1]
+        pin_masks = {}
+        if check_mask:  # in double check only the king moves, pins don't matter
+            for pinned, pinner in self._find_pins(king_square, player):
+                pin_masks[pinned] = attack_tables.BETWEEN[king_square][pinner] | (1 << pinner)
+        self._is_check = checkers != 0
+        return king_square, attacked, checkers, check_mask, pin_masks
+
+    def _pieces_to_move(self, player, masks):
+        """
+        returns the bitboard of the player's pieces that can have legal moves, which is all of them unless in check
+        in check only the king and the pieces that can take the checking piece or step in front of it are left,
+        in double check only the king can move, so the move generators don't visit pieces that can't help
+        """
+        king_square, _, checkers, check_mask, _ = masks
+        if not checkers:
+            return self.occupancy[player]
+        king_bit = 1 << king_square
+        if checkers & (checkers - 1):
+            return king_bit
+        candidates = 0
+        for square in bitboard.squares(check_mask):
+            candidates |= self.get_attackers(square, player)
+        # pawns don't attack the squares they step to, these are the ones that could step in front of a slider
+        blocks = check_mask & ~checkers
+        if blocks:
+            backwards = -self.get_pawn_direction(player)
+            one_back = bitboard.shift(blocks, backwards)
+            candidates |= (one_back | bitboard.shift(one_back, backwards)) & \
+                self.bitboards[self._piece_offset(player) + 5]
+        # a pawn that moved two squares to give check can also be taken en passant
+        if self.en_passant_square is not None:
+            candidates |= self.get_attackers(bitboard.square_index(*self.en_passant_square), player) & \
+                self.bitboards[self._piece_offset(player) + 5]
+        return king_bit | (candidates & self.occupancy[player])
+
+    def _legal_targets(self, piece, masks):
+        """
+        returns the bitboard of squares the piece can legally move to, using the masks from _get_move_masks
+        """
+        king_square, attacked, checkers, check_mask, pin_masks = masks
+        square = piece.get_square_index()
+        targets = piece.get_move_targets(self)
+        if square == king_square:
+            targets &= ~attacked
+            if not checkers:
+                for side in ('left', 'right'):
+                    if self._can_castle(piece.get_player(), side, attacked):
+                        targets |= 1 << (square - square % 8 + self._CASTLING_COLUMNS[side][1])
+            return targets
+        if self.en_passant_square is not None and piece.get_name() == "p":
+            en_passant_bit = bitboard.square_bit(*self.en_passant_square)
+            if targets & en_passant_bit:
+                # taking en passant removes two pieces from the board, so the masks aren't enough (the taken pawn
+                # could be the checking piece, or both pawns could be shielding the king), it is checked directly
+                targets &= ~en_passant_bit
+                taken_bit = bitboard.square_bit(piece.get_row_number(), self.en_passant_square[1])
+                occupied = self.occupied ^ (1 << square) ^ en_passant_bit ^ taken_bit
+                if not self.get_attackers(king_square, self.get_opponent(piece.get_player()), occupied) & \
+                        ~taken_bit:
+                    return (targets & check_mask & pin_masks.get(square, bitboard.FULL)) | en_passant_bit
+        if square in pin_masks:
+            targets &= pin_masks[square]
+        return targets & check_mask
+
+    def get_valid_moves(self, starting_square):
+        """
+        returns the legal moves of the piece on starting_square as a list of squares, None if there is no piece
+        the attacks, checks and pins are worked out once by _get_move_masks, so no move has to be tried out:
+        - a pinned piece can only move along the ray between its king and the pinning piece
+        - when in check, a piece has to take the checking piece or block the check, in double check only
+          the king can move
+        - the king can't move to, or castle through, an attacked square
+        """
         current_row = starting_square[0]
         current_col = starting_square[1]
 
-        if self.is_valid_piece(current_row, current_col):  # if it's a valid piece, get it's king
-            valid_moves = []
+        if self.is_valid_piece(current_row, current_col):
             moving_piece = self.get_piece(current_row, current_col)
-            if self.get_piece(current_row, current_col).is_player(Player.PLAYER_WHITE):
-                king_location = self._white_king_location
-            else:
-                king_location = self._black_king_location
-            # check for pieces that bring you in check, pieces that are pinned, and pieces that are pinning your pieces
-            group = self.check_for_check(king_location, moving_piece.get_player())
-            checking_pieces = group[0]
-            pinned_pieces = group[1]
-            # pinned_checks = group[2]
-            initial_valid_piece_moves = moving_piece.get_valid_piece_moves(self)  # will take some moves out from this
-
-            # immediate check
-            if checking_pieces:
-                for move in initial_valid_piece_moves:
-                    can_move = True
-                    for piece in checking_pieces:
-                        # if we're moving the king while he is in check,
-                        # make sure he doesn't move in a square where he will be check
-                        if moving_piece.get_name() == "k":
-                            temp = self.board[current_row][current_col]  # save it's position
-                            self.board[current_row][current_col] = Player.EMPTY  # empty it's position
-                            temp2 = self.board[move[0]][move[1]]  # one of king's valid moves
-                            self.board[move[0]][move[1]] = temp  # move it, to check if it will be check
-                            if not self.check_for_check(move, moving_piece.get_player())[0]:
-                                pass  # if it isn't in check, it's good
-                            else:
-                                can_move = False  # if it is, then it can't move there
-                            self.board[current_row][current_col] = temp  # put king back in it's place
-                            self.board[move[0]][move[1]] = temp2
-                        elif move == piece and len(checking_pieces) == 1 and moving_piece.get_name() != "k" and \
-                                (current_row, current_col) not in pinned_pieces:
-                            pass  # if our piece can capture the checking piece, then go ahead
-                        elif move != piece and len(checking_pieces) == 1 and moving_piece.get_name() != "k" and \
-                                (current_row, current_col) not in pinned_pieces:  # check if king will be check if moved
-                            temp = self.board[move[0]][move[1]]
-                            self.board[move[0]][move[1]] = moving_piece
-                            self.board[current_row][current_col] = Player.EMPTY
-                            if self.check_for_check(king_location, moving_piece.get_player())[0]:
-                                can_move = False
-                            self.board[current_row][current_col] = moving_piece
-                            self.board[move[0]][move[1]] = temp
-                        else:
-                            can_move = False
-                    if can_move:
-                        valid_moves.append(move)
-                self._is_check = True
-            # pinned checks
-            elif pinned_pieces and moving_piece.get_name() != "k":
-                if starting_square not in pinned_pieces:
-                    for move in initial_valid_piece_moves:
-                        valid_moves.append(move)
-                elif starting_square in pinned_pieces:
-                    for move in initial_valid_piece_moves:
-
-                        temp = self.board[move[0]][move[1]]
-                        self.board[move[0]][move[1]] = moving_piece
-                        self.board[current_row][current_col] = Player.EMPTY
-                        if not self.check_for_check(king_location, moving_piece.get_player())[0]:
-                            valid_moves.append(move)
-                        self.board[current_row][current_col] = moving_piece
-                        self.board[move[0]][move[1]] = temp
-            else:
-                if moving_piece.get_name() == "k":  # check if king will be check in moved square
-                    for move in initial_valid_piece_moves:
-                        temp = self.board[current_row][current_col]
-                        temp2 = self.board[move[0]][move[1]]
-                        self.board[current_row][current_col] = Player.EMPTY
-                        self.board[move[0]][move[1]] = temp
-                        if not self.check_for_check(move, moving_piece.get_player())[0]:
-                            valid_moves.append(move)
-                        self.board[current_row][current_col] = temp
-                        self.board[move[0]][move[1]] = temp2
-                else:
-                    for move in initial_valid_piece_moves:
-                        valid_moves.append(move)
-            return valid_moves
+            return bitboard.to_moves(self._legal_targets(moving_piece, self._get_move_masks(moving_piece.get_player())))
         else:
             return None
 
-    # 0 if white lost, 1 if black lost, 2 if stalemate, 3 if not game over
+    def is_legal_move(self, starting_square, ending_square):
+        """
+        returns True if the piece on starting_square belongs to the player to move and can legally move to
+        ending_square, without listing its moves
+        """
+        if not self.is_valid_piece(starting_square[0], starting_square[1]):
+            return False
+        piece = self.board[starting_square[0]][starting_square[1]]
+        if not piece.is_player(Player.PLAYER_WHITE if self.white_turn else Player.PLAYER_BLACK):
+            return False
+        targets = self._legal_targets(piece, self._get_move_masks(piece.get_player()))
+        return (targets >> (ending_square[0] * 8 + ending_square[1])) & 1 == 1
+
+    def iter_legal_moves(self, player=None, captures_only=False):
+        """
+        yields the legal moves of the player (the player to move by default) one at a time as
+        (starting square, ending square, promotion), first all captures and then the quiet moves,
+        which are left out with captures_only
+        every piece a pawn reaching the last row can be promoted to is a move of its own, promotion is None otherwise
+        a piece's moves are only worked out when the generator gets to it, so stopping early saves the rest,
+        moves can be made while iterating as long as they are undone before asking for the next one
+        """
+        if player is None:
+            player = Player.PLAYER_WHITE if self.white_turn else Player.PLAYER_BLACK
+        masks = self._get_move_masks(player)
+        takes = self.occupancy[self.get_opponent(player)]
+        en_passant_bit = 0 if self.en_passant_square is None else bitboard.square_bit(*self.en_passant_square)
+        quiet_targets = []
+        for square in bitboard.squares(self._pieces_to_move(player, masks)):
+            piece = self.board[square >> 3][square & 7]
+            targets = self._legal_targets(piece, masks)
+            captures = targets & (takes | en_passant_bit if piece.get_name() == "p" else takes)
+            if targets ^ captures and not captures_only:
+                quiet_targets.append((square, targets ^ captures))
+            if captures:
+                yield from self._moves_from(square, captures)
+        for square, targets in quiet_targets:
+            yield from self._moves_from(square, targets)
+
+    def _moves_from(self, square, targets):
+        """
+        yields (starting square, ending square, promotion) for every target of the piece on square
+        """
+        starting_square = divmod(square, 8)
+        promotes = self.board[square >> 3][square & 7].get_name() == "p"
+        for target in bitboard.squares(targets):
+            ending_square = divmod(target, 8)
+            if promotes and ending_square[0] in (0, 7):
+                for promotion in "qrbn":
+                    yield starting_square, ending_square, promotion
+            else:
+                yield starting_square, ending_square, None
+
     def checkmate_stalemate_checker(self):
         """
-        checks if game is still going on
+        checks if game is still going on, returns one of the GameStatus values
         """
-        all_white_moves = self.get_all_legal_moves(Player.PLAYER_WHITE)
-        all_black_moves = self.get_all_legal_moves(Player.PLAYER_BLACK)
-        if self.whose_turn() and not all_white_moves:
-            return 0  # white lost, black won
-        elif not self.whose_turn() and not all_black_moves:
-            return 1  # black lost, white won
-        elif not all_white_moves and not all_black_moves:
-            return 2
-        else:
-            return 3
+        return self.game_status()
+
+    def game_status(self):
+        """
+        returns GameStatus.ONGOING while the player to move has a legal move, otherwise the game is over:
+        checkmate if his king is in check and stalemate if it isn't
+        only the player to move is looked at and the search stops at his first legal move,
+        the answer is kept until the next move_piece or undo_move
+        """
+        if self._game_status is None:
+            player = Player.PLAYER_WHITE if self.white_turn else Player.PLAYER_BLACK
+            self.checkmate = False
+            self.stalemate = False
+            if self.has_legal_move(player):
+                self._game_status = GameStatus.ONGOING
+            elif self.is_in_check(player):
+                self.checkmate = True
+                self._game_status = GameStatus.BLACK_WON if self.white_turn else GameStatus.WHITE_WON
+            else:
+                self.stalemate = True
+                self._game_status = GameStatus.STALEMATE
+        return self._game_status
+
+    def has_legal_move(self, player):
+        """
+        returns True as soon as one of the player's pieces has a legal move
+        """
+        masks = self._get_move_masks(player)
+        # the king is tried first, when he can't move in check only a capture or a block can help
+        king_square = masks[0]
+        if self._legal_targets(self.board[king_square >> 3][king_square & 7], masks):
+            return True
+        for square in bitboard.squares(self._pieces_to_move(player, masks) & ~(1 << king_square)):
+            if self._legal_targets(self.board[square >> 3][square & 7], masks):
+                return True
+        return False
 
     def get_all_legal_moves(self, player):
         """
         returns all legal moves a player can make, used to check if game over in above function
         """
         _all_valid_moves = []
-        for row in range(0, 8):
-            for col in range(0, 8):
-                if self.is_valid_piece(row, col) and self.get_piece(row, col).is_player(player):
-                    valid_moves = self.get_valid_moves((row, col))
-                    for move in valid_moves:
-                        _all_valid_moves.append(((row, col), move))
+        masks = self._get_move_masks(player)  # one attack computation for all of the player's pieces
+        # only visit the squares of the player's pieces that can move instead of all 64
+        for square in bitboard.squares(self._pieces_to_move(player, masks)):
+            row, col = divmod(square, 8)
+            for move in bitboard.to_moves(self._legal_targets(self.board[row][col], masks)):
+                _all_valid_moves.append(((row, col), move))
         return _all_valid_moves
 
+    # king col, king destination col, rook col, rook destination col and the cols that have to be empty
+    # for castling to each side, the same for both players
+    _CASTLING_COLUMNS = {
+        'left': (4, 2, 0, 3, (1, 2, 3)),
+        'right': (4, 6, 7, 5, (5, 6)),
+    }
+
+    def _can_castle(self, player, side, attacked):
+        """
+        the king and the rook on that side must not have moved, the squares between them must be empty,
+        and the king can't be in check, pass through an attacked square or end up on one
+        attacked is the bitboard of squares the opponent attacks
+        """
+        rights = self.white_king_can_castle if player == Player.PLAYER_WHITE else self.black_king_can_castle
+        if not (rights[0] and rights[1 if side == 'left' else 2]):
+            return False
+        king_col, king_end_col, rook_col, _, empty_cols = self._CASTLING_COLUMNS[side]
+        row = self.get_home_row(player)
+        if self.get_king_square(player) != row * 8 + king_col or \
+                not self.bitboards[self._piece_offset(player)] >> (row * 8 + rook_col) & 1:
+            return False
+        for col in empty_cols:
+            if self.occupied >> (row * 8 + col) & 1:
+                return False
+        step = 1 if king_end_col > king_col else -1
+        for col in range(king_col, king_end_col + step, step):
+            if attacked >> (row * 8 + col) & 1:
+                return False
+        return True
+
     def king_can_castle_left(self, player):
         """
         checks if the king can castle left
-        different logic if white is on bottom or on top and vice versa
         returns boolean
         """
-        if self.bottom_color == 'w':
-            if player is Player.PLAYER_WHITE:
-                return self.white_king_can_castle[0] and self.white_king_can_castle[1] and \
-                       self.get_piece(7, 1) is Player.EMPTY and self.get_piece(7, 2) is Player.EMPTY and \
-                       self.get_piece(7, 3) is Player.EMPTY and not self._is_check
-            else:
-                return self.black_king_can_castle[0] and self.black_king_can_castle[1] and \
-                       self.get_piece(0, 1) is Player.EMPTY and self.get_piece(0, 2) is Player.EMPTY and \
-                       self.get_piece(0, 3) is Player.EMPTY and not self._is_check
-        else:
-            if player is Player.PLAYER_WHITE:
-                return self.white_king_can_castle[0] and self.white_king_can_castle[1] and \
-                       self.get_piece(0, 1) is Player.EMPTY and self.get_piece(0, 2) is Player.EMPTY and \
-                       not self._is_check
-            else:
-                return self.black_king_can_castle[0] and self.black_king_can_castle[1] and \
-                       self.get_piece(7, 1) is Player.EMPTY and self.get_piece(7, 2) is Player.EMPTY and \
-                       not self._is_check
+        return self._can_castle(player, 'left', self.get_attack_map(self.get_opponent(player)))
 
     def king_can_castle_right(self, player):
         """
-        checks if the king can castle left
-        different logic if white is on bottom or on top and vice versa
+        checks if the king can castle right
         returns boolean
         """
-        if self.bottom_color == 'w':
-            if player is Player.PLAYER_WHITE:
-                return self.white_king_can_castle[0] and self.white_king_can_castle[2] and \
-                       self.get_piece(7, 6) is Player.EMPTY and self.get_piece(7, 5) is Player.EMPTY and not \
-                       self._is_check
-            else:
-                return self.black_king_can_castle[0] and self.black_king_can_castle[2] and \
-                       self.get_piece(0, 6) is Player.EMPTY and self.get_piece(0, 5) is Player.EMPTY and not \
-                       self._is_check
-        else:
-            if player is Player.PLAYER_WHITE:
-                return self.white_king_can_castle[0] and self.white_king_can_castle[2] and \
-                       self.get_piece(0, 6) is Player.EMPTY and self.get_piece(0, 5) is Player.EMPTY and \
-                       self.get_piece(0, 4) is Player.EMPTY and not self._is_check
-            else:
-                return self.black_king_can_castle[0] and self.black_king_can_castle[2] and \
-                       self.get_piece(7, 6) is Player.EMPTY and self.get_piece(7, 5) is Player.EMPTY and \
-                       self.get_piece(7, 4) is Player.EMPTY and not self._is_check
+        return self._can_castle(player, 'right', self.get_attack_map(self.get_opponent(player)))
 
-    def promote_pawn(self, starting_square, moved_piece, ending_square):
+    def _remove_rook_castling(self, player, row, col):
+        """
+        once the rook that started on (row, col) moves or is taken, the player can't castle on its side anymore
+        """
+        if row == self.get_home_row(player) and col in (0, 7):
+            self._lose_castle_right(player, 1 if col == 0 else 2)
+
+    def promote_pawn(self, starting_square, moved_piece, ending_square, promotion=None):
         """
         handles promotion of pawns
         user chooses what to promote to in terminal, then piece is instantiated and swapped with pawn
+        promotion (r, n, b or q) makes the choice without asking, e.g. for perft or an engine
         """
+        piece_classes = {"r": Rook, "n": Knight, "b": Bishop, "q": Queen}
+        if promotion is not None and promotion not in piece_classes:
+            raise ValueError("promotion must be one of r, n, b, q, got " + repr(promotion))
         while True:
-            new_piece_name = input("Change pawn to (r, n, b, q):\n")
-            piece_classes = {"r": Rook, "n": Knight, "b": Bishop, "q": Queen}
+            new_piece_name = promotion if promotion is not None else input("Change pawn to (r, n, b, q):\n")
             if new_piece_name in piece_classes:
-                move = ChessMove(starting_square, ending_square, self, self._is_check)
+                self._log_move(starting_square, ending_square, move_encoding.promotion_flags(new_piece_name))
 
                 new_piece = piece_classes[new_piece_name](new_piece_name, ending_square[0],
                                                           ending_square[1], moved_piece.get_player())
-                self.board[ending_square[0]][ending_square[1]] = new_piece
-                self.board[moved_piece.get_row_number()][moved_piece.get_col_number()] = Player.EMPTY
+                self._set_square(ending_square[0], ending_square[1], new_piece)
+                self._set_square(moved_piece.get_row_number(), moved_piece.get_col_number(), Player.EMPTY)
                 moved_piece.change_row_number(ending_square[0])
                 moved_piece.change_col_number(ending_square[1])
-                move.pawn_promotion_move(new_piece)
-                self.move_log.append(move)
                 break
             else:
                 print("Please choose from these four: r, n, b, q.\n")
@@ -444,164 +785,81 @@ class GameState:
     def handle_white_castling(self, moving_piece, moved_to_piece, starting_square, ending_square):
         """
         handles the castling for white
-        different logic when white is on top or bottom
         """
-        next_square_row = ending_square[0]  # The integer row value of the ending square
         next_square_col = ending_square[1]  # The integer col value of the ending square
-        if self.bottom_color == 'w':
-            # left castling
-            if moved_to_piece == Player.EMPTY and next_square_col == 2 and self.king_can_castle_left(
-                    moving_piece.get_player()):
-                move = ChessMove(starting_square, ending_square, self, self._is_check)
-                move.castling_move((7, 0), (7, 3), self)
-                self.move_log.append(move)
-                # move rook
-                self.get_piece(7, 0).change_col_number(3)
-
-                self.board[7][3] = self.board[7][0]
-                self.board[7][0] = Player.EMPTY
-
-                self.white_king_can_castle[0] = False
-                self.white_king_can_castle[1] = False
-            # right castling
-            elif moved_to_piece == Player.EMPTY and next_square_col == 6 and self.king_can_castle_right(
-                    moving_piece.get_player()):
-                move = ChessMove(starting_square, ending_square, self, self._is_check)
-                move.castling_move((7, 7), (7, 5), self)
-                self.move_log.append(move)
-                # move rook
-                self.get_piece(7, 7).change_col_number(5)
-
-                self.board[7][5] = self.board[7][7]
-                self.board[7][7] = Player.EMPTY
-
-                self.white_king_can_castle[0] = False
-                self.white_king_can_castle[2] = False
-            else:
-                move = ChessMove(starting_square, ending_square, self, self._is_check)
-                self.move_log.append(move)
-                self.white_king_can_castle[0] = False
-            self._white_king_location = (next_square_row, next_square_col)
+        # left castling
+        if moved_to_piece == Player.EMPTY and next_square_col == 2 and self.king_can_castle_left(
+                moving_piece.get_player()):
+            self._log_move(starting_square, ending_square, move_encoding.CASTLING)
+            # move rook
+            self.get_piece(7, 0).change_col_number(3)
+
+            self._set_square(7, 3, self.board[7][0])
+            self._set_square(7, 0, Player.EMPTY)
+
+            self._lose_castle_right(Player.PLAYER_WHITE, 0)
+            self._lose_castle_right(Player.PLAYER_WHITE, 1)
+        # right castling
+        elif moved_to_piece == Player.EMPTY and next_square_col == 6 and self.king_can_castle_right(
+                moving_piece.get_player()):
+            self._log_move(starting_square, ending_square, move_encoding.CASTLING)
+            # move rook
+            self.get_piece(7, 7).change_col_number(5)
+
+            self._set_square(7, 5, self.board[7][7])
+            self._set_square(7, 7, Player.EMPTY)
+
+            self._lose_castle_right(Player.PLAYER_WHITE, 0)
+            self._lose_castle_right(Player.PLAYER_WHITE, 2)
         else:
-            if moved_to_piece == Player.EMPTY and next_square_col == 1 and self.king_can_castle_left(
-                    moving_piece.get_player()):
-                move = ChessMove(starting_square, ending_square, self, self._is_check)
-                move.castling_move((0, 0), (0, 2), self)
-                self.move_log.append(move)
-                # move rook
-                self.get_piece(0, 0).change_col_number(2)
-
-                self.board[0][2] = self.board[0][0]
-                self.board[0][0] = Player.EMPTY
-
-                self.white_king_can_castle[0] = False
-                self.white_king_can_castle[1] = False
-
-            elif moved_to_piece == Player.EMPTY and next_square_col == 5 and self.king_can_castle_right(
-                    moving_piece.get_player()):
-                move = ChessMove(starting_square, ending_square, self, self._is_check)
-                move.castling_move((0, 7), (0, 4), self)
-                self.move_log.append(move)
-                # move rook
-                self.get_piece(0, 7).change_col_number(4)
-
-                self.board[0][4] = self.board[0][7]
-                self.board[0][7] = Player.EMPTY
-
-                self.white_king_can_castle[0] = False
-                self.white_king_can_castle[2] = False
-            else:
-                move = ChessMove(starting_square, ending_square, self, self._is_check)
-                self.move_log.append(move)
-                self.white_king_can_castle[0] = False
-            self._white_king_location = (next_square_row, next_square_col)
+            self._log_move(starting_square, ending_square)
+            self._lose_castle_right(Player.PLAYER_WHITE, 0)
 
     def handle_black_castling(self, moving_piece, moved_to_piece, starting_square, ending_square):
         """
         handles the castling for black
-        different logic when black is on top or bottom
         """
-        next_square_row = ending_square[0]  # The integer row value of the ending square
         next_square_col = ending_square[1]  # The integer col value of the ending square
-        # if black is at the top
-        if self.bottom_color == 'w':
-            if moved_to_piece == Player.EMPTY and next_square_col == 2 and self.king_can_castle_left(
-                    moving_piece.get_player()):
-                move = ChessMove(starting_square, ending_square, self, self._is_check)
-                move.castling_move((0, 0), (0, 3), self)
-                self.move_log.append(move)
-
-                self.get_piece(0, 0).change_col_number(3)
-                # move rook
-                self.board[0][3] = self.board[0][0]
-                self.board[0][0] = Player.EMPTY
-
-                self.black_king_can_castle[0] = False
-                self.black_king_can_castle[1] = False
-
-            elif moved_to_piece == Player.EMPTY and next_square_col == 6 and self.king_can_castle_right(
-                    moving_piece.get_player()):
-                move = ChessMove(starting_square, ending_square, self, self._is_check)
-                move.castling_move((0, 7), (0, 5), self)
-                self.move_log.append(move)
-
-                self.get_piece(0, 7).change_col_number(5)
-
-                # move rook
-                self.board[0][5] = self.board[0][7]
-                self.board[0][7] = Player.EMPTY
-
-                self.black_king_can_castle[0] = False
-                self.black_king_can_castle[2] = False
-            else:
-                move = ChessMove(starting_square, ending_square, self, self._is_check)
-                self.move_log.append(move)
-                self.black_king_can_castle[0] = False
-            self._black_king_location = (next_square_row, next_square_col)
-        # if black is at the bottom
+        if moved_to_piece == Player.EMPTY and next_square_col == 2 and self.king_can_castle_left(
+                moving_piece.get_player()):
+            self._log_move(starting_square, ending_square, move_encoding.CASTLING)
+
+            self.get_piece(0, 0).change_col_number(3)
+            # move rook
+            self._set_square(0, 3, self.board[0][0])
+            self._set_square(0, 0, Player.EMPTY)
+
+            self._lose_castle_right(Player.PLAYER_BLACK, 0)
+            self._lose_castle_right(Player.PLAYER_BLACK, 1)
+
+        elif moved_to_piece == Player.EMPTY and next_square_col == 6 and self.king_can_castle_right(
+                moving_piece.get_player()):
+            self._log_move(starting_square, ending_square, move_encoding.CASTLING)
+
+            self.get_piece(0, 7).change_col_number(5)
+
+            # move rook
+            self._set_square(0, 5, self.board[0][7])
+            self._set_square(0, 7, Player.EMPTY)
+
+            self._lose_castle_right(Player.PLAYER_BLACK, 0)
+            self._lose_castle_right(Player.PLAYER_BLACK, 2)
         else:
-            if moved_to_piece == Player.EMPTY and next_square_col == 1 and self.king_can_castle_left(
-                    moving_piece.get_player()):
-                move = ChessMove(starting_square, ending_square, self, self._is_check)
-                move.castling_move((7, 0), (7, 2), self)
-                self.move_log.append(move)
-
-                self.get_piece(7, 0).change_col_number(2)
-                # move rook
-                self.board[7][2] = self.board[7][0]
-                self.board[7][0] = Player.EMPTY
-
-                self.black_king_can_castle[0] = False
-                self.black_king_can_castle[1] = False
-            elif moved_to_piece == Player.EMPTY and next_square_col == 5 and self.king_can_castle_right(
-                    moving_piece.get_player()):
-                move = ChessMove(starting_square, ending_square, self, self._is_check)
-                move.castling_move((7, 7), (7, 4), self)
-                self.move_log.append(move)
-
-                self.get_piece(7, 7).change_col_number(4)
-
-                # move rook
-                self.board[7][4] = self.board[7][7]
-                self.board[7][7] = Player.EMPTY
-
-                self.black_king_can_castle[0] = False
-                self.black_king_can_castle[2] = False
-            else:
-                move = ChessMove(starting_square, ending_square, self, self._is_check)
-                self.move_log.append(move)
-                self.black_king_can_castle[0] = False
-            self._black_king_location = (next_square_row, next_square_col)
+            self._log_move(starting_square, ending_square)
+            self._lose_castle_right(Player.PLAYER_BLACK, 0)
 
     # Move a piece
-    def move_piece(self, starting_square, ending_square):
+    def move_piece(self, starting_square, ending_square, promotion=None):
         """
         handles moving of a piece, some special conditions apply for king, rook and pawn
         if we're moving the king to a square where he can castle and he is allowed to castle, then handle castling
-        if we're moving the rook, the set the player's castling rights to false for that side
+        if we're moving the rook (or taking one that never moved), the player loses castling rights on that side
         if pawn is being promoted, promote_pawn handles it and we don't have to move there
+        (promotion is passed on to it, when it is None the user is asked what to promote to)
         this is why I used the 'temp' variable as a flag in order not to move empty square to promoted square
         if temp is True, which means we haven't done a promotion, then move piece
+        if a pawn takes en passant, the pawn it passed is removed, and a pawn moving two squares can be taken
+        en passant on the next move
         add move to move_log which will serve for undoing moves
         returns: None
         """
@@ -620,11 +878,9 @@ class GameState:
             # The chess piece at the starting square
             moving_piece = self.get_piece(current_square_row, current_square_col)
 
-            valid_moves = self.get_valid_moves(starting_square)
-
             temp = True
 
-            if ending_square in valid_moves:
+            if self.is_legal_move(starting_square, ending_square):
                 moved_to_piece = self.get_piece(next_square_row, next_square_col)
                 if moving_piece.get_name() == "k":
                     if moving_piece.is_player(Player.PLAYER_WHITE):
@@ -632,127 +888,125 @@ class GameState:
                     else:
                         self.handle_black_castling(moving_piece, moved_to_piece, starting_square, ending_square)
                 elif moving_piece.get_name() == "r":
-                    if moving_piece.is_player(Player.PLAYER_WHITE) and current_square_col == 0:
-                        self.white_king_can_castle[1] = False
-                    elif moving_piece.is_player(Player.PLAYER_WHITE) and current_square_col == 7:
-                        self.white_king_can_castle[2] = False
-                    elif moving_piece.is_player(Player.PLAYER_BLACK) and current_square_col == 0:
-                        self.white_king_can_castle[1] = False
-                    elif moving_piece.is_player(Player.PLAYER_BLACK) and current_square_col == 7:
-                        self.white_king_can_castle[2] = False
-                    self.move_log.append(ChessMove(starting_square, ending_square, self, self._is_check))
+                    self._log_move(starting_square, ending_square)
+                    self._remove_rook_castling(moving_piece.get_player(), current_square_row, current_square_col)
                 elif moving_piece.get_name() == "p":
-                    # Promoting white pawn
-                    if moving_piece.is_player(Player.PLAYER_WHITE):
-                        if self.bottom_color == 'w' and next_square_row == 0:
-                            self.promote_pawn(starting_square, moving_piece, ending_square)
-                            temp = False
-                        elif self.bottom_color == 'b' and next_square_row == 7:
-                            self.promote_pawn(starting_square, moving_piece, ending_square)
-                            temp = False
-                    # Promoting black pawn
-                    if moving_piece.is_player(Player.PLAYER_BLACK):
-                        if self.bottom_color == 'w' and next_square_row == 7:
-                            self.promote_pawn(starting_square, moving_piece, ending_square)
-                            temp = False
-                        elif self.bottom_color == 'b' and next_square_row == 0:
-                            self.promote_pawn(starting_square, moving_piece, ending_square)
-                            temp = False
-                    # Moving pawn forward by two
-                    if abs(next_square_row - current_square_row) == 2 and current_square_col == next_square_col:
-                        self.move_log.append(ChessMove(starting_square, ending_square, self, self._is_check))
-                    # moving forward by one or taking a piece
+                    # Promoting a pawn that reaches the other end of the board
+                    if next_square_row == (0 if self.get_pawn_direction(moving_piece.get_player()) == bitboard.UP
+                                           else 7):
+                        self.promote_pawn(starting_square, moving_piece, ending_square, promotion)
+                        temp = False
+                    # taking en passant, the pawn that is taken is next to us, not on the ending square
+                    elif ending_square == self.en_passant_square and next_square_col != current_square_col:
+                        self._log_move(starting_square, ending_square, move_encoding.EN_PASSANT)
+                        self._set_square(current_square_row, next_square_col, Player.EMPTY)
+                    elif abs(next_square_row - current_square_row) == 2:
+                        self._log_move(starting_square, ending_square, move_encoding.DOUBLE_PUSH)
                     else:
-                        self.move_log.append(ChessMove(starting_square, ending_square, self, self._is_check))
+                        self._log_move(starting_square, ending_square)
                 else:
-                    self.move_log.append(ChessMove(starting_square, ending_square, self, self._is_check))
+                    self._log_move(starting_square, ending_square)
+
+                if moved_to_piece != Player.EMPTY and moved_to_piece.get_name() == "r":
+                    self._remove_rook_castling(moved_to_piece.get_player(), next_square_row, next_square_col)
+
+                # Moving pawn forward by two, it can be taken en passant on the square it skipped
+                if moving_piece.get_name() == "p" and abs(next_square_row - current_square_row) == 2:
+                    self._set_en_passant_square(((current_square_row + next_square_row) // 2, current_square_col))
+                else:
+                    self._set_en_passant_square(None)
 
                 if temp:
                     moving_piece.change_row_number(next_square_row)
                     moving_piece.change_col_number(next_square_col)
-                    self.board[next_square_row][next_square_col] = self.board[current_square_row][current_square_col]
-                    self.board[current_square_row][current_square_col] = Player.EMPTY
+                    self._set_square(next_square_row, next_square_col,
+                                     self.board[current_square_row][current_square_col])
+                    self._set_square(current_square_row, current_square_col, Player.EMPTY)
 
                 self.white_turn = not self.white_turn
+                self._position_key ^= zobrist.BLACK_TO_MOVE_KEY
+                self._game_status = None
 
             else:
                 pass
 
+    def _log_move(self, starting_square, ending_square, flags=move_encoding.QUIET):
+        """
+        packs the move into move_log and the castling rights and en passant square into _undo_log,
+        it has to be called before the move changes any of them
+        a piece that is taken goes on the captives list of the player taking it
+        """
+        moving_piece = self.board[starting_square[0]][starting_square[1]]
+        if flags == move_encoding.EN_PASSANT:
+            taken_piece = self.board[starting_square[0]][ending_square[1]]
+        else:
+            taken_piece = self.board[ending_square[0]][ending_square[1]]
+        if taken_piece != Player.EMPTY:
+            flags |= move_encoding.CAPTURE
+            if moving_piece.is_player(Player.PLAYER_WHITE):
+                self.white_captives.append(taken_piece)
+            else:
+                self.black_captives.append(taken_piece)
+        self.move_log.append(move_encoding.encode_move(starting_square, ending_square, flags))
+        self._undo_log.append(move_encoding.encode_undo_state(self.white_king_can_castle, self.black_king_can_castle,
+                                                              self.en_passant_square))
+
     def undo_move(self):
         """
         handles reversing a move, does so by taking last move from move_log and doing it backwards
-        handles special cases such as restoring castling rights and pawn demotions
+        handles special cases such as moving the rook back after castling, pawn demotions and en passant
+        the castling rights and en passant square saved next to the move are restored
+        returns the packed move that was undone
         if it comes back to the first move, will print 'Back to the beginning!'
         """
         if self.move_log:
-            undoing_move = self.move_log.pop()
-            if undoing_move.castled is True:
-                self.board[undoing_move.starting_square_row][
-                    undoing_move.starting_square_col] = undoing_move.moving_piece
-                self.board[undoing_move.ending_square_row][undoing_move.ending_square_col] = undoing_move.removed_piece
-                self.get_piece(undoing_move.starting_square_row, undoing_move.starting_square_col).change_row_number(
-                    undoing_move.starting_square_row)
-                self.get_piece(undoing_move.starting_square_row, undoing_move.starting_square_col).change_col_number(
-                    undoing_move.starting_square_col)
-
-                self.board[undoing_move.rook_starting_square[0]][
-                    undoing_move.rook_starting_square[1]] = undoing_move.moving_rook
-                self.board[undoing_move.rook_ending_square[0]][undoing_move.rook_ending_square[1]] = Player.EMPTY
-                undoing_move.moving_rook.change_row_number(undoing_move.rook_starting_square[0])
-                undoing_move.moving_rook.change_col_number(undoing_move.rook_starting_square[1])
-                if undoing_move.moving_piece is Player.PLAYER_WHITE:
-                    if undoing_move.rook_starting_square[1] == 0:
-                        self.white_king_can_castle[0] = True
-                        self.white_king_can_castle[1] = True
-                    elif undoing_move.rook_starting_square[1] == 7:
-                        self.white_king_can_castle[0] = True
-                        self.white_king_can_castle[2] = True
-                else:
-                    if undoing_move.rook_starting_square[1] == 0:
-                        self.black_king_can_castle[0] = True
-                        self.black_king_can_castle[1] = True
-                    elif undoing_move.rook_starting_square[1] == 7:
-                        self.black_king_can_castle[0] = True
-                        self.black_king_can_castle[2] = True
-            elif undoing_move.pawn_promoted is True:
-                self.board[undoing_move.starting_square_row][
-                    undoing_move.starting_square_col] = undoing_move.moving_piece
-                self.get_piece(undoing_move.starting_square_row, undoing_move.starting_square_col).change_row_number(
-                    undoing_move.starting_square_row)
-                self.get_piece(undoing_move.starting_square_row, undoing_move.starting_square_col).change_col_number(
-                    undoing_move.starting_square_col)
-
-                self.board[undoing_move.ending_square_row][undoing_move.ending_square_col] = undoing_move.removed_piece
-                if undoing_move.removed_piece != Player.EMPTY:
-                    self.get_piece(undoing_move.ending_square_row, undoing_move.ending_square_col).change_row_number(
-                        undoing_move.ending_square_row)
-                    self.get_piece(undoing_move.ending_square_row, undoing_move.ending_square_col).change_col_number(
-                        undoing_move.ending_square_col)
+            move = self.move_log.pop()
+            undo_state = self._undo_log.pop()
+            starting_row, starting_col = move_encoding.starting_square(move)
+            ending_row, ending_col = move_encoding.ending_square(move)
+            flags = move_encoding.flags(move)
+
+            moving_piece = self.board[ending_row][ending_col]
+            player = moving_piece.get_player()
+            if flags & move_encoding.PROMOTION:
+                # the pawn was replaced by the new piece, put a pawn back instead
+                moving_piece = Pawn('p', starting_row, starting_col, player)
+            taken_piece = Player.EMPTY
+            if flags & move_encoding.CAPTURE:
+                taken_piece = self.white_captives.pop() if player == Player.PLAYER_WHITE else self.black_captives.pop()
+
+            self._set_square(starting_row, starting_col, moving_piece)
+            moving_piece.change_row_number(starting_row)
+            moving_piece.change_col_number(starting_col)
+            if flags == move_encoding.EN_PASSANT:
+                # the taken pawn was next to the starting square, not on the ending square
+                self._set_square(ending_row, ending_col, Player.EMPTY)
+                self._set_square(starting_row, ending_col, taken_piece)
             else:
-                self.board[undoing_move.starting_square_row][
-                    undoing_move.starting_square_col] = undoing_move.moving_piece
-                self.get_piece(undoing_move.starting_square_row, undoing_move.starting_square_col).change_row_number(
-                    undoing_move.starting_square_row)
-                self.get_piece(undoing_move.starting_square_row, undoing_move.starting_square_col).change_col_number(
-                    undoing_move.starting_square_col)
-
-                self.board[undoing_move.ending_square_row][undoing_move.ending_square_col] = undoing_move.removed_piece
-                if undoing_move.removed_piece != Player.EMPTY:
-                    self.get_piece(undoing_move.ending_square_row, undoing_move.ending_square_col).change_row_number(
-                        undoing_move.ending_square_row)
-                    self.get_piece(undoing_move.ending_square_row, undoing_move.ending_square_col).change_col_number(
-                        undoing_move.ending_square_col)
-
+                self._set_square(ending_row, ending_col, taken_piece)
+
+            if flags == move_encoding.CASTLING:
+                # the king moved towards the rook
+                side = 'left' if ending_col < starting_col else 'right'
+                _, _, rook_col, rook_end_col, _ = self._CASTLING_COLUMNS[side]
+                rook = self.board[ending_row][rook_end_col]
+                self._set_square(ending_row, rook_col, rook)
+                self._set_square(ending_row, rook_end_col, Player.EMPTY)
+                rook.change_col_number(rook_col)
+
+            white_castling, black_castling, en_passant_square = move_encoding.decode_undo_state(undo_state)
+            self._position_key ^= zobrist.castling_key(Player.PLAYER_WHITE, self.white_king_can_castle) ^ \
+                zobrist.castling_key(Player.PLAYER_BLACK, self.black_king_can_castle)
+            self.white_king_can_castle = white_castling
+            self.black_king_can_castle = black_castling
+            self._position_key ^= zobrist.castling_key(Player.PLAYER_WHITE, self.white_king_can_castle) ^ \
+                zobrist.castling_key(Player.PLAYER_BLACK, self.black_king_can_castle)
+            self._set_en_passant_square(en_passant_square)
             self.white_turn = not self.white_turn
+            self._position_key ^= zobrist.BLACK_TO_MOVE_KEY
+            self._game_status = None
 
-            if undoing_move.moving_piece.get_name() == "k" and undoing_move.moving_piece.get_player() is \
-                    Player.PLAYER_WHITE:
-                self._white_king_location = (undoing_move.starting_square_row, undoing_move.starting_square_col)
-            elif undoing_move.moving_piece.get_name() == "k" and undoing_move.moving_piece.get_player() is \
-                    Player.PLAYER_BLACK:
-                self._black_king_location = (undoing_move.starting_square_row, undoing_move.starting_square_col)
-
-            return undoing_move
+            return move
         else:
             print("Back to the beginning!")
 
@@ -772,313 +1026,151 @@ class GameState:
         - if immediate check, change check value to true
         - list valid moves to prevent check but not remove pin
         - if there are no valid moves to prevent check, checkmate
+        returns [checking squares, pinned squares, squares of the pinning pieces]
         """
         self._is_check = False
         _checks = []
         _pins = []
         _pins_check = []
 
-        king_location_row = king_location[0]
-        king_location_col = king_location[1]
-
-        up = down = left = right = 1
-
-        # Left of the king
-        _possible_pin = ()
-        while king_location_col - left >= 0 and self.get_piece(king_location_row, king_location_col - left) is not None:
-            if self.is_valid_piece(king_location_row, king_location_col - left) and \
-                    self.get_piece(king_location_row, king_location_col - left).is_player(player) and \
-                    self.get_piece(king_location_row, king_location_col - left).get_name() != "k":
-                if not _possible_pin:
-                    _possible_pin = (king_location_row, king_location_col - left)
-                else:
-                    break
-            elif self.is_valid_piece(king_location_row, king_location_col - left) and \
-                    not self.get_piece(king_location_row, king_location_col - left).is_player(player):
-                if _possible_pin:
-                    temp = self.board[_possible_pin[0]][_possible_pin[1]]
-                    self.board[_possible_pin[0]][_possible_pin[1]] = Player.EMPTY
-                    if (king_location_row, king_location_col) in \
-                            self.get_piece(king_location_row, king_location_col - left).get_valid_piece_takes(self):
-                        _pins.append(_possible_pin)
-                        _pins_check.append((king_location_row, king_location_col - left))
-                    self.board[_possible_pin[0]][_possible_pin[1]] = temp
-                else:
-                    if (king_location_row, king_location_col) in \
-                            self.get_piece(king_location_row, king_location_col - left).get_valid_piece_takes(self):
-                        # self._is_check = True
-                        _checks.append((king_location_row, king_location_col - left))
-                break
-            left += 1
-
-        # right of the king
-        _possible_pin = ()
-        while king_location_col + right < 8 and self.get_piece(king_location_row,
-                                                               king_location_col + right) is not None:
-            if self.is_valid_piece(king_location_row, king_location_col + right) and \
-                    self.get_piece(king_location_row, king_location_col + right).is_player(player) and \
-                    self.get_piece(king_location_row, king_location_col + right).get_name() != "k":
-                if not _possible_pin:
-                    _possible_pin = (king_location_row, king_location_col + right)
-                else:
-                    break
-            elif self.is_valid_piece(king_location_row, king_location_col + right) and \
-                    not self.get_piece(king_location_row, king_location_col + right).is_player(player):
-                if _possible_pin:
-                    temp = self.board[_possible_pin[0]][_possible_pin[1]]
-                    self.board[_possible_pin[0]][_possible_pin[1]] = Player.EMPTY
-                    if (king_location_row, king_location_col) in \
-                            self.get_piece(king_location_row, king_location_col + right).get_valid_piece_takes(self):
-                        _pins.append(_possible_pin)
-                        _pins_check.append((king_location_row, king_location_col + right))
-                    self.board[_possible_pin[0]][_possible_pin[1]] = temp
-                else:
-                    if (king_location_row, king_location_col) in \
-                            self.get_piece(king_location_row, king_location_col + right).get_valid_piece_takes(self):
-                        # self._is_check = True
-                        _checks.append((king_location_row, king_location_col + right))
-                break
-            right += 1
-
-        # below the king
-        _possible_pin = ()
-        while king_location_row + down < 8 and self.get_piece(king_location_row + down, king_location_col) is not None:
-            if self.is_valid_piece(king_location_row + down, king_location_col) and \
-                    self.get_piece(king_location_row + down, king_location_col).is_player(player) and \
-                    self.get_piece(king_location_row + down, king_location_col).get_name() != "k":
-                if not _possible_pin:
-                    _possible_pin = (king_location_row + down, king_location_col)
-                else:
-                    break
-            elif self.is_valid_piece(king_location_row + down, king_location_col) and \
-                    not self.get_piece(king_location_row + down, king_location_col).is_player(player):
-                if _possible_pin:
-                    temp = self.board[_possible_pin[0]][_possible_pin[1]]
-                    self.board[_possible_pin[0]][_possible_pin[1]] = Player.EMPTY
-                    if (king_location_row, king_location_col) in \
-                            self.get_piece(king_location_row + down, king_location_col).get_valid_piece_takes(self):
-                        _pins.append(_possible_pin)
-                        _pins_check.append((king_location_row + down, king_location_col))
-                    self.board[_possible_pin[0]][_possible_pin[1]] = temp
-                else:
-                    if (king_location_row, king_location_col) in \
-                            self.get_piece(king_location_row + down, king_location_col).get_valid_piece_takes(self):
-                        # self._is_check = True
-                        _checks.append((king_location_row + down, king_location_col))
-                break
-            down += 1
-
-        # above the king
-        _possible_pin = ()
-        while king_location_row - up >= 0 and self.get_piece(king_location_row - up, king_location_col) is not None:
-            if self.is_valid_piece(king_location_row - up, king_location_col) and \
-                    self.get_piece(king_location_row - up, king_location_col).is_player(player) and \
-                    self.get_piece(king_location_row - up, king_location_col).get_name() != "k":
-                if not _possible_pin:
-                    _possible_pin = (king_location_row - up, king_location_col)
-                else:
-                    break
-            elif self.is_valid_piece(king_location_row - up, king_location_col) and \
-                    not self.get_piece(king_location_row - up, king_location_col).is_player(player):
-                if _possible_pin:
-                    temp = self.board[_possible_pin[0]][_possible_pin[1]]
-                    self.board[_possible_pin[0]][_possible_pin[1]] = Player.EMPTY
-                    if (king_location_row, king_location_col) in \
-                            self.get_piece(king_location_row - up, king_location_col).get_valid_piece_takes(self):
-                        _pins.append(_possible_pin)
-                        _pins_check.append((king_location_row - up, king_location_col))
-                    self.board[_possible_pin[0]][_possible_pin[1]] = temp
-                else:
-                    if (king_location_row, king_location_col) in \
-                            self.get_piece(king_location_row - up, king_location_col).get_valid_piece_takes(self):
-                        # self._is_check = True
-                        _checks.append((king_location_row - up, king_location_col))
-                break
-            up += 1
-
-        # left up
-        up = 1
-        left = 1
-        _possible_pin = ()
-        while king_location_col - left >= 0 and king_location_row - up >= 0 and \
-                self.get_piece(king_location_row - up, king_location_col - left) is not None:
-            if self.is_valid_piece(king_location_row - up, king_location_col - left) and \
-                    self.get_piece(king_location_row - up, king_location_col - left).is_player(player) and \
-                    self.get_piece(king_location_row - up, king_location_col - left).get_name() != "k":
-                if not _possible_pin:
-                    _possible_pin = (king_location_row - up, king_location_col - left)
-                else:
-                    break
-            elif self.is_valid_piece(king_location_row - up, king_location_col - left) and \
-                    not self.get_piece(king_location_row - up, king_location_col - left).is_player(player):
-                if _possible_pin:
-                    temp = self.board[_possible_pin[0]][_possible_pin[1]]
-                    self.board[_possible_pin[0]][_possible_pin[1]] = Player.EMPTY
-                    if (king_location_row, king_location_col) in \
-                            self.get_piece(king_location_row - up, king_location_col - left).get_valid_piece_takes(
-                                self):
-                        _pins.append(_possible_pin)
-                        _pins_check.append((king_location_row - up, king_location_col - left))
-                    self.board[_possible_pin[0]][_possible_pin[1]] = temp
-                else:
-                    if (king_location_row, king_location_col) in \
-                            self.get_piece(king_location_row - up, king_location_col - left).get_valid_piece_takes(
-                                self):
-                        # self._is_check = True
-                        _checks.append((king_location_row - up, king_location_col - left))
-                break
-            left += 1
-            up += 1
-
-        # right up
-        up = 1
-        right = 1
-        _possible_pin = ()
-        while king_location_col + right < 8 and king_location_row - up >= 0 and \
-                self.get_piece(king_location_row - up, king_location_col + right) is not None:
-            if self.is_valid_piece(king_location_row - up, king_location_col + right) and \
-                    self.get_piece(king_location_row - up, king_location_col + right).is_player(player) and \
-                    self.get_piece(king_location_row - up, king_location_col + right).get_name() != "k":
-                if not _possible_pin:
-                    _possible_pin = (king_location_row - up, king_location_col + right)
-                else:
-                    break
-            elif self.is_valid_piece(king_location_row - up, king_location_col + right) and \
-                    not self.get_piece(king_location_row - up, king_location_col + right).is_player(player):
-                if _possible_pin:
-                    temp = self.board[_possible_pin[0]][_possible_pin[1]]
-                    self.board[_possible_pin[0]][_possible_pin[1]] = Player.EMPTY
-                    if (king_location_row, king_location_col) in \
-                            self.get_piece(king_location_row - up, king_location_col + right).get_valid_piece_takes(
-                                self):
-                        _pins.append(_possible_pin)
-                        _pins_check.append((king_location_row - up, king_location_col + right))
-                    self.board[_possible_pin[0]][_possible_pin[1]] = temp
-                else:
-                    if (king_location_row, king_location_col) in \
-                        self.get_piece(king_location_row - up,
-                                       king_location_col + right).get_valid_piece_takes(self):
-                        # self._is_check = True
-                        _checks.append((king_location_row - up, king_location_col + right))
-                break
-            right += 1
-            up += 1
-
-        # left down
-        down = 1
-        left = 1
-        _possible_pin = ()
-        while king_location_col - left >= 0 and king_location_row + down < 8 and \
-                self.get_piece(king_location_row + down, king_location_col - left) is not None:
-            if self.is_valid_piece(king_location_row + down, king_location_col - left) and \
-                    self.get_piece(king_location_row + down, king_location_col - left).is_player(player) and \
-                    self.get_piece(king_location_row + down, king_location_col - left).get_name() != "k":
-                if not _possible_pin:
-                    _possible_pin = (king_location_row + down, king_location_col - left)
-                else:
-                    break
-            elif self.is_valid_piece(king_location_row + down, king_location_col - left) and \
-                    not self.get_piece(king_location_row + down, king_location_col - left).is_player(player):
-                if _possible_pin:
-                    temp = self.board[_possible_pin[0]][_possible_pin[1]]
-                    self.board[_possible_pin[0]][_possible_pin[1]] = Player.EMPTY
-                    if (king_location_row, king_location_col) in \
-                            self.get_piece(king_location_row + down,
-                                           king_location_col - left).get_valid_piece_takes(self):
-                        _pins.append(_possible_pin)
-                        _pins_check.append((king_location_row + down, king_location_col - left))
-                    self.board[_possible_pin[0]][_possible_pin[1]] = temp
-                else:
-                    if (king_location_row, king_location_col) in \
-                            self.get_piece(king_location_row + down,
-                                           king_location_col - left).get_valid_piece_takes(self):
-                        # self._is_check = True
-                        _checks.append((king_location_row + down, king_location_col - left))
-                break
-            left += 1
-            down += 1
-
-        # right down
-        down = 1
-        right = 1
-        _possible_pin = ()
-        while king_location_col + right < 8 and king_location_row + down < 8 and \
-                self.get_piece(king_location_row + down, king_location_col + right) is not None:
-            if self.is_valid_piece(king_location_row + down, king_location_col + right) and \
-                    self.get_piece(king_location_row + down, king_location_col + right).is_player(player) and \
-                    self.get_piece(king_location_row + down, king_location_col + right).get_name() != "k":
-                if not _possible_pin:
-                    _possible_pin = (king_location_row + down, king_location_col + right)
-                else:
-                    break
-            elif self.is_valid_piece(king_location_row + down, king_location_col + right) and \
-                    not self.get_piece(king_location_row + down, king_location_col + right).is_player(player):
-                if _possible_pin:
-                    temp = self.board[_possible_pin[0]][_possible_pin[1]]
-                    self.board[_possible_pin[0]][_possible_pin[1]] = Player.EMPTY
-                    if (king_location_row, king_location_col) in \
-                            self.get_piece(king_location_row + down,
-                                           king_location_col + right).get_valid_piece_takes(self):
-                        _pins.append(_possible_pin)
-                        _pins_check.append((king_location_row + down, king_location_col + right))
-                    self.board[_possible_pin[0]][_possible_pin[1]] = temp
-                else:
-                    if (king_location_row, king_location_col) in \
-                            self.get_piece(king_location_row + down,
-                                           king_location_col + right).get_valid_piece_takes(self):
-                        # self._is_check = True
-                        _checks.append((king_location_row + down, king_location_col + right))
-                break
-            right += 1
-            down += 1
-
-        # knights
-        row_change = [-2, -2, -1, -1, +1, +1, +2, +2]
-        col_change = [-1, +1, -2, +2, -2, +2, +1, -1]
-        for i in range(0, 8):
-            if self.is_valid_piece(king_location_row + row_change[i], king_location_col + col_change[i]) and \
-                    not self.get_piece(king_location_row + row_change[i], king_location_col + col_change[i]).is_player(
-                        player):
-                if (king_location_row, king_location_col) in self.get_piece(king_location_row + row_change[i],
-                                                                            king_location_col + col_change[
-                                                                                i]).get_valid_piece_takes(self):
-                    # self._is_check = True
-                    _checks.append((king_location_row + row_change[i], king_location_col + col_change[i]))
+        king_square = bitboard.square_index(king_location[0], king_location[1])
+        _checks.extend(bitboard.to_moves(self.get_attackers(king_square, self.get_opponent(player))))
+        for pinned, pinner in self._find_pins(king_square, player):
+            _pins.append(divmod(pinned, 8))
+            _pins_check.append(divmod(pinner, 8))
         return [_checks, _pins, _pins_check]
 
+    def _board_square(self, file, rank):
+        """
+        returns the (row, col) of a square given as file and rank (0 to 7, a1 is (0, 0))
+        """
+        return 7 - rank, file
 
-class ChessMove:
-    def __init__(self, starting_square, ending_square, game_state, in_check):
-        self.starting_square_row = starting_square[0]
-        self.starting_square_col = starting_square[1]
-        self.moving_piece = game_state.get_piece(self.starting_square_row, self.starting_square_col)
-        self.in_check = in_check
-
-        self.ending_square_row = ending_square[0]
-        self.ending_square_col = ending_square[1]
-        if game_state.is_valid_piece(self.ending_square_row, self.ending_square_col):
-            self.removed_piece = game_state.get_piece(self.ending_square_row, self.ending_square_col)
-        else:
-            self.removed_piece = Player.EMPTY
+    def square_name(self, row, col):
+        """
+        returns the name of the square in algebraic notation, e.g. 'e4'
+        """
+        return "abcdefgh"[col] + str(8 - row)
 
-        # serve to restore castling rights in undo_move()
-        self.castled = False
-        self.rook_starting_square = None
-        self.rook_ending_square = None
-        self.moving_rook = None
+    def move_name(self, starting_square, ending_square, promotion=None):
+        """
+        returns the move in the coordinate notation of UCI engines, e.g. 'e2e4' or 'a7a8q'
+        """
+        return self.square_name(*starting_square) + self.square_name(*ending_square) + (promotion or "")
 
-        self.pawn_promoted = False
-        self.replacement_piece = None
+    @classmethod
+    def from_fen(cls, fen, bottom_color='w'):
+        """
+        returns a new GameState with the position described by the FEN string
+        """
+        game_state = cls(bottom_color)
+        game_state.load_fen(fen)
+        return game_state
 
-    def castling_move(self, rook_starting_square, rook_ending_square, game_state):
-        self.castled = True
-        self.rook_starting_square = rook_starting_square
-        self.rook_ending_square = rook_ending_square
-        self.moving_rook = game_state.get_piece(rook_starting_square[0], rook_starting_square[1])
+    def load_fen(self, fen):
+        """
+        replaces the position with the one described by the FEN string (Forsyth-Edwards Notation)
+        the move log is cleared, so the loaded position can't be undone
+        the half move clock and move number are not kept, the game state doesn't track them
+        """
+        fields = fen.split()
+        piece_classes = {"r": Rook, "n": Knight, "b": Bishop, "q": Queen, "k": King, "p": Pawn}
+        for row in range(8):
+            for col in range(8):
+                self._set_square(row, col, Player.EMPTY)
+        for rank_index, rank_text in enumerate(fields[0].split("/")):
+            file = 0
+            for char in rank_text:
+                if char.isdigit():
+                    file += int(char)
+                    continue
+                row, col = self._board_square(file, 7 - rank_index)
+                player = Player.PLAYER_WHITE if char.isupper() else Player.PLAYER_BLACK
+                name = char.lower()
+                self._set_square(row, col, piece_classes[name](name, row, col, player))
+                file += 1
+
+        self.white_turn = fields[1] == "w"
+        castling = fields[2] if len(fields) > 2 else "-"
+        # the rook on the left (col 0) is the queen side one
+        self.white_king_can_castle = ["K" in castling or "Q" in castling, "Q" in castling, "K" in castling]
+        self.black_king_can_castle = ["k" in castling or "q" in castling, "q" in castling, "k" in castling]
+        en_passant = fields[3] if len(fields) > 3 else "-"
+        self.en_passant_square = None if en_passant == "-" else \
+            self._board_square("abcdefgh".index(en_passant[0]), int(en_passant[1]) - 1)
+
+        self.move_log = array('H')
+        self._undo_log = array('H')
+        self.white_captives = []
+        self.black_captives = []
+        self.checkmate = False
+        self.stalemate = False
+        self._game_status = None
+        self._is_check = False
+        self._position_key = zobrist.compute_key(self)
 
-    def pawn_promotion_move(self, new_piece):
-        self.pawn_promoted = True
-        self.replacement_piece = new_piece
+    def to_fen(self):
+        """
+        returns the FEN string of the position
+        the half move clock is always 0 and the move number counts the moves in the move log
+        """
+        ranks = []
+        for rank in range(7, -1, -1):
+            rank_text = ""
+            empty = 0
+            for file in range(8):
+                row, col = self._board_square(file, rank)
+                piece = self.board[row][col]
+                if piece == Player.EMPTY:
+                    empty += 1
+                    continue
+                if empty:
+                    rank_text += str(empty)
+                    empty = 0
+                rank_text += piece.get_name().upper() if piece.is_player(Player.PLAYER_WHITE) else piece.get_name()
+            ranks.append(rank_text + (str(empty) if empty else ""))
+
+        castling = ""
+        for rights, letters in ((self.white_king_can_castle, "KQ"), (self.black_king_can_castle, "kq")):
+            if rights[0]:
+                castling += (letters[0] if rights[2] else "") + (letters[1] if rights[1] else "")
+        en_passant = "-" if self.en_passant_square is None else self.square_name(*self.en_passant_square)
+        return " ".join(["/".join(ranks), "w" if self.white_turn else "b", castling or "-", en_passant,
+                         "0", str(len(self.move_log) // 2 + 1)])
+
+    def get_legal_moves_with_promotions(self):
+        """
+        returns the legal moves of the player to move as (starting square, ending square, promotion) with one move
+        for each piece a pawn reaching the last row can be promoted to, the promotion is None for all other moves
+        """
+        return list(self.iter_legal_moves())
 
-    def get_moving_piece(self):
-        return self.moving_piece
+    def perft(self, depth):
+        """
+        returns the number of leaf nodes of the legal move tree depth moves deep (performance test)
+        the counts of well known positions are published, so it checks move generation, moving and undoing
+        all at once, and timing it measures their speed
+        """
+        if depth == 0:
+            return 1
+        _moves = self.get_legal_moves_with_promotions()
+        if depth == 1:
+            return len(_moves)
+        nodes = 0
+        for starting_square, ending_square, promotion in _moves:
+            self.move_piece(starting_square, ending_square, promotion)
+            nodes += self.perft(depth - 1)
+            self.undo_move()
+        return nodes
+
+    def divide(self, depth):
+        """
+        returns {move name: perft(depth - 1) after the move} for every legal move, used to find which move
+        a wrong perft count comes from
+        """
+        _divide = {}
+        for starting_square, ending_square, promotion in self.get_legal_moves_with_promotions():
+            self.move_piece(starting_square, ending_square, promotion)
+            _divide[self.move_name(starting_square, ending_square, promotion)] = self.perft(depth - 1)
+            self.undo_move()
+        return _divide
@@ -8,9 +8,10 @@ Facilitates the following:
 import pygame
 
 import chess_engine
+import move_cache
 from configparser import ConfigParser
 from settings import *
-from enums import Player
+from enums import Player, GameStatus
 
 file = 'config.ini'
 config = ConfigParser()
@@ -19,6 +20,7 @@ config.read(file)
 WIDTH = int(config['SCREEN']['WIDTH'])
 HEIGHT = int(config['SCREEN']['HEIGHT']) + OFFSET  # 512 + 128 (OFFSET)
 SQ_SIZE = int(config['BOARD']['SQ_SIZE'])
+MOVE_CACHE_SIZE = int(config['ENGINE']['MOVE_CACHE_SIZE'])
 
 
 def load_images():
@@ -30,6 +32,20 @@ def load_images():
         IMAGES[p] = py.transform.scale(py.image.load("images/" + p + ".png"), (SQ_SIZE, SQ_SIZE))
 
 
+def flip_square(row, col, bottom_color):
+    """
+    The engine always keeps white at the bottom, so when black is at the bottom the board is drawn turned around
+    Maps a square of the engine to the square it is drawn on and back (turning around twice changes nothing)
+    :param row: row of the square
+    :param col: col of the square
+    :param bottom_color: color at the bottom of the screen ('w' or 'b')
+    :return: (row, col) of the square on the other side
+    """
+    if bottom_color == 'w':
+        return row, col
+    return 7 - row, 7 - col
+
+
 def draw_game_state(screen, game_state, valid_moves, square_selected):
     """
     Draw the whole game state
@@ -94,7 +110,7 @@ def draw_pieces(screen, game_state):
     """
     for r in range(DIMENSION):
         for c in range(DIMENSION):
-            piece = game_state.get_piece(r, c)
+            piece = game_state.get_piece(*flip_square(r, c, game_state.get_bottom_color()))
             if piece is not None and piece != Player.EMPTY:
                 screen.blit(IMAGES[piece.get_player() + "_" + piece.get_name()],
                             py.Rect(c * SQ_SIZE, r * SQ_SIZE, SQ_SIZE, SQ_SIZE))  # example white_r
@@ -116,12 +132,11 @@ def draw_check(screen, text):
     screen.blit(checkmate_object, (x, y))
 
 
-def highlight_check(screen, king_location):
+def highlight_check(screen, game_state, king_location):
     """
     Puts a red color on king's square if the king is in check
     """
-    row = king_location[0]
-    col = king_location[1]
+    row, col = flip_square(king_location[0], king_location[1], game_state.get_bottom_color())
 
     s = py.Surface((SQ_SIZE, SQ_SIZE))
     s.set_alpha(100)
@@ -138,13 +153,13 @@ def check_if_check(screen, game_state):
     :param game_state: current game state
     :return: None
     """
+    # the attack maps are kept up to date by the game state, so this is a lookup and not a scan of the board
     if game_state.whose_turn():
-        # if the list of checks is not empty, then white must be in check
-        if game_state.check_for_check(game_state.get_white_king_location(), Player.PLAYER_WHITE)[0]:
-            highlight_check(screen, game_state.get_white_king_location())
+        if game_state.is_in_check(Player.PLAYER_WHITE):
+            highlight_check(screen, game_state, game_state.get_white_king_location())
     else:
-        if game_state.check_for_check(game_state.get_black_king_location(), Player.PLAYER_BLACK)[0]:
-            highlight_check(screen, game_state.get_black_king_location())
+        if game_state.is_in_check(Player.PLAYER_BLACK):
+            highlight_check(screen, game_state, game_state.get_black_king_location())
 
 
 def check_if_checkmate(screen, game_state, endgame):
@@ -152,16 +167,16 @@ def check_if_checkmate(screen, game_state, endgame):
     Check if player is in checkmate
     :param screen: the screen of the game
     :param game_state: current game state
-    :param endgame: holds value for state of game, if endgame == 3 then game is still going on
+    :param endgame: holds value for state of game, if endgame == GameStatus.ONGOING then game is still going on
     :return: None
     """
-    if endgame == 0:
+    if endgame == GameStatus.BLACK_WON:
         game_over = True
         draw_checkmate(screen, "Black wins.")
-    elif endgame == 1:
+    elif endgame == GameStatus.WHITE_WON:
         game_over = True
         draw_checkmate(screen, "White wins.")
-    elif endgame == 2:
+    elif endgame == GameStatus.STALEMATE:
         game_over = True
         draw_checkmate(screen, "Stalemate.")
 
@@ -207,13 +222,15 @@ def highlight_square(screen, game_state, valid_moves, square_selected):
             s = py.Surface((SQ_SIZE, SQ_SIZE))  # creating a new Surface
             s.set_alpha(100)  # setting transparency of highlight, takes in (0, 255)
             s.fill(py.Color("yellow"))
+            row, col = flip_square(row, col, game_state.get_bottom_color())
             screen.blit(s, (col * SQ_SIZE, row * SQ_SIZE))
 
             # highlight legal move squares
             s.fill(py.Color("green"))
 
             for move in valid_moves:
-                screen.blit(s, (move[1] * SQ_SIZE, move[0] * SQ_SIZE))
+                row, col = flip_square(move[0], move[1], game_state.get_bottom_color())
+                screen.blit(s, (col * SQ_SIZE, row * SQ_SIZE))
 
 
 # Main method where loop of the game runs
@@ -230,12 +247,16 @@ def main():
     screen = py.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption('Chess')
     game_state = chess_engine.GameState(color)
+    # the moves and status of the positions seen, kept over undos and new games
+    cache = move_cache.MoveCache(MOVE_CACHE_SIZE)
     load_images()
     running = True
     square_selected = ()  # keeps track of the last selected square
     player_clicks = []  # keeps track of player clicks (list of two tuples)
     valid_moves = []
     game_over = False
+    shown_key = None  # the position the status below belongs to
+    endgame = GameStatus.ONGOING
 
     while running:
         for e in py.event.get():
@@ -244,8 +265,8 @@ def main():
             elif e.type == py.MOUSEBUTTONDOWN:
                 if not game_over:
                     location = py.mouse.get_pos()
-                    col = location[0] // SQ_SIZE
-                    row = location[1] // SQ_SIZE
+                    # the square of the engine under the clicked square on the screen
+                    row, col = flip_square(location[1] // SQ_SIZE, location[0] // SQ_SIZE, color)
                     if square_selected == (row, col):  # if player tries to move to square he is currently on
                         square_selected = ()
                         player_clicks = []
@@ -273,7 +294,7 @@ def main():
                             player_clicks = []
                             valid_moves = []
                     else:
-                        valid_moves = game_state.get_valid_moves((row, col))
+                        valid_moves = cache.get_valid_moves(game_state, (row, col))
                         if valid_moves is None:
                             valid_moves = []
             elif e.type == py.KEYDOWN:
@@ -288,6 +309,8 @@ def main():
                     print(len(game_state.move_log))
 
         draw_game_state(screen, game_state, valid_moves, square_selected)
-        endgame = game_state.checkmate_stalemate_checker()
+        if game_state.position_key() != shown_key:  # only after a move, an undo or a new game
+            shown_key = game_state.position_key()
+            endgame = cache.game_status(game_state)
         check_if_checkmate(screen, game_state, endgame)
         py.display.flip()  # refreshes the whole screen
@@ -9,3 +9,11 @@ class Player:
     EMPTY = -9
     PIECES = ['white_r', 'white_n', 'white_b', 'white_q', 'white_k', 'white_p',
               'black_r', 'black_n', 'black_b', 'black_q', 'black_k', 'black_p']
+
+
+class GameStatus:
+    # values returned by GameState.game_status (and checkmate_stalemate_checker)
+    BLACK_WON = 0
+    WHITE_WON = 1
+    STALEMATE = 2
+    ONGOING = 3
@@ -0,0 +1,83 @@
+"""
+This module contains the tables of the position evaluation, loaded from pieces/piece_square_tables.csv
+Facilitates the following:
+- Material and piece-square values for the middlegame and the endgame, one value per piece (entry of
+  Player.PIECES) and square, positive for white and negative for black
+- The game phase: every knight, bishop, rook and queen on the board adds its weight, from TOTAL_PHASE with all
+  pieces on the board down to 0 with only kings and pawns
+- Blending the middlegame and endgame scores by the phase (tapering)
+- Computing the scores of a position from scratch, GameState keeps its own running totals up to date with
+  every change of the board
+
+Note: the tables can be tuned by editing the CSV file, every table is a piece,phase,material row (phase is mg or
+      eg) and 8 rows of 8 values for white's pieces with rank 8 first, black's pieces use them mirrored
+"""
+
+import csv
+import os
+
+from enums import Player
+
+TABLES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pieces", "piece_square_tables.csv")
+
+# what every piece adds to the game phase, in the order of Player.PIECES (r, n, b, q, k, p) for each player
+PHASE_WEIGHTS = [2, 1, 1, 4, 0, 0] * 2
+TOTAL_PHASE = 24
+
+
+def load_tables(path=TABLES_FILE):
+    """
+    returns (middlegame values, endgame values), each a list of 64 values for every entry of Player.PIECES,
+    the material of the piece included and negated for black
+    """
+    rows = []
+    with open(path, newline="") as tables_file:
+        for row in csv.reader(line for line in tables_file if line.strip() and not line.startswith("#")):
+            rows.append([field.strip() for field in row])
+    tables = {}
+    for start in range(0, len(rows), 9):
+        name, phase, material = rows[start]
+        values = [int(value) for row in rows[start + 1:start + 9] for value in row]
+        if len(values) != 64:
+            raise ValueError("the {} {} table of {} doesn't have 64 values".format(name, phase, path))
+        tables[name, phase] = [int(material) + value for value in values]
+
+    middlegame = []
+    endgame = []
+    for piece in Player.PIECES:
+        player, name = piece.split("_")
+        for phase, values in (("mg", middlegame), ("eg", endgame)):
+            table = tables[name, phase]
+            if player == Player.PLAYER_WHITE:
+                values.append(table)
+            else:
+                # square (row, col) for black is (7 - row, col) for white, which flips bit index square to square ^ 56
+                values.append([-table[square ^ 56] for square in range(64)])
+    return middlegame, endgame
+
+
+MIDDLEGAME, ENDGAME = load_tables()
+
+
+def taper(middlegame, endgame, phase):
+    """
+    returns the score between the middlegame and endgame scores, by how much of the material is left
+    """
+    phase = min(phase, TOTAL_PHASE)  # promotions can add more pieces than the game started with
+    return (middlegame * phase + endgame * (TOTAL_PHASE - phase)) // TOTAL_PHASE
+
+
+def compute_scores(game_state):
+    """
+    returns (middlegame score, endgame score, phase) of the game state's position computed from scratch
+    """
+    middlegame = endgame = phase = 0
+    for row in range(8):
+        for col in range(8):
+            piece = game_state.get_piece(row, col)
+            if piece != Player.EMPTY:
+                index = piece.get_piece_index()
+                middlegame += MIDDLEGAME[index][row * 8 + col]
+                endgame += ENDGAME[index][row * 8 + col]
+                phase += PHASE_WEIGHTS[index]
+    return middlegame, endgame, phase
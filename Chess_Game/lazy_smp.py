@@ -0,0 +1,167 @@
+"""
+This module contains the parallel search, run it from the command line to analyse a position on several cores
+Facilitates the following:
+- Lazy SMP: every worker process runs its own Search of the same root position, one process per core gets
+  around the GIL
+- One transposition table in shared memory for all workers (SharedTranspositionTable), what one worker finds
+  is a table hit for the others, that is the whole coordination between them
+- Staggering the workers' depths, half of them start their iterative deepening a ply deeper so the workers
+  don't all search the same tree in the same order
+- Combining the workers' results: the move of the deepest search, and the nodes and nodes per second of all of them
+
+Usage: python lazy_smp.py [--fen FEN] [--workers 0] [--depth 64] [--time 5] [--nodes N] [--hash 64]
+"""
+
+import argparse
+import multiprocessing
+import os
+import queue
+import sys
+import time
+import traceback
+
+from chess_engine import GameState
+from search import Search, MAX_DEPTH
+from throughput import WorkerStats, nodes_per_second, print_worker_stats
+from transposition import SharedTranspositionTable
+
+DEFAULT_HASH_MB = 64
+RESULT_POLL_SECONDS = 0.1  # how often the parent checks for workers that died without a result
+
+
+def start_depth(worker):
+    """
+    returns the depth the worker's iterative deepening starts at, the odd workers skip the first iteration
+    """
+    return 1 + worker % 2
+
+
+def _search_worker(worker, fen, table_name, hash_mb, age, max_depth, max_nodes, max_time, stop_event, results):
+    """
+    runs in a worker process: searches the position with the shared table, puts
+    (worker, SearchResult, table probes, table hits) on the results queue and stops the other workers
+    when it finished without running out of its budget (it got to max_depth or found a mate)
+    when the search fails it puts (worker, None, the traceback, None) instead, so the parent doesn't wait for it
+    """
+    try:
+        table = SharedTranspositionTable(hash_mb, name=table_name, age=age)
+        try:
+            search = Search(GameState.from_fen(fen), table, stop_event=stop_event)
+            result = search.search(max_depth, max_nodes, max_time, start_depth=start_depth(worker))
+            if not search.stopped:
+                stop_event.set()
+            results.put((worker, result, table.probes, table.hits))
+        finally:
+            table.close()
+    except Exception:
+        results.put((worker, None, traceback.format_exc(), None))
+
+
+class LazySMP:
+    """
+    Searches positions with workers processes (all cores when workers is None or 0) that share a table of
+    hash_mb MB, the table is kept from one search to the next, close frees it
+    """
+
+    def __init__(self, workers=None, hash_mb=DEFAULT_HASH_MB):
+        self.workers = workers or os.cpu_count()
+        self.hash_mb = hash_mb
+        self.table = SharedTranspositionTable(hash_mb)
+        self.worker_stats = {}  # {worker: (depth, nodes, seconds, table probes, table hits)} of the last search
+
+    def close(self):
+        self.table.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def search(self, game_state, max_depth=MAX_DEPTH, max_nodes=None, max_time=None):
+        """
+        searches the game state's position on all workers, max_nodes is per worker
+        returns the SearchResult of the deepest search (the lowest worker on a tie) with the nodes of all workers
+        and the wall clock seconds, worker_stats only holds the workers of this search that finished it
+        raises RuntimeError when a worker fails, the others are stopped first
+        """
+        start = time.perf_counter()
+        self.worker_stats = {}
+        stop_event = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        fen = game_state.to_fen()
+        processes = [multiprocessing.Process(target=_search_worker, args=(
+            worker, fen, self.table.name, self.hash_mb, self.table.age, max_depth, max_nodes, max_time,
+            stop_event, results)) for worker in range(self.workers)]
+        for process in processes:
+            process.start()
+        worker_results = {}
+        errors = {}
+        while len(worker_results) + len(errors) < len(processes):
+            try:
+                worker, result, probes, hits = results.get(timeout=RESULT_POLL_SECONDS)
+            except queue.Empty:
+                # a worker killed before it could put anything on the queue won't ever answer
+                for worker, process in enumerate(processes):
+                    if worker not in worker_results and worker not in errors and process.exitcode:
+                        errors[worker] = "exited with code {}".format(process.exitcode)
+                        stop_event.set()
+                continue
+            if result is None:
+                errors[worker] = probes
+                stop_event.set()  # the others stop too, the search fails anyway
+                continue
+            worker_results[worker] = result
+            self.worker_stats[worker] = (result.depth, result.nodes, result.seconds, probes, hits)
+        for process in processes:
+            process.join()
+        self.table.new_search()  # the workers' searches started one
+        if errors:
+            worker = min(errors)
+            raise RuntimeError("search worker {} failed: {}".format(worker, errors[worker]))
+
+        best = None
+        for worker in sorted(worker_results):
+            result = worker_results[worker]
+            if result.move is not None and (best is None or result.depth > best.depth):
+                best = result
+        if best is None:
+            best = worker_results[0]
+        return best._replace(nodes=sum(result.nodes for result in worker_results.values()),
+                             seconds=time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search a position with several worker processes")
+    parser.add_argument("--fen", help="position to search (default the starting position)")
+    parser.add_argument("--workers", type=int, help="number of worker processes (default all cores)")
+    parser.add_argument("--depth", type=int, default=MAX_DEPTH, help="deepest iteration to search")
+    parser.add_argument("--time", type=float, help="seconds to search for")
+    parser.add_argument("--nodes", type=int, help="nodes to search per worker")
+    parser.add_argument("--hash", type=float, default=DEFAULT_HASH_MB, help="shared table size in MB")
+    args = parser.parse_args(argv)
+    if args.time is None and args.nodes is None and args.depth == MAX_DEPTH:
+        args.time = 5.0
+
+    game_state = GameState.from_fen(args.fen) if args.fen else GameState('w')
+    with LazySMP(args.workers, args.hash) as lazy_smp:
+        result = lazy_smp.search(game_state, args.depth, args.nodes, args.time)
+        print_worker_stats({worker: WorkerStats("depth {:>2}  hash hits {:>5.1%}".format(
+            depth, hits / probes if probes else 0.0), nodes, seconds)
+            for worker, (depth, nodes, seconds, probes, hits) in lazy_smp.worker_stats.items()})
+    if result.move is None:
+        print("no legal moves")
+        return 0
+    print("bestmove {}  score {}  depth {}  pv {}".format(
+        game_state.move_name(*result.move), result.score, result.depth,
+        " ".join(game_state.move_name(*move) for move in result.pv)))
+    probes = sum(stats[3] for stats in lazy_smp.worker_stats.values())
+    hits = sum(stats[4] for stats in lazy_smp.worker_stats.values())
+    print("workers {}  nodes {}  {:.2f}s  {:,.0f} nodes/s  hash hits {:.1%}".format(
+        len(lazy_smp.worker_stats), result.nodes, result.seconds, nodes_per_second(result.nodes, result.seconds),
+        hits / probes if probes else 0.0))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
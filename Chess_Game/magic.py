@@ -0,0 +1,167 @@
+"""
+This module contains the magic bitboard tables used to look up the attacks of sliding pieces
+Facilitates the following:
+- Looking up rook and bishop attacks with one multiply, one shift and one table index
+- Looking up queen attacks as the union of the rook and bishop lookups
+- Finding the magic numbers with a seeded search (the ones below are what find_magics() returns)
+
+How a lookup works:
+- only the pieces on the rays from the square (leaving out the edge of the board) can block a slider, that's the mask
+- multiplying the blockers by the square's magic number gathers them in the top bits of the product
+- the top bits are the index into the square's table, which holds the attacks for that set of blockers
+
+The tables are filled when the module is imported, the magic search itself takes more than a minute in Python,
+so its results are kept here and find_magics() is only needed if the table layout ever changes
+"""
+
+import random
+
+import attack_tables
+from bitboard import FULL, ROOK_DIRECTIONS, BISHOP_DIRECTIONS
+
+MAGIC_SEED = 2021
+
+ROOK_MAGICS = (
+    0x2180008040012010, 0x8240001000402001, 0x02000A1040220080, 0x0480080004100080,
+    0x820002000408A090, 0x0100080204000100, 0x0400281010A11402, 0x8200020020804104,
+    0x0004800183400220, 0x0E03004001008221, 0x2002001224420080, 0xA04E800800100081,
+    0x0121001100080204, 0x3008808004008200, 0x8001000401000200, 0x400200010880440A,
+    0x0080008020400081, 0x4000808040002000, 0x9030008018802000, 0x0004090010002300,
+    0x0200808004000800, 0x0101080110402004, 0x1188040008024110, 0x21000200004A8704,
+    0x1040802380044008, 0x01026003401000C7, 0x8410040020080020, 0x0010880280100080,
+    0x9444000480800800, 0x0000400801042090, 0x40110041001C2A00, 0x2408240200008041,
+    0x4400400028800088, 0x2400201000400040, 0x8000200080801000, 0x1210005081800800,
+    0x0001000801001004, 0x0020800200800400, 0x5043000481000200, 0x0009004422001089,
+    0x0820400080008020, 0x5110002000404000, 0x8000802200420012, 0x260010002101000A,
+    0x2800880100050010, 0x4482000810020004, 0x4001020001008080, 0x410511A043020004,
+    0x0810800020410100, 0x2000320080410200, 0x0004100020048880, 0x0000420010082200,
+    0x0008004200240140, 0x0800800200040080, 0x000010C822010400, 0x38C4800100004080,
+    0x4908800500241041, 0x8202048020104102, 0xA700081100200041, 0x4011000410000821,
+    0x1107000408000211, 0x000D0008CA1C0001, 0x10090004120000A1, 0x0060082244011082,
+)
+
+BISHOP_MAGICS = (
+    0xD404882841040010, 0x0808810802004100, 0x0034044892002A00, 0x0004042483000408,
+    0x0102021001000000, 0x4058480210400000, 0x05A1044220040008, 0x0200240202100208,
+    0x0408081004008410, 0x004002280A108A00, 0x20A042108A088000, 0x5000040411920080,
+    0x01210404200100A2, 0x2800039010082064, 0x0000010111304088, 0x0110004208010820,
+    0x2804012120022241, 0x6082000808014400, 0x0102201000820208, 0x0044006240108000,
+    0x0041000820082300, 0x0400800808842004, 0x0024240207112801, 0x80020005430C0110,
+    0x0042202050210240, 0x4002100008390860, 0x0801010010040620, 0x0B04080109010500,
+    0x0003011001004000, 0xC008020040410084, 0x0012004108880800, 0x8000802B01040200,
+    0x0004212400083000, 0x0A180C0D00100140, 0x0202030240100180, 0x000A0100C01C00C0,
+    0x20A0010401150408, 0xC010110040420040, 0x5042020200004840, 0x0800808084420200,
+    0x1248080249101008, 0x20408A0920049013, 0x4000220030002200, 0x8020002124002808,
+    0x0040481904440400, 0x7224102040418202, 0x1002700400801100, 0x000200A121002A00,
+    0x0300822120A00000, 0x20012203102880B8, 0x0002210048120001, 0x0002A00104883101,
+    0x00108040850108A8, 0x008D100610231211, 0x0229080198020242, 0x0004189811012300,
+    0x9001003801041040, 0x2101003088041000, 0x1001431100889084, 0x0812020010420200,
+    0x62002000A0224402, 0x002000C0C8010100, 0x8000302008C08088, 0x0202043000920080,
+)
+
+
+def relevant_mask(square, directions):
+    """
+    returns the squares that can block a slider on the square, the last square of each ray never blocks anything
+    """
+    _mask = 0
+    for direction in directions:
+        for ray_square in attack_tables.RAYS[square][direction][:-1]:
+            _mask |= 1 << ray_square
+    return _mask
+
+
+def blocker_subsets(mask):
+    """
+    yields every subset of the mask, starting with the empty one
+    """
+    subset = 0
+    while True:
+        yield subset
+        subset = (subset - mask) & mask
+        if subset == 0:
+            break
+
+
+def find_magic(square, directions, attacks, rng):
+    """
+    tries sparse random numbers until one maps every blocker subset of the square to an index without
+    two different attack sets landing on the same index
+    """
+    mask = relevant_mask(square, directions)
+    shift = 64 - bin(mask).count("1")
+    subsets = list(blocker_subsets(mask))
+    subset_attacks = [attacks(square, subset) for subset in subsets]
+    while True:
+        magic = rng.getrandbits(64) & rng.getrandbits(64) & rng.getrandbits(64)
+        # magics that don't spread the mask over the top byte almost never work
+        if bin((mask * magic) & 0xFF00000000000000).count("1") < 6:
+            continue
+        table = {}
+        for subset, subset_attack in zip(subsets, subset_attacks):
+            index = ((subset * magic) & FULL) >> shift
+            if table.setdefault(index, subset_attack) != subset_attack:
+                break
+        else:
+            return magic
+
+
+def find_magics(seed=MAGIC_SEED):
+    """
+    runs the deterministic magic search for all squares, returns (rook magics, bishop magics)
+    """
+    rng = random.Random(seed)
+    rook_magics = tuple(find_magic(square, ROOK_DIRECTIONS, attack_tables.rook_attacks, rng) for square in range(64))
+    bishop_magics = tuple(find_magic(square, BISHOP_DIRECTIONS, attack_tables.bishop_attacks, rng)
+                          for square in range(64))
+    return rook_magics, bishop_magics
+
+
+def _build_tables(directions, magics, attacks):
+    masks = []
+    shifts = []
+    tables = []
+    for square in range(64):
+        mask = relevant_mask(square, directions)
+        shift = 64 - bin(mask).count("1")
+        table = [0] * (1 << (64 - shift))
+        for subset in blocker_subsets(mask):
+            table[((subset * magics[square]) & FULL) >> shift] = attacks(square, subset)
+        masks.append(mask)
+        shifts.append(shift)
+        tables.append(table)
+    return masks, shifts, tables
+
+
+_ROOK_MASKS, _ROOK_SHIFTS, _ROOK_TABLES = _build_tables(ROOK_DIRECTIONS, ROOK_MAGICS, attack_tables.rook_attacks)
+_BISHOP_MASKS, _BISHOP_SHIFTS, _BISHOP_TABLES = _build_tables(BISHOP_DIRECTIONS, BISHOP_MAGICS,
+                                                              attack_tables.bishop_attacks)
+
+
+def rook_attacks(square, occupied):
+    """
+    returns the squares a rook on the square attacks, including the blockers
+    """
+    return _ROOK_TABLES[square][(((occupied & _ROOK_MASKS[square]) * ROOK_MAGICS[square]) & FULL) >>
+                                _ROOK_SHIFTS[square]]
+
+
+def bishop_attacks(square, occupied):
+    """
+    returns the squares a bishop on the square attacks, including the blockers
+    """
+    return _BISHOP_TABLES[square][(((occupied & _BISHOP_MASKS[square]) * BISHOP_MAGICS[square]) & FULL) >>
+                                  _BISHOP_SHIFTS[square]]
+
+
+def queen_attacks(square, occupied):
+    """
+    returns the squares a queen on the square attacks
+    """
+    return rook_attacks(square, occupied) | bishop_attacks(square, occupied)
+
+
+if __name__ == "__main__":
+    # prints the result of the search so the constants above can be checked or regenerated
+    for name, values in zip(("ROOK_MAGICS", "BISHOP_MAGICS"), find_magics()):
+        print(name, "=", ", ".join("0x%016X" % value for value in values))
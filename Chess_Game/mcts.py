@@ -0,0 +1,306 @@
+"""
+This module contains the Monte Carlo tree search player, an alternative to the alpha-beta search whose strength is
+set by how many playouts it gets, run it from the command line to analyse a position or to let it play itself
+Facilitates the following:
+- Growing a tree of positions from the root by UCT (upper confidence bounds applied to trees): the child with the
+  best mix of its win rate and how little it has been tried is followed down to a position not in the tree yet
+- Playouts from those positions with a configurable policy, cut off after a number of moves and scored by the
+  evaluation, then counted as wins, draws and losses up the path
+- Running the playouts in batches on a pool of worker processes, the positions go to the workers as FEN strings
+- Keeping the tree from one move to the next, the part below the position the game got to is reused
+- A budget of playouts or seconds per move and the playouts per second of every search
+
+Usage: python mcts.py [--fen FEN] [--playouts 2000] [--time 5] [--workers 0] [--in-process] [--batch 64]
+       [--play MOVES]
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from chess_engine import GameState
+from enums import GameStatus
+from move_ordering import victim_and_attacker
+from throughput import nodes_per_second
+
+EXPLORATION = 1.4  # how much UCT favours children that haven't been tried much over the ones that win
+PLAYOUT_PLIES = 40  # a playout stops after this many half moves and the evaluation decides it
+EVALUATION_SCALE = 400  # centipawns that turn a score of 0.5 into about 0.9 (the logistic of the Elo formula)
+DEFAULT_BATCH = 64
+
+# best move, how often it was visited, its win rate for the player to move, and the playouts, seconds and
+# playouts per second of the search
+MCTSResult = namedtuple("MCTSResult", ["move", "visits", "win_rate", "playouts", "seconds", "playouts_per_second"])
+
+
+def random_policy(game_state, moves, rng):
+    """
+    plays any legal move
+    """
+    return rng.choice(moves)
+
+
+def capture_policy(game_state, moves, rng):
+    """
+    takes the most valuable piece it can, otherwise plays any legal move, the playouts look more like chess
+    than random moves but each move costs more
+    """
+    best_victim = 0
+    best_moves = []
+    for move in moves:
+        victim = victim_and_attacker(game_state, move)[0]
+        if victim > best_victim:
+            best_victim = victim
+            best_moves = [move]
+        elif victim and victim == best_victim:
+            best_moves.append(move)
+    return rng.choice(best_moves or moves)
+
+
+PLAYOUT_POLICIES = {"random": random_policy, "capture": capture_policy}
+
+
+def evaluation_result(game_state):
+    """
+    returns the result for white (0 to 1) that the evaluation of the position is worth
+    """
+    return 1 / (1 + 10 ** (-game_state.evaluate() / EVALUATION_SCALE))
+
+
+def game_result(game_state):
+    """
+    returns 1 if white won, 0 if black won and 0.5 for a draw, None while the game goes on
+    """
+    status = game_state.game_status()
+    if status == GameStatus.ONGOING:
+        return None
+    return {GameStatus.WHITE_WON: 1.0, GameStatus.BLACK_WON: 0.0, GameStatus.STALEMATE: 0.5}[status]
+
+
+def playout(game_state, policy=random_policy, max_plies=PLAYOUT_PLIES, rng=random):
+    """
+    plays the game on from the position with moves chosen by policy, returns the result for white (0 to 1)
+    the moves are played on game_state and not undone
+    """
+    for _ in range(max_plies):
+        moves = game_state.get_legal_moves_with_promotions()
+        if not moves:
+            return game_result(game_state)
+        game_state.move_piece(*policy(game_state, moves, rng))
+    result = game_result(game_state)
+    return evaluation_result(game_state) if result is None else result
+
+
+def _playout_batch(fens, policy, max_plies, seed):
+    """
+    runs in a worker process: one playout from every position, returns their results for white
+    """
+    rng = random.Random(seed)
+    return [playout(GameState.from_fen(fen), policy, max_plies, rng) for fen in fens]
+
+
+class Node:
+    """
+    A position in the tree, reached by move from its parent
+    wins counts the playouts through it for the player who made move (a draw is half a win), visits counts them
+    all, including the ones still waiting for their result
+    """
+    __slots__ = ("move", "parent", "key", "white_moved", "children", "untried", "visits", "wins")
+
+    def __init__(self, move, parent, key, white_moved, moves):
+        self.move = move
+        self.parent = parent
+        self.key = key
+        self.white_moved = white_moved
+        self.children = []
+        self.untried = moves  # the legal moves that have no child yet
+        self.visits = 0
+        self.wins = 0.0
+
+    def uct_child(self, exploration):
+        """
+        returns the child with the highest upper confidence bound
+        """
+        log_visits = math.log(self.visits)
+        return max(self.children, key=lambda child: child.wins / child.visits +
+                   exploration * math.sqrt(log_visits / child.visits))
+
+    def most_visited_child(self):
+        return max(self.children, key=lambda child: child.visits)
+
+
+class MCTS:
+    """
+    Searches positions with Monte Carlo tree search, the playouts run on workers processes (all cores when
+    workers is None or 0, like perft and lazy_smp), or in this process with in_process
+    the tree is kept between searches, so searching the position after the opponent's answer starts from the
+    playouts already made below it
+    """
+
+    def __init__(self, workers=None, batch_size=DEFAULT_BATCH, policy=random_policy, exploration=EXPLORATION,
+                 max_plies=PLAYOUT_PLIES, seed=None, in_process=False):
+        self.workers = workers or os.cpu_count()
+        self.batch_size = batch_size
+        self.policy = policy
+        self.exploration = exploration
+        self.max_plies = max_plies
+        self.rng = random.Random(seed)
+        self.root = None
+        self._executor = None if in_process else ProcessPoolExecutor(max_workers=self.workers)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _new_node(self, game_state, move, parent):
+        moves = game_state.get_legal_moves_with_promotions()
+        self.rng.shuffle(moves)
+        return Node(move, parent, game_state.position_key(), not game_state.white_turn, moves)
+
+    def _find_root(self, game_state):
+        """
+        returns the node of the game state's position if it is the root or up to two moves below it (our move and
+        the opponent's answer), cut off from the rest of the tree, otherwise a new root
+        """
+        key = game_state.position_key()
+        if self.root is not None:
+            nodes = [self.root]
+            for _ in range(3):
+                for node in nodes:
+                    if node.key == key:
+                        node.parent = None
+                        node.move = None
+                        return node
+                nodes = [child for node in nodes for child in node.children]
+        return self._new_node(game_state, None, None)
+
+    def _select(self, game_state):
+        """
+        follows UCT down from the root and adds one child to the tree, the moves are made on game_state
+        every node on the way gets a visit now, so the other leaves of the batch spread out over the tree
+        (virtual loss) until the results come back
+        returns the path of nodes from the root
+        """
+        node = self.root
+        node.visits += 1
+        path = [node]
+        while not node.untried and node.children:
+            node = node.uct_child(self.exploration)
+            game_state.move_piece(*node.move)
+            node.visits += 1
+            path.append(node)
+        if node.untried:
+            move = node.untried.pop()
+            game_state.move_piece(*move)
+            child = self._new_node(game_state, move, node)
+            node.children.append(child)
+            child.visits += 1
+            path.append(child)
+        return path
+
+    def _backpropagate(self, path, result):
+        for node in path:
+            node.wins += result if node.white_moved else 1 - result
+
+    def search(self, game_state, max_playouts=None, max_time=None):
+        """
+        searches the game state's position until max_playouts playouts have been made or max_time seconds have
+        passed (1000 playouts when neither is given), the moves made on game_state are undone again
+        returns the MCTSResult, its move is None when the game is over
+        """
+        if max_playouts is None and max_time is None:
+            max_playouts = 1000
+        start = time.perf_counter()
+        deadline = None if max_time is None else start + max_time
+        self.root = self._find_root(game_state)
+        playouts = 0
+        while (max_playouts is None or playouts < max_playouts) and \
+                (deadline is None or time.perf_counter() < deadline) and (self.root.untried or self.root.children):
+            batch_size = self.batch_size if max_playouts is None else min(self.batch_size, max_playouts - playouts)
+            paths = []
+            fens = []
+            for _ in range(batch_size):
+                path = self._select(game_state)
+                result = game_result(game_state)
+                if result is None:
+                    paths.append(path)
+                    fens.append(game_state.to_fen())
+                else:
+                    self._backpropagate(path, result)  # the game is over, there is nothing to play out
+                for _ in range(len(path) - 1):
+                    game_state.undo_move()
+            for path, result in zip(paths, self._playouts(fens)):
+                self._backpropagate(path, result)
+            playouts += batch_size
+        seconds = time.perf_counter() - start
+        playouts_per_second = nodes_per_second(playouts, seconds)
+        if not self.root.children:
+            return MCTSResult(None, 0, 0.0, playouts, seconds, playouts_per_second)
+        best = self.root.most_visited_child()
+        return MCTSResult(best.move, best.visits, best.wins / best.visits, playouts, seconds, playouts_per_second)
+
+    def _playouts(self, fens):
+        """
+        returns the result for white of a playout from every position, split in one chunk per worker
+        """
+        if not fens:
+            return []  # every leaf of the batch ended the game
+        if self._executor is None:
+            return _playout_batch(fens, self.policy, self.max_plies, self.rng.getrandbits(32))
+        chunk = -(-len(fens) // self.workers)
+        chunks = [fens[start:start + chunk] for start in range(0, len(fens), chunk)]
+        seeds = [self.rng.getrandbits(32) for _ in chunks]
+        results = []
+        for chunk_results in self._executor.map(_playout_batch, chunks, [self.policy] * len(chunks),
+                                                [self.max_plies] * len(chunks), seeds):
+            results.extend(chunk_results)
+        return results
+
+
+def print_result(game_state, result):
+    print("{}  visits {:>6}  win rate {:>5.1%}  playouts {:>6}  {:>7.2f}s  {:>8,.0f} playouts/s".format(
+        game_state.move_name(*result.move), result.visits, result.win_rate, result.playouts, result.seconds,
+        result.playouts_per_second))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search a position with Monte Carlo tree search")
+    parser.add_argument("--fen", help="position to search (default the starting position)")
+    parser.add_argument("--playouts", type=int, help="playouts per move")
+    parser.add_argument("--time", type=float, help="seconds per move")
+    parser.add_argument("--workers", type=int, help="playout processes (default all cores)")
+    parser.add_argument("--in-process", action="store_true", help="run the playouts in this process, no pool")
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH, help="playouts sent to the workers at once")
+    parser.add_argument("--policy", choices=sorted(PLAYOUT_POLICIES), default="random", help="playout policy")
+    parser.add_argument("--play", type=int, help="play this many half moves against itself")
+    args = parser.parse_args(argv)
+
+    game_state = GameState.from_fen(args.fen) if args.fen else GameState('w')
+    with MCTS(args.workers, args.batch, PLAYOUT_POLICIES[args.policy], in_process=args.in_process) as player:
+        for _ in range(args.play or 1):
+            result = player.search(game_state, args.playouts, args.time)
+            if result.move is None:
+                print("no legal moves")
+                break
+            print_result(game_state, result)
+            if args.play:
+                game_state.move_piece(*result.move)
+    if args.play:
+        print(game_state.to_fen())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
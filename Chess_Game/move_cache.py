@@ -0,0 +1,86 @@
+"""
+This module contains the cache of legal moves and game status of the positions a game went through
+Facilitates the following:
+- Keeping the legal moves of every piece and the GameStatus of a position under its Zobrist key
+  (GameState.position_key), so a position seen again after an undo, a replay or another move order costs one
+  dictionary lookup instead of a move generation
+- Holding at most capacity positions, the least recently used one is dropped when a new one doesn't fit (LRU)
+- Counting hits, misses and evictions
+
+Note: the key holds the pieces, the side to move, the castling rights and the en passant square, which is all the
+      legal moves and the status depend on, the moves of a piece are worked out the first time they are asked for
+"""
+
+from collections import OrderedDict
+
+from enums import GameStatus
+
+DEFAULT_CAPACITY = 4096
+
+
+class MoveCache:
+    """
+    A least recently used cache of {position key: (game status, {starting square: legal ending squares})}
+    for the positions of one or more GameStates
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError("the move cache needs room for at least one position")
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def _entry(self, game_state):
+        """
+        returns the [game status, moves] entry of the game state's position, a new one on a miss
+        """
+        key = game_state.position_key()
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+        self.misses += 1
+        entry = [None, {}]
+        self._entries[key] = entry
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def get_valid_moves(self, game_state, starting_square):
+        """
+        returns the legal moves of the piece on starting_square like GameState.get_valid_moves, None if there is
+        no piece, the list belongs to the cache and shouldn't be changed
+        """
+        moves = self._entry(game_state)[1]
+        if starting_square not in moves:
+            moves[starting_square] = game_state.get_valid_moves(starting_square)
+        return moves[starting_square]
+
+    def game_status(self, game_state):
+        """
+        returns the GameStatus of the game state's position like GameState.game_status, and sets the game state's
+        checkmate and stalemate like it does, a cached status too
+        """
+        entry = self._entry(game_state)
+        if entry[0] is None:
+            entry[0] = game_state.game_status()
+        else:
+            game_state.checkmate = entry[0] in (GameStatus.WHITE_WON, GameStatus.BLACK_WON)
+            game_state.stalemate = entry[0] == GameStatus.STALEMATE
+        return entry[0]
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
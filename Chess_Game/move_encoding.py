@@ -0,0 +1,87 @@
+"""
+This module contains the packed 16-bit move format used by GameState.move_log
+Facilitates the following:
+- Packing the starting square, ending square and flags of a move into one integer
+- Reading them back out
+- Packing what undo_move can't work out from the move (castling rights and en passant square) into another
+
+Note: bits 0-5 hold the starting square, bits 6-11 the ending square and bits 12-15 the flags, squares are
+      bit indices (row * 8 + col) like the bitboards
+"""
+
+# flags, CAPTURE is a bit that is combined with the others
+QUIET = 0
+DOUBLE_PUSH = 1
+CASTLING = 2
+CAPTURE = 4
+EN_PASSANT = 5  # always a capture
+PROMOTION = 8  # plus the index of the new piece in PROMOTION_PIECES
+PROMOTION_PIECES = "nbrq"
+
+NO_EN_PASSANT = 0
+
+
+def encode_move(starting_square, ending_square, flags=QUIET):
+    """
+    returns the packed move, the squares are (row, col) tuples
+    """
+    return (starting_square[0] * 8 + starting_square[1]) | (ending_square[0] * 8 + ending_square[1]) << 6 | \
+        flags << 12
+
+
+def promotion_flags(promotion):
+    """
+    returns the flags of a promotion to the piece with that name (r, n, b or q)
+    """
+    return PROMOTION | PROMOTION_PIECES.index(promotion)
+
+
+def starting_square(move):
+    return divmod(move & 0x3F, 8)
+
+
+def ending_square(move):
+    return divmod(move >> 6 & 0x3F, 8)
+
+
+def flags(move):
+    return move >> 12
+
+
+def is_capture(move):
+    return move >> 12 & CAPTURE != 0
+
+
+def promotion(move):
+    """
+    returns the name of the piece the pawn was promoted to, or None
+    """
+    if move >> 12 & PROMOTION:
+        return PROMOTION_PIECES[move >> 12 & 3]
+    return None
+
+
+def encode_undo_state(white_castling, black_castling, en_passant_square):
+    """
+    returns the castling rights (3 bits per player) and en passant square (its index + 1, 0 when there is
+    none) as one 13-bit integer
+    """
+    state = 0
+    for i in range(3):
+        if white_castling[i]:
+            state |= 1 << i
+        if black_castling[i]:
+            state |= 8 << i
+    if en_passant_square is not None:
+        state |= (en_passant_square[0] * 8 + en_passant_square[1] + 1) << 6
+    return state
+
+
+def decode_undo_state(state):
+    """
+    returns (white castling rights, black castling rights, en passant square) packed by encode_undo_state
+    """
+    white_castling = [state & 1 == 1, state & 2 == 2, state & 4 == 4]
+    black_castling = [state & 8 == 8, state & 16 == 16, state & 32 == 32]
+    en_passant = state >> 6
+    return white_castling, black_castling, None if en_passant == NO_EN_PASSANT else divmod(en_passant - 1, 8)
@@ -0,0 +1,170 @@
+"""
+This module contains the move ordering of the search, the sooner the best move of a position is searched the
+sooner alpha-beta gets its cutoff and the fewer moves are searched at all
+Facilitates the following:
+- Searching a given move first (the best move from the transposition table or the principal variation)
+  before the other moves are even generated
+- Scoring captures by the value of the piece taken and then of the piece taking it (MVV-LVA,
+  most valuable victim - least valuable attacker)
+- Killer moves: the quiet moves that caused a cutoff at the same ply in another part of the tree
+- The history heuristic: how often a quiet move from one square to another caused a cutoff, weighted by depth
+- Picking the best of the remaining moves one at a time instead of sorting them all, most nodes are cut off
+  after one or two moves
+- The captures of the quiescence search, without the ones that lose material (GameState.static_exchange)
+
+Note: MoveOrdering only reads the GameState, it works with any search that makes and undoes moves on it
+"""
+
+from array import array
+
+from enums import Player
+
+# how valuable a piece is as a victim or an attacker, in the order of Player.PIECES (r, n, b, q, k, p)
+PIECE_RANKS = [4, 2, 3, 5, 6, 1]
+
+# the scores of the groups the moves are put in, a group's moves always come before the next group's
+CAPTURE_SCORE = 1 << 30
+KILLER_SCORE = 1 << 29
+HISTORY_LIMIT = 1 << 28  # all history counts are halved when one of them gets here
+PROMOTION_RANKS = {"q": PIECE_RANKS[3], "r": PIECE_RANKS[0], "b": PIECE_RANKS[2], "n": PIECE_RANKS[1]}
+
+KILLERS_PER_PLY = 2
+
+
+def victim_and_attacker(game_state, move):
+    """
+    returns the ranks of the piece taken (0 when the move takes nothing) and of the piece moving
+    """
+    (starting_row, starting_col), (ending_row, ending_col), _ = move
+    attacker = game_state.board[starting_row][starting_col]
+    attacker_rank = PIECE_RANKS[attacker.get_piece_index() % 6]
+    victim = game_state.board[ending_row][ending_col]
+    if victim != Player.EMPTY:
+        return PIECE_RANKS[victim.get_piece_index() % 6], attacker_rank
+    if attacker_rank == PIECE_RANKS[5] and ending_col != starting_col:
+        return PIECE_RANKS[5], attacker_rank  # a pawn moving to an empty square on the side takes en passant
+    return 0, attacker_rank
+
+
+def is_quiet(game_state, move):
+    """
+    returns True when the move takes nothing and isn't a promotion, only those are killers or get history
+    """
+    return move[2] is None and victim_and_attacker(game_state, move)[0] == 0
+
+
+def best_first(moves, scores):
+    """
+    yields the moves from the highest score to the lowest, each one is picked from the moves that are left,
+    so a cutoff after a few moves leaves the rest of the list unsorted
+    """
+    for index in range(len(moves)):
+        best = index
+        best_score = scores[index]
+        for other in range(index + 1, len(moves)):
+            if scores[other] > best_score:
+                best = other
+                best_score = scores[other]
+        if best != index:
+            moves[index], moves[best] = moves[best], moves[index]
+            scores[index], scores[best] = scores[best], scores[index]
+        yield moves[index]
+
+
+class MoveOrdering:
+    """
+    Keeps the killer moves and the history of one search (or of the searches of a game) and orders the moves
+    of every position by them
+    """
+
+    def __init__(self, max_ply=128):
+        self.max_ply = max_ply
+        self.killers = [[None] * KILLERS_PER_PLY for _ in range(max_ply)]
+        # history[0] is white's and history[1] black's, indexed by starting square * 64 + ending square
+        self.history = [array('l', bytes(4096 * array('l').itemsize)) for _ in range(2)]
+
+    def clear(self):
+        self.killers = [[None] * KILLERS_PER_PLY for _ in range(self.max_ply)]
+        for table in self.history:
+            for index in range(len(table)):
+                table[index] = 0
+
+    def new_search(self):
+        """
+        the killers of the last search were found at other plies, the history is halved so it still counts
+        but the new search can outgrow it
+        """
+        self.killers = [[None] * KILLERS_PER_PLY for _ in range(self.max_ply)]
+        self._age_history()
+
+    def _age_history(self):
+        for table in self.history:
+            for index in range(len(table)):
+                table[index] >>= 1
+
+    def score(self, game_state, move, ply):
+        """
+        returns the ordering score of the move, a higher score is searched earlier
+        captures and promotions come first (by MVV-LVA), then the killers of the ply, then the other quiet moves
+        by their history
+        """
+        victim, attacker = victim_and_attacker(game_state, move)
+        if victim or move[2] is not None:
+            if move[2] is not None:
+                victim += PROMOTION_RANKS[move[2]]
+            return CAPTURE_SCORE + victim * 8 - attacker
+        if ply < self.max_ply and move in self.killers[ply]:
+            return KILLER_SCORE + (KILLERS_PER_PLY - self.killers[ply].index(move))
+        (starting_row, starting_col), (ending_row, ending_col), _ = move
+        return self.history[0 if game_state.white_turn else 1][(starting_row * 8 + starting_col) * 64 +
+                                                               ending_row * 8 + ending_col]
+
+    def moves(self, game_state, ply, first_move=None):
+        """
+        yields the legal moves of the player to move, best first
+        first_move (if it is legal) comes before anything else, the rest are only generated and scored when the
+        search asks for the second move, and each following one is the best of the moves that are left
+        moves can be made while iterating as long as they are undone before asking for the next one
+        """
+        if first_move is not None and game_state.is_legal_move(first_move[0], first_move[1]):
+            yield first_move
+        else:
+            first_move = None
+        moves = [move for move in game_state.iter_legal_moves() if move != first_move]
+        scores = [self.score(game_state, move, ply) for move in moves]
+        yield from best_first(moves, scores)
+
+    def captures(self, game_state, skip_losing=True):
+        """
+        yields the legal captures of the player to move by MVV-LVA, best first like moves
+        with skip_losing, a capture of a less valuable piece than the one taking it is only yielded when the
+        exchanges that follow on the square don't lose material
+        """
+        moves = list(game_state.iter_legal_moves(captures_only=True))
+        scores = [self.score(game_state, move, 0) for move in moves]
+        for move in best_first(moves, scores):
+            if skip_losing and move[2] is None:
+                victim, attacker = victim_and_attacker(game_state, move)
+                if attacker > victim and game_state.static_exchange(move[1], move[0]) < 0:
+                    continue
+            yield move
+
+    def add_cutoff(self, game_state, move, depth, ply):
+        """
+        records that the move made the search cut off at the ply with depth plies left to search
+        it has to be called on the position the move was made from, quiet moves become the first killer of the
+        ply and their history grows by depth squared
+        """
+        if not is_quiet(game_state, move):
+            return
+        if ply < self.max_ply:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1:] = killers[:-1]
+                killers[0] = move
+        (starting_row, starting_col), (ending_row, ending_col), _ = move
+        table = self.history[0 if game_state.white_turn else 1]
+        index = (starting_row * 8 + starting_col) * 64 + ending_row * 8 + ending_col
+        table[index] += depth * depth
+        if table[index] >= HISTORY_LIMIT:
+            self._age_history()
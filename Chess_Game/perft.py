@@ -0,0 +1,164 @@
+"""
+This module runs perft (performance test) on a suite of well known positions, run it from the command line
+Facilitates the following:
+- Counting the leaf nodes of the legal move tree of each position to a fixed depth with GameState.perft
+- Comparing the counts to the published ones, any mismatch means move generation, moving or undoing is broken
+- Reporting the time and nodes per second, the throughput benchmark for changes to the move generator
+- Printing the divide (count per root move) of a single position to track a mismatch down
+- Splitting the root moves across worker processes to run deep perfts on every core (--workers)
+
+Usage: python perft.py [--depth 3] [--position kiwipete] [--fen FEN] [--divide] [--workers 0]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from chess_engine import GameState
+from throughput import WorkerStats, nodes_per_second, print_worker_stats
+
+# name, FEN and the known node counts for depth 1, 2, 3, ... (from the Chess Programming Wiki perft results)
+POSITIONS = [
+    ("start", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603, 193690690]),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333, 15833292]),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487, 89941194]),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+
+
+def run_perft(fen, depth):
+    """
+    returns (nodes, seconds) of perft(depth) on the position
+    """
+    game_state = GameState.from_fen(fen)
+    start = time.perf_counter()
+    nodes = game_state.perft(depth)
+    return nodes, time.perf_counter() - start
+
+
+def _perft_subtree(fen, depth):
+    """
+    runs in a worker process: perft(depth) of the position after one root move
+    returns (nodes, seconds, worker process id)
+    """
+    nodes, seconds = run_perft(fen, depth)
+    return nodes, seconds, os.getpid()
+
+
+def parallel_divide(fen, depth, workers=None):
+    """
+    perft(depth) where every root move's subtree is counted in a process pool with workers processes
+    (all cores when workers is None or 0), each task gets the position after the root move as a FEN string
+    returns ({move name: nodes}, {worker process id: (subtrees, nodes, busy seconds)}, wall clock seconds)
+    """
+    game_state = GameState.from_fen(fen)
+    start = time.perf_counter()
+    tasks = {}
+    for starting_square, ending_square, promotion in game_state.get_legal_moves_with_promotions():
+        game_state.move_piece(starting_square, ending_square, promotion)
+        tasks[game_state.move_name(starting_square, ending_square, promotion)] = game_state.to_fen()
+        game_state.undo_move()
+
+    _divide = {}
+    worker_stats = {}
+    if depth <= 1:
+        # nothing to split, every root move is one node
+        return {move_name: 1 for move_name in tasks}, worker_stats, time.perf_counter() - start
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = {executor.submit(_perft_subtree, subtree_fen, depth - 1): move_name
+                   for move_name, subtree_fen in tasks.items()}
+        for future in as_completed(futures):
+            nodes, seconds, pid = future.result()
+            _divide[futures[future]] = nodes
+            subtrees, worker_nodes, busy_seconds = worker_stats.get(pid, (0, 0, 0.0))
+            worker_stats[pid] = (subtrees + 1, worker_nodes + nodes, busy_seconds + seconds)
+    return _divide, worker_stats, time.perf_counter() - start
+
+
+def subtree_stats(worker_stats):
+    """
+    returns the {pid: (subtrees, nodes, seconds)} of parallel_divide as {pid: WorkerStats} to print them
+    """
+    return {pid: WorkerStats("subtrees {:>3}".format(subtrees), nodes, seconds)
+            for pid, (subtrees, nodes, seconds) in worker_stats.items()}
+
+
+def run_suite(positions, max_depth, workers=None):
+    """
+    runs every position from depth 1 to max_depth (or as deep as its known counts go) and prints a line per run
+    with workers, the runs go through parallel_divide and the throughput of every worker is printed too
+    returns the number of mismatches
+    """
+    mismatches = 0
+    total_nodes = 0
+    total_seconds = 0.0
+    for name, fen, expected_counts in positions:
+        for depth in range(1, min(max_depth, len(expected_counts)) + 1):
+            worker_stats = {}
+            if workers is None:
+                nodes, seconds = run_perft(fen, depth)
+            else:
+                _divide, worker_stats, seconds = parallel_divide(fen, depth, workers)
+                nodes = sum(_divide.values())
+            expected = expected_counts[depth - 1]
+            total_nodes += nodes
+            total_seconds += seconds
+            if nodes != expected:
+                mismatches += 1
+            print("{:<10} depth {}  nodes {:>10}  expected {:>10}  {:>8.2f}s  {:>10,.0f} nodes/s  {}".format(
+                name, depth, nodes, expected, seconds, nodes_per_second(nodes, seconds),
+                "ok" if nodes == expected else "MISMATCH"))
+            print_worker_stats(subtree_stats(worker_stats))
+    print("total nodes {}  {:.2f}s  {:,.0f} nodes/s  {} mismatch(es)".format(
+        total_nodes, total_seconds, nodes_per_second(total_nodes, total_seconds), mismatches))
+    return mismatches
+
+
+def print_divide(fen, depth, workers=None):
+    """
+    prints the perft(depth - 1) count after every root move and the total
+    """
+    worker_stats = {}
+    if workers is None:
+        game_state = GameState.from_fen(fen)
+        start = time.perf_counter()
+        _divide = game_state.divide(depth)
+        seconds = time.perf_counter() - start
+    else:
+        _divide, worker_stats, seconds = parallel_divide(fen, depth, workers)
+    for move_name in sorted(_divide):
+        print("{}: {}".format(move_name, _divide[move_name]))
+    nodes = sum(_divide.values())
+    print("moves {}  nodes {}  {:.2f}s  {:,.0f} nodes/s".format(len(_divide), nodes, seconds,
+                                                                 nodes_per_second(nodes, seconds)))
+    print_worker_stats(subtree_stats(worker_stats))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run perft on the standard positions and check the node counts")
+    parser.add_argument("--depth", type=int, default=3, help="deepest depth to run (default 3)")
+    parser.add_argument("--position", choices=[name for name, _, _ in POSITIONS], help="only run this position")
+    parser.add_argument("--fen", help="position to divide instead of a named one (only with --divide)")
+    parser.add_argument("--divide", action="store_true", help="print the count per root move at --depth")
+    parser.add_argument("--workers", type=int, help="split the root moves across this many processes (0 for all cores)")
+    args = parser.parse_args(argv)
+
+    positions = [position for position in POSITIONS if args.position in (None, position[0])]
+    if args.divide:
+        print_divide(args.fen or positions[0][1], args.depth, args.workers)
+        return 0
+    return 1 if run_suite(positions, args.depth, args.workers) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
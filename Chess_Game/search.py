@@ -0,0 +1,336 @@
+"""
+This module contains the search of the computer opponent, run it from the command line to analyse a position
+or to let the engine play itself
+Facilitates the following:
+- Negamax with alpha-beta pruning, making and undoing the moves on one GameState with move_piece and undo_move
+- A quiescence search at the leaves that keeps playing captures, so a position isn't evaluated in the middle of
+  an exchange, captures that lose material (GameState.static_exchange) are left out
+- Iterative deepening, every iteration searches the principal variation of the one before it first,
+  which makes the cutoffs come early
+- Stopping on a node or time budget, the answer is the deepest iteration that got far enough
+- The principal variation (the line both sides are expected to play) and the depth, nodes, time and
+  nodes per second of every iteration
+
+Note: scores are in centipawns from the point of view of the player to move, a mate is MATE_SCORE minus the
+      number of plies (half moves) it takes
+
+Usage: python search.py [--fen FEN] [--depth 64] [--time 5] [--nodes N] [--play MOVES] [--hash 16]
+"""
+
+import argparse
+import sys
+import time
+from collections import namedtuple
+
+from chess_engine import GameState
+from enums import Player, GameStatus
+from move_ordering import MoveOrdering
+from throughput import nodes_per_second
+from transposition import TranspositionTable, DEFAULT_SIZE_MB, EXACT, LOWER_BOUND, UPPER_BOUND
+
+MATE_SCORE = 100000
+INFINITY = MATE_SCORE + 1
+MAX_DEPTH = 64
+# how many nodes are searched between two looks at the clock
+CHECK_EVERY = 1024
+
+# best move as (starting square, ending square, promotion), its score, the depth of the iteration it came from,
+# the principal variation as a list of moves, and the nodes and seconds of the whole search
+SearchResult = namedtuple("SearchResult", ["move", "score", "depth", "pv", "nodes", "seconds"])
+
+
+def evaluate(game_state):
+    """
+    returns the evaluation (GameState.evaluate) in centipawns from the point of view of the player to move
+    """
+    score = game_state.evaluate()
+    return score if game_state.white_turn else -score
+
+
+def is_mate_score(score):
+    return abs(score) > MATE_SCORE - MAX_DEPTH * 2
+
+
+def score_to_table(score, ply):
+    """
+    returns the score to store in the transposition table, mate scores count the plies from the stored position
+    instead of from the root, so they stay right when the position is reached at another ply
+    """
+    if is_mate_score(score):
+        return score + ply if score > 0 else score - ply
+    return score
+
+
+def score_from_table(score, ply):
+    if is_mate_score(score):
+        return score - ply if score > 0 else score + ply
+    return score
+
+
+class Search:
+    """
+    Searches the positions of one GameState, the moves are made on it and undone again so it is left the way
+    it was found
+    the transposition table and the move ordering (killers and history) can be shared by the searches of a game,
+    so a search starts from what the last one found out
+    stop_event (a threading or multiprocessing Event) stops the search from the outside once it is set
+    """
+
+    def __init__(self, game_state, table=None, ordering=None, stop_event=None):
+        self.game_state = game_state
+        self.stop_event = stop_event
+        self.table = TranspositionTable() if table is None else table
+        self.ordering = MoveOrdering(MAX_DEPTH + 1) if ordering is None else ordering
+        self.nodes = 0
+        self._deadline = None
+        self._max_nodes = None
+        self._next_check = CHECK_EVERY
+        self._stopped = False
+        # _pv[ply] is the best line found from that ply of the current iteration
+        self._pv = [[] for _ in range(MAX_DEPTH + 1)]
+        # the principal variation of the last iteration, followed move by move while _follow_pv is set
+        self._previous_pv = []
+        self._follow_pv = False
+
+    def search(self, max_depth=MAX_DEPTH, max_nodes=None, max_time=None, info=None, start_depth=1):
+        """
+        searches the position one ply deeper each iteration from start_depth until max_depth, or until max_nodes
+        nodes have been searched or max_time seconds have passed
+        info is called with the SearchResult of every finished iteration (print_info prints it)
+        returns the SearchResult of the deepest iteration, its move is None when the game is over
+        """
+        start = time.perf_counter()
+        self.nodes = 0
+        self._deadline = None if max_time is None else start + max_time
+        self._max_nodes = max_nodes
+        self._next_check = CHECK_EVERY
+        self._stopped = False
+        self._previous_pv = []
+        self.table.new_search()
+        self.ordering.new_search()
+
+        result = SearchResult(None, self._game_over_score(0), 0, [], 0, 0.0)
+        if self.game_state.game_status() != GameStatus.ONGOING:
+            return result
+        for depth in range(min(start_depth, max_depth, MAX_DEPTH), min(max_depth, MAX_DEPTH) + 1):
+            self._follow_pv = True
+            score = self._negamax(depth, 0, -INFINITY, INFINITY)
+            pv = list(self._pv[0])
+            if self._stopped and not pv:
+                break  # not even the first root move was searched, the last iteration stays the answer
+            # a stopped iteration only counts when it has a best move, the previous best move is searched first
+            # so it is at least as good as the last finished iteration's move
+            result = SearchResult(pv[0], score, depth, pv, self.nodes, time.perf_counter() - start)
+            if self._stopped:
+                break
+            if info is not None:
+                info(result)
+            self._previous_pv = pv
+            if is_mate_score(score):
+                break  # a deeper search can't find a shorter mate
+        return result._replace(nodes=self.nodes, seconds=time.perf_counter() - start)
+
+    @property
+    def stopped(self):
+        """
+        True when the last search ran out of its budget or was stopped, and didn't get to its max_depth
+        """
+        return self._stopped
+
+    def _out_of_budget(self):
+        """
+        looks at the clock, the node count and the stop event every CHECK_EVERY nodes, the search unwinds once it
+        returns True
+        """
+        self._next_check = self.nodes + CHECK_EVERY
+        if (self._max_nodes is not None and self.nodes >= self._max_nodes) or \
+                (self._deadline is not None and time.perf_counter() >= self._deadline) or \
+                (self.stop_event is not None and self.stop_event.is_set()):
+            self._stopped = True
+        return self._stopped
+
+    def _game_over_score(self, ply):
+        """
+        the score of a position without legal moves: mated, or 0 for a stalemate
+        """
+        player = Player.PLAYER_WHITE if self.game_state.white_turn else Player.PLAYER_BLACK
+        if self.game_state.is_in_check(player):
+            return -MATE_SCORE + ply
+        return 0
+
+    def _ordered_moves(self, ply, hash_move):
+        """
+        returns the legal moves best first (see MoveOrdering.moves)
+        while the search is still following the last principal variation, that line's move comes first of all,
+        otherwise the best move the transposition table has for the position does
+        """
+        first_move = hash_move
+        if self._follow_pv:
+            if ply < len(self._previous_pv) and self.game_state.is_legal_move(*self._previous_pv[ply][:2]):
+                first_move = self._previous_pv[ply]
+            else:
+                self._follow_pv = False
+        return self.ordering.moves(self.game_state, ply, first_move)
+
+    def _negamax(self, depth, ply, alpha, beta):
+        """
+        returns the score of the position searched depth plies deep, in the window alpha to beta
+        a score at or above beta is a cutoff, the opponent won't allow the position
+        """
+        self._pv[ply] = []
+        self.nodes += 1
+        if self.nodes >= self._next_check and self._out_of_budget():
+            return 0
+        if depth == 0 or ply >= MAX_DEPTH:
+            return self._quiescence(ply, alpha, beta)
+
+        game_state = self.game_state
+        key = game_state.position_key()
+        hash_move = None
+        entry = self.table.probe(key)
+        if entry is not None:
+            entry_depth, bound, score, hash_move = entry
+            # the root always searches, it has to come up with a move and its principal variation
+            if ply and entry_depth >= depth:
+                score = score_from_table(score, ply)
+                if bound == EXACT or (bound == LOWER_BOUND and score >= beta) or \
+                        (bound == UPPER_BOUND and score <= alpha):
+                    return score
+
+        original_alpha = alpha
+        best_move = None
+        has_move = False
+        for move in self._ordered_moves(ply, hash_move):
+            has_move = True
+            game_state.move_piece(*move)
+            score = -self._negamax(depth - 1, ply + 1, -beta, -alpha)
+            game_state.undo_move()
+            self._follow_pv = False  # only the first move of a node continues the last principal variation
+            if self._stopped:
+                return alpha
+            if score > alpha:
+                alpha = score
+                best_move = move
+                self._pv[ply] = [move] + self._pv[ply + 1]
+                if alpha >= beta:
+                    self.ordering.add_cutoff(game_state, move, depth, ply)
+                    break
+        if not has_move:
+            return self._game_over_score(ply)
+        if alpha >= beta:
+            bound = LOWER_BOUND
+        elif alpha > original_alpha:
+            bound = EXACT
+        else:
+            bound = UPPER_BOUND
+        self.table.store(key, depth, bound, score_to_table(alpha, ply), best_move)
+        return alpha
+
+    def _quiescence(self, ply, alpha, beta):
+        """
+        returns the score of the position once the captures on the board have played out
+        the player to move can stand pat (take the evaluation and stop capturing), in check every legal move is
+        searched because standing pat isn't an option
+        """
+        game_state = self.game_state
+        if ply >= MAX_DEPTH:
+            return evaluate(game_state)
+        player = Player.PLAYER_WHITE if game_state.white_turn else Player.PLAYER_BLACK
+        in_check = game_state.is_in_check(player)
+        if in_check:
+            moves = game_state.iter_legal_moves()
+        else:
+            stand_pat = evaluate(game_state)
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+            moves = self.ordering.captures(game_state)
+
+        has_move = False
+        for move in moves:
+            has_move = True
+            game_state.move_piece(*move)
+            self.nodes += 1
+            if self.nodes >= self._next_check:
+                self._out_of_budget()
+            score = -self._quiescence(ply + 1, -beta, -alpha)
+            game_state.undo_move()
+            if self._stopped:
+                return alpha
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+        if in_check and not has_move:
+            return -MATE_SCORE + ply
+        return alpha
+
+
+def print_info(game_state, result):
+    """
+    prints one line per iteration: depth, score, nodes, time, nodes per second and the principal variation
+    in coordinate notation (e.g. 'e2e4'), game_state has to be the searched position
+    """
+    print("depth {:>2}  score {:>7}  nodes {:>9}  {:>7.2f}s  {:>8,.0f} nodes/s  pv {}".format(
+        result.depth, result.score, result.nodes, result.seconds, nodes_per_second(result.nodes, result.seconds),
+        " ".join(game_state.move_name(*move) for move in result.pv)))
+
+
+def print_table_stats(table):
+    print("hash probes {}  hits {} ({:.1%})  collisions {}  stores {}  replaced {}  full {}/1000".format(
+        table.probes, table.hits, table.hit_rate(), table.collisions, table.stores, table.replaced,
+        table.hashfull()))
+
+
+def play(game_state, moves, max_depth=MAX_DEPTH, max_nodes=None, max_time=None, table=None):
+    """
+    lets the engine play both sides for up to moves half moves, or until the game is over, every search
+    shares the transposition table
+    prints every move with its score and search statistics, returns the final GameStatus
+    """
+    search = Search(game_state, table)  # the killers and history are kept from move to move too
+    for _ in range(moves):
+        result = search.search(max_depth, max_nodes, max_time)
+        if result.move is None:
+            break
+        print("{:>3}. {:<6} score {:>7}  depth {:>2}  nodes {:>9}  {:>7.2f}s  {:>8,.0f} nodes/s".format(
+            game_state.get_move_count() + 1, game_state.move_name(*result.move), result.score, result.depth,
+            result.nodes, result.seconds, nodes_per_second(result.nodes, result.seconds)))
+        game_state.move_piece(*result.move)
+    print(game_state.to_fen())
+    print_table_stats(search.table)
+    return game_state.game_status()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search a position with the engine or let it play itself")
+    parser.add_argument("--fen", help="position to search (default the starting position)")
+    parser.add_argument("--depth", type=int, default=MAX_DEPTH, help="deepest iteration to search")
+    parser.add_argument("--time", type=float, help="seconds to search for (per move with --play)")
+    parser.add_argument("--nodes", type=int, help="nodes to search (per move with --play)")
+    parser.add_argument("--play", type=int, help="play this many half moves against itself")
+    parser.add_argument("--hash", type=float, default=DEFAULT_SIZE_MB, help="transposition table size in MB")
+    args = parser.parse_args(argv)
+    if args.time is None and args.nodes is None and args.depth == MAX_DEPTH:
+        args.time = 5.0
+
+    game_state = GameState.from_fen(args.fen) if args.fen else GameState('w')
+    table = TranspositionTable(args.hash)
+    if args.play:
+        play(game_state, args.play, args.depth, args.nodes, args.time, table)
+        return 0
+
+    result = Search(game_state, table).search(args.depth, args.nodes, args.time,
+                                              lambda iteration: print_info(game_state, iteration))
+    print_table_stats(table)
+    if result.move is None:
+        print("no legal moves")
+        return 0
+    print("bestmove {}  nodes {}  {:.2f}s  {:,.0f} nodes/s".format(
+        game_state.move_name(*result.move), result.nodes, result.seconds,
+        nodes_per_second(result.nodes, result.seconds)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,28 @@
 import unittest
+import types
 import sys
 sys.path.insert(0, '..')  # need to add parent directory for chess_engine to be visible
 import settings
 from chess_gui import *
 from chess_engine import *
+import attack_tables
+import magic
+import zobrist
+import perft
+import move_encoding
+import search
+import transposition
+import move_ordering
+import evaluation
+import lazy_smp
+import mcts
+import batch_playouts
+import batch_evaluation
+import move_cache
+import random
+from array import array
+
+import numpy as np
 
 
 class TestChessGame(unittest.TestCase):
@@ -36,6 +55,464 @@ class TestChessGame(unittest.TestCase):
     def test_check_for_check(self):
         self.assertIsInstance(self.__game_state.check_for_check((7, 4), Player.PLAYER_WHITE), list)
 
+    def test_bitboards_follow_board(self):
+        # play a few moves (including a capture) and undo one, the bitboards must always describe self.board
+        for start, end in [((6, 4), (4, 4)), ((1, 3), (3, 3)), ((4, 4), (3, 3)), ((0, 3), (3, 3))]:
+            self.__game_state.move_piece(start, end)
+        self.__game_state.undo_move()
+        self.assertEqual(bin(self.__game_state.occupied).count("1"), 31)
+        for row in range(8):
+            for col in range(8):
+                piece = self.__game_state.get_piece(row, col)
+                bit = 1 << (row * 8 + col)
+                for index in range(len(Player.PIECES)):
+                    expected = piece != Player.EMPTY and piece.get_piece_index() == index
+                    self.assertEqual(bool(self.__game_state.bitboards[index] & bit), expected)
+                self.assertEqual(self.__game_state.is_valid_piece(row, col), piece != Player.EMPTY)
+
+    def test_attack_tables(self):
+        self.assertEqual(sorted(attack_tables.KNIGHT_TARGETS[0]), [(1, 2), (2, 1)])  # corner knight
+        self.assertEqual(len(attack_tables.KING_TARGETS[27]), 8)
+        # rays are ordered from the closest square outwards
+        self.assertEqual(attack_tables.RAYS[0][8], (8, 16, 24, 32, 40, 48, 56))
+        # a rook on (7, 0) in the starting position is boxed in by the pawn above and the knight to its right
+        self.assertEqual(attack_tables.rook_attacks(56, self.__game_state.occupied), (1 << 48) | (1 << 57))
+
+    def test_magic_lookups_match_rays(self):
+        rng = random.Random(0)
+        for _ in range(500):
+            square = rng.randrange(64)
+            occupied = rng.getrandbits(64) & rng.getrandbits(64)
+            self.assertEqual(magic.rook_attacks(square, occupied), attack_tables.rook_attacks(square, occupied))
+            self.assertEqual(magic.bishop_attacks(square, occupied), attack_tables.bishop_attacks(square, occupied))
+
+    def test_queen_moves(self):
+        for start, end in [((6, 4), (4, 4)), ((1, 4), (3, 4))]:
+            self.__game_state.move_piece(start, end)
+        # the queen on (7, 3) can now leave through the diagonal the e-pawn opened
+        self.assertEqual(sorted(self.__game_state.get_valid_moves((7, 3))),
+                         [(3, 7), (4, 6), (5, 5), (6, 4)])
+
+    def play(self, moves):
+        for start, end in moves:
+            self.__game_state.move_piece(start, end)
+
+    def test_en_passant(self):
+        # e4, a6, e5, d5 - the pawn on e5 can take the d-pawn on d6 as it passes
+        self.play([((6, 4), (4, 4)), ((1, 0), (2, 0)), ((4, 4), (3, 4)), ((1, 3), (3, 3))])
+        self.assertIn((2, 3), self.__game_state.get_valid_moves((3, 4)))
+        self.__game_state.move_piece((3, 4), (2, 3))
+        self.assertEqual(self.__game_state.get_piece(3, 3), Player.EMPTY)
+        self.__game_state.undo_move()
+        self.assertIsInstance(self.__game_state.get_piece(3, 3), Pawn)
+        self.assertEqual(self.__game_state.en_passant_square, (2, 3))
+
+    def test_own_en_passant_square(self):
+        # after e4 the skipped e3 is only black's to take, the white pawns beside it can't capture onto it
+        self.play([((6, 4), (4, 4))])
+        self.assertCountEqual(self.__game_state.get_valid_moves((6, 3)), [(5, 3), (4, 3)])
+        self.assertCountEqual(self.__game_state.get_valid_moves((6, 5)), [(5, 5), (4, 5)])
+        self.assertNotIn((5, 4), [move[1] for move in self.__game_state.get_all_legal_moves(Player.PLAYER_WHITE)])
+
+    def test_castling_and_undo(self):
+        # e4, a6, Nf3, a5, Bc4, h6 - white can castle to the right
+        self.play([((6, 4), (4, 4)), ((1, 0), (2, 0)), ((7, 6), (5, 5)), ((2, 0), (3, 0)),
+                   ((7, 5), (4, 2)), ((1, 7), (2, 7))])
+        self.assertIn((7, 6), self.__game_state.get_valid_moves((7, 4)))
+        self.__game_state.move_piece((7, 4), (7, 6))
+        self.assertIsInstance(self.__game_state.get_piece(7, 5), Rook)
+        self.assertEqual(self.__game_state.white_king_can_castle, [False, True, False])
+        self.__game_state.undo_move()
+        self.assertIsInstance(self.__game_state.get_piece(7, 7), Rook)
+        self.assertEqual(self.__game_state.white_king_can_castle, [True, True, True])
+
+    def test_pinned_piece_moves_along_pin(self):
+        # e4, e5, Nf3, d6, Bb5+, c6 - the pawn blocking on c6 is pinned to the king, it can only take the bishop
+        self.play([((6, 4), (4, 4)), ((1, 4), (3, 4)), ((7, 6), (5, 5)), ((1, 3), (2, 3)),
+                   ((7, 5), (3, 1)), ((1, 2), (2, 2)), ((7, 3), (6, 4))])
+        self.assertEqual(self.__game_state.check_for_check((0, 4), Player.PLAYER_BLACK)[1], [(2, 2)])
+        self.assertEqual(self.__game_state.get_valid_moves((2, 2)), [(3, 1)])
+
+    def test_attack_maps_follow_moves(self):
+        self.play([((6, 5), (5, 5)), ((1, 4), (3, 4)), ((6, 6), (4, 6)), ((0, 3), (4, 7))])  # fool's mate
+        self.assertTrue(self.__game_state.is_in_check(Player.PLAYER_WHITE))
+        self.assertFalse(self.__game_state.is_in_check(Player.PLAYER_BLACK))
+        self.__game_state.undo_move()
+        # the incrementally kept attack maps must match the ones computed from scratch after moves and undos
+        rng = random.Random(5)
+        for _ in range(40):
+            player = Player.PLAYER_WHITE if self.__game_state.whose_turn() else Player.PLAYER_BLACK
+            moves = self.__game_state.get_all_legal_moves(player)
+            if not moves:
+                break
+            self.play([rng.choice(moves)])
+            if rng.random() < 0.25:
+                self.__game_state.undo_move()
+            for player in (Player.PLAYER_WHITE, Player.PLAYER_BLACK):
+                self.assertEqual(self.__game_state.get_attack_map(player),
+                                 self.__game_state.get_attacked_squares(player))
+
+    def test_position_key(self):
+        start_key = self.__game_state.position_key()
+        self.assertEqual(start_key, zobrist.compute_key(self.__game_state))
+        # the knights go out and come back, it is the same position again
+        self.play([((7, 6), (5, 5)), ((0, 6), (2, 5)), ((5, 5), (7, 6)), ((2, 5), (0, 6))])
+        self.assertEqual(self.__game_state.position_key(), start_key)
+        # the rook goes out and comes back, but white lost the right to castle on that side
+        self.play([((7, 6), (5, 5)), ((0, 6), (2, 5)), ((7, 7), (7, 6)), ((2, 5), (0, 6)), ((7, 6), (7, 7)),
+                   ((0, 6), (2, 5)), ((5, 5), (7, 6)), ((2, 5), (0, 6))])
+        self.assertNotEqual(self.__game_state.position_key(), start_key)
+        rng = random.Random(6)
+        for _ in range(60):
+            player = Player.PLAYER_WHITE if self.__game_state.whose_turn() else Player.PLAYER_BLACK
+            moves = self.__game_state.get_all_legal_moves(player)
+            if not moves:
+                break
+            self.play([rng.choice(moves)])
+            if rng.random() < 0.25:
+                self.__game_state.undo_move()
+            self.assertEqual(self.__game_state.position_key(), zobrist.compute_key(self.__game_state))
+        while self.__game_state.move_log:
+            self.__game_state.undo_move()
+        self.assertEqual(self.__game_state.position_key(), start_key)
+
+    def test_packed_move_log(self):
+        # e4, d5, exd5 - the taken pawn goes on white's captives and comes back on undo
+        self.play([((6, 4), (4, 4)), ((1, 3), (3, 3))])
+        taken_pawn = self.__game_state.get_piece(3, 3)
+        self.play([((4, 4), (3, 3))])
+        self.assertEqual(self.__game_state.move_log.itemsize, 2)
+        move = self.__game_state.move_log[-1]
+        self.assertEqual(move_encoding.starting_square(move), (4, 4))
+        self.assertEqual(move_encoding.ending_square(move), (3, 3))
+        self.assertTrue(move_encoding.is_capture(move))
+        self.assertEqual(move_encoding.flags(self.__game_state.move_log[0]), move_encoding.DOUBLE_PUSH)
+        self.assertEqual(self.__game_state.white_captives, [taken_pawn])
+        self.assertEqual(self.__game_state.undo_move(), move)
+        self.assertIs(self.__game_state.get_piece(3, 3), taken_pawn)
+        self.assertEqual(self.__game_state.white_captives, [])
+        state = move_encoding.encode_undo_state([True, False, True], [False, True, False], (2, 3))
+        self.assertEqual(move_encoding.decode_undo_state(state), ([True, False, True], [False, True, False], (2, 3)))
+        self.assertEqual(move_encoding.promotion(move_encoding.encode_move((1, 1), (0, 1),
+                                                                           move_encoding.promotion_flags("n"))), "n")
+
+    def test_fen_keeps_packed_logs(self):
+        # a loaded position starts with empty packed logs, also when it replaces a game with moves
+        game_state = GameState.from_fen(perft.POSITIONS[1][1])
+        self.assertEqual((game_state.move_log, game_state._undo_log), (array('H'), array('H')))
+        game_state.move_piece((6, 0), (5, 0))
+        game_state.move_piece((1, 0), (2, 0))
+        game_state.load_fen(perft.POSITIONS[0][1])
+        self.assertEqual((game_state.move_log, game_state._undo_log), (array('H'), array('H')))
+        game_state.move_piece((6, 4), (4, 4))
+        self.assertEqual((len(game_state.move_log), len(game_state._undo_log)), (1, 1))
+        self.assertEqual(game_state.move_log.typecode, 'H')
+
+    def test_pieces_use_slots(self):
+        for row in (0, 1, 6, 7):
+            for col in range(8):
+                self.assertFalse(hasattr(self.__game_state.get_piece(row, col), "__dict__"))
+
+    def test_fen(self):
+        self.assertEqual(self.__game_state.to_fen(), "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+        self.play([((6, 4), (4, 4))])
+        self.assertEqual(self.__game_state.to_fen(), "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1")
+        for _, fen, _ in perft.POSITIONS:
+            game_state = GameState.from_fen(fen)
+            self.assertEqual(game_state.to_fen().split()[:4], fen.split()[:4])
+            self.assertEqual(game_state.position_key(), zobrist.compute_key(game_state))
+
+    def test_perft(self):
+        self.assertEqual(self.__game_state.perft(3), 8902)
+        for _, fen, expected_counts in perft.POSITIONS[1:]:
+            self.assertEqual(GameState.from_fen(fen).perft(2), expected_counts[1])
+        # every piece the pawn can promote to is a move of its own, and can be chosen without being asked
+        game_state = GameState.from_fen("4k3/1P6/8/8/8/8/8/4K3 w - - 0 1")
+        self.assertEqual(sorted(move for move in game_state.divide(1) if move.startswith("b7")),
+                         ["b7b8b", "b7b8n", "b7b8q", "b7b8r"])
+        game_state.move_piece((1, 1), (0, 1), promotion="n")
+        self.assertIsInstance(game_state.get_piece(0, 1), Knight)
+
+    def test_parallel_perft(self):
+        fen = perft.POSITIONS[1][1]
+        _divide, worker_stats, _ = perft.parallel_divide(fen, 2, workers=2)
+        self.assertEqual(_divide, GameState.from_fen(fen).divide(2))
+        self.assertEqual(sum(nodes for _, nodes, _ in worker_stats.values()), 2039)
+        self.assertEqual(sum(subtrees for subtrees, _, _ in worker_stats.values()), 48)
+
+    def test_iter_legal_moves(self):
+        game_state = GameState.from_fen(perft.POSITIONS[1][1])
+        moves = list(game_state.iter_legal_moves())
+        self.assertEqual(len(moves), 48)
+        is_capture = [game_state.get_piece(*end) != Player.EMPTY for _, end, _ in moves]
+        self.assertEqual(is_capture, sorted(is_capture, reverse=True))  # all captures come first
+        self.assertTrue(is_capture[0])
+        self.assertTrue(game_state.is_legal_move((7, 4), (7, 6)))  # castling
+        self.assertFalse(game_state.is_legal_move((7, 4), (5, 4)))
+        # the pawn on (3, 3) can take the pawn on (2, 4) or move forward, the capture comes first
+        self.assertEqual(list(game_state.get_piece(3, 3).iter_moves(game_state)), [(2, 4), (2, 3)])
+
+    def test_piece_lists_and_king_location(self):
+        self.assertEqual(len(self.__game_state.get_pieces(Player.PLAYER_WHITE)), 16)
+        self.assertEqual(self.__game_state.get_white_king_location(), (7, 4))
+        # e4, d5, exd5, then the black king steps up
+        self.play([((6, 4), (4, 4)), ((1, 3), (3, 3)), ((4, 4), (3, 3)), ((0, 4), (1, 3))])
+        self.assertEqual(len(self.__game_state.get_pieces(Player.PLAYER_BLACK)), 15)
+        self.assertEqual(self.__game_state.get_black_king_location(), (1, 3))
+        self.__game_state.undo_move()
+        self.assertEqual(self.__game_state.get_black_king_location(), (0, 4))
+        self.assertEqual(GameState('b').get_white_king_location(), (7, 4))
+
+    def test_one_orientation(self):
+        # the color at the bottom only changes how the GUI draws the board, the engine sees the same position
+        white_bottom = GameState('w')
+        black_bottom = GameState('b')
+        self.assertEqual(black_bottom.to_fen(), white_bottom.to_fen())
+        self.assertEqual(black_bottom.position_key(), white_bottom.position_key())
+        for game_state in (white_bottom, black_bottom):
+            game_state.move_piece((6, 4), (4, 4))
+            game_state.move_piece((1, 4), (3, 4))
+        self.assertEqual(black_bottom.position_key(), white_bottom.position_key())
+        self.assertEqual(sorted(black_bottom.get_all_legal_moves(Player.PLAYER_WHITE)),
+                         sorted(white_bottom.get_all_legal_moves(Player.PLAYER_WHITE)))
+
+    def test_check_evasions(self):
+        # the bishop checks along the diagonal, the knight can step in front of it on c3 or d2
+        game_state = GameState.from_fen("4k3/8/8/8/1b6/8/8/RN2K3 w - - 0 1")
+        self.assertEqual(sorted(game_state.get_all_legal_moves(Player.PLAYER_WHITE)),
+                         [((7, 1), (5, 2)), ((7, 1), (6, 3)), ((7, 4), (6, 4)), ((7, 4), (6, 5)), ((7, 4), (7, 3)),
+                          ((7, 4), (7, 5))])
+        # double check from the knight and the rook, the queen could block the rook but only the king can move
+        game_state = GameState.from_fen("4k3/8/8/8/8/5n2/3Q4/r3K3 w - - 0 1")
+        self.assertEqual(sorted(game_state.get_all_legal_moves(Player.PLAYER_WHITE)),
+                         [((7, 4), (6, 4)), ((7, 4), (6, 5))])
+
+    def test_game_status(self):
+        self.assertEqual(self.__game_state.checkmate_stalemate_checker(), GameStatus.ONGOING)
+        self.play([((6, 5), (5, 5)), ((1, 4), (3, 4)), ((6, 6), (4, 6)), ((0, 3), (4, 7))])  # fool's mate
+        self.assertEqual(self.__game_state.game_status(), GameStatus.BLACK_WON)
+        self.assertTrue(self.__game_state.checkmate)
+        self.__game_state.undo_move()
+        self.assertEqual(self.__game_state.game_status(), GameStatus.ONGOING)
+        # black's king has nowhere to go but isn't in check, black has no other pieces
+        stalemate = GameState.from_fen("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")
+        self.assertEqual(stalemate.game_status(), GameStatus.STALEMATE)
+        self.assertTrue(stalemate.stalemate)
+
+    def test_search(self):
+        # the rook mates on the back rank
+        game_state = GameState.from_fen("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+        fen = game_state.to_fen()
+        result = search.Search(game_state).search(max_depth=3)
+        self.assertEqual(result.move, ((7, 0), (0, 0), None))
+        self.assertEqual(result.score, search.MATE_SCORE - 1)
+        self.assertEqual(result.pv, [result.move])
+        self.assertEqual(game_state.to_fen(), fen)  # every move was undone
+        # the black queen hangs, the node budget stops the search but it still has a move
+        game_state = GameState.from_fen("4k3/8/8/3q4/8/8/3R4/4K3 w - - 0 1")
+        result = search.Search(game_state).search(max_nodes=3000)
+        self.assertEqual(result.move, ((6, 3), (3, 3), None))
+        self.assertLess(result.nodes, 3000 + search.CHECK_EVERY)
+        self.assertEqual(result.pv[0], result.move)
+        self.assertIsNone(search.Search(GameState.from_fen("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")).search().move)
+
+    def test_transposition_table(self):
+        table = transposition.TranspositionTable(1)
+        self.assertEqual(table.size * transposition.ENTRY_BYTES, 1 << 20)
+        key = self.__game_state.position_key()
+        self.assertIsNone(table.probe(key))
+        table.store(key, 4, transposition.EXACT, -35, ((6, 4), (4, 4), None))
+        self.assertEqual(table.probe(key), (4, transposition.EXACT, -35, ((6, 4), (4, 4), None)))
+        # two more positions in the same bucket: the deeper entry stays, the shallower ones share the other slot
+        other = key ^ (1 << 40)
+        table.store(other, 2, transposition.LOWER_BOUND, 100, ((1, 1), (0, 0), "q"))
+        self.assertEqual(table.probe(other), (2, transposition.LOWER_BOUND, 100, ((1, 1), (0, 0), "q")))
+        table.store(other ^ (1 << 41), 1, transposition.UPPER_BOUND, 0, None)
+        self.assertIsNone(table.probe(other))
+        self.assertEqual(table.probe(key)[0], 4)
+        self.assertEqual((table.hits, table.collisions, table.replaced), (3, 1, 1))
+        # the table lets the second search of a position skip most of the work
+        game_state = GameState.from_fen(perft.POSITIONS[1][1])
+        first = search.Search(game_state, table).search(max_depth=3)
+        second = search.Search(game_state, table).search(max_depth=3)
+        self.assertEqual(second.move, first.move)
+        self.assertLess(second.nodes, first.nodes)
+
+    def test_move_ordering(self):
+        # the white pawn on e4 can take the queen on d5 or the knight on f5, the rook can take the queen too
+        game_state = GameState.from_fen("4k3/8/8/3q1n2/4P3/8/8/3RK3 w - - 0 1")
+        ordering = move_ordering.MoveOrdering()
+        moves = list(ordering.moves(game_state, 0))
+        self.assertEqual(moves[:3], [((4, 4), (3, 3), None), ((7, 3), (3, 3), None), ((4, 4), (3, 5), None)])
+        self.assertEqual(sorted(moves), sorted(game_state.iter_legal_moves()))
+        # the first move is searched before the others, a quiet move that cut off comes right after the captures
+        self.assertEqual(next(ordering.moves(game_state, 0, ((7, 4), (7, 5), None))), ((7, 4), (7, 5), None))
+        # a move of the other side's piece (a table move of another position) is never searched
+        self.assertFalse(game_state.is_legal_move((3, 3), (4, 3)))
+        self.assertNotIn(((3, 3), (4, 3), None), list(ordering.moves(game_state, 0, ((3, 3), (4, 3), None))))
+        ordering.add_cutoff(game_state, ((7, 3), (7, 0), None), 3, 2)
+        self.assertEqual(ordering.killers[2][0], ((7, 3), (7, 0), None))
+        self.assertEqual(list(ordering.moves(game_state, 2))[3], ((7, 3), (7, 0), None))
+        self.assertEqual(ordering.history[0][59 * 64 + 56], 9)
+        ordering.add_cutoff(game_state, ((4, 4), (3, 3), None), 3, 2)  # captures are ordered without killers
+        self.assertEqual(ordering.killers[2][1], None)
+
+    def test_static_exchange(self):
+        # the rook takes a pawn that is defended by nothing
+        game_state = GameState.from_fen("1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1")
+        self.assertEqual(game_state.static_exchange((3, 4)), 100)
+        # the knight takes a pawn defended by a knight and a bishop, with the rook and queen behind it
+        game_state = GameState.from_fen("1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1")
+        self.assertEqual(game_state.static_exchange((3, 4), (5, 3)), 100 - 320)
+        self.assertEqual(game_state.static_exchange((3, 4)), 0)  # better not to take at all
+        self.assertEqual(self.__game_state.static_exchange((4, 4)), 0)  # nothing there and nothing attacks it
+        # the pawn defended by the pawn is poisoned, only the quiescence search sees the queen being taken back
+        game_state = GameState.from_fen("4k3/8/3p4/4p3/8/8/4Q3/4K3 w - - 0 1")
+        self.assertEqual(list(move_ordering.MoveOrdering().captures(game_state)), [])
+        self.assertNotEqual(search.Search(game_state).search(max_depth=1).move, ((6, 4), (3, 4), None))
+
+    def test_evaluation(self):
+        self.assertEqual(self.__game_state.evaluate(), 0)  # black's tables mirror white's
+        self.assertEqual(self.__game_state._phase, evaluation.TOTAL_PHASE)
+        self.assertEqual(len(evaluation.MIDDLEGAME), len(Player.PIECES))
+        # the running totals must match the ones computed from scratch through captures, castling,
+        # promotions and undos
+        game_state = GameState.from_fen(perft.POSITIONS[3][1])
+        start = game_state.evaluate()
+        rng = random.Random(7)
+        for _ in range(60):
+            moves = game_state.get_legal_moves_with_promotions()
+            if not moves:
+                break
+            game_state.move_piece(*rng.choice(moves))
+            if rng.random() < 0.25:
+                game_state.undo_move()
+            scores = evaluation.compute_scores(game_state)
+            self.assertEqual((game_state._middlegame_score, game_state._endgame_score, game_state._phase), scores)
+            self.assertEqual(game_state.evaluate(), evaluation.taper(*scores))
+        while game_state.move_log:
+            game_state.undo_move()
+        self.assertEqual(game_state.evaluate(), start)
+
+    def test_lazy_smp(self):
+        # a slot written half by one process and half by another doesn't match any key
+        table = transposition.SharedTranspositionTable(1)
+        other = transposition.SharedTranspositionTable(1, name=table.name)
+        key = self.__game_state.position_key()
+        other.store(key, 3, transposition.EXACT, 12, ((6, 4), (4, 4), None))
+        self.assertEqual(table.probe(key), (3, transposition.EXACT, 12, ((6, 4), (4, 4), None)))
+        slot = (key & table._mask) * transposition.BUCKET_SIZE
+        table._entries[slot] ^= 1 << 16
+        self.assertIsNone(other.probe(key))
+        other.close()
+        table.close()
+        # the workers find the back rank mate and every worker's nodes are counted
+        game_state = GameState.from_fen("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+        with lazy_smp.LazySMP(workers=2, hash_mb=1) as parallel_search:
+            result = parallel_search.search(game_state, max_depth=3)
+            self.assertEqual(result.move, ((7, 0), (0, 0), None))
+            self.assertEqual(result.score, search.MATE_SCORE - 1)
+            self.assertEqual(result.nodes, sum(stats[1] for stats in parallel_search.worker_stats.values()))
+            self.assertEqual(len(parallel_search.worker_stats), 2)
+        # a worker that can't read the position makes the search raise instead of waiting for its result,
+        # the FEN is what the worker gets whatever the start method of its process
+        with lazy_smp.LazySMP(workers=2, hash_mb=1) as parallel_search:
+            with self.assertRaisesRegex(RuntimeError, "(?s)search worker 0 failed:.*KeyError"):
+                parallel_search.search(types.SimpleNamespace(to_fen=lambda: "invalid"), max_depth=3)
+            self.assertEqual(parallel_search.worker_stats, {})
+
+    def test_mcts(self):
+        # the playouts find the back rank mate, on a worker process as well
+        game_state = GameState.from_fen("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+        fen = game_state.to_fen()
+        with mcts.MCTS(workers=1, batch_size=16, seed=1) as player:
+            result = player.search(game_state, max_playouts=400)
+        self.assertEqual(result.move, ((7, 0), (0, 0), None))
+        self.assertEqual(result.playouts, 400)
+        self.assertEqual(game_state.to_fen(), fen)
+        # with a batch of one the mate is soon the only leaf selected, a batch with nothing to play out
+        with mcts.MCTS(workers=1, batch_size=1, seed=1) as player:
+            result = player.search(game_state, max_playouts=300)
+        self.assertEqual(result.move, ((7, 0), (0, 0), None))
+        self.assertEqual(result.playouts, 300)
+        # the tree below the position after both players moved is kept for the next search
+        with mcts.MCTS(seed=1, policy=mcts.capture_policy, in_process=True) as player:
+            player.search(self.__game_state, max_playouts=200)
+            self.__game_state.move_piece(*player.root.most_visited_child().move)
+            answer = player.root.most_visited_child().most_visited_child()
+            self.__game_state.move_piece(*answer.move)
+            visits = answer.visits
+            result = player.search(self.__game_state, max_playouts=50)
+            self.assertIs(player.root, answer)
+            self.assertEqual(player.root.visits, visits + 50)
+            self.assertIn(result.move, self.__game_state.get_legal_moves_with_promotions())
+
+    def test_batch_playouts(self):
+        # the batch finds the same moves as the game state, castling, en passant and promotions included
+        fens = [position[1] for position in perft.POSITIONS] + ["8/8/8/2k5/3Pp3/8/8/4K3 b - d3 0 1"]
+        batch = batch_playouts.BoardBatch.from_fens(fens)
+        for index, fen in enumerate(fens):
+            self.assertEqual(batch.fen(index), fen)
+            self.assertEqual(sorted(map(str, batch.move_list(index))),
+                             sorted(map(str, GameState.from_fen(fen).get_legal_moves_with_promotions())))
+        # every game moves until it is over, and the positions convert back to game states
+        batch = batch_playouts.BoardBatch.from_fens(["6k1/5ppp/8/8/8/8/5PPP/R5K1 b - - 0 1",
+                                                     "R5k1/5ppp/8/8/8/8/5PPP/6K1 b - - 0 1", batch_playouts.START_FEN])
+        self.assertEqual(batch.step(np.random.default_rng(1)), 2)
+        self.assertEqual(list(batch.status), [GameStatus.ONGOING, GameStatus.WHITE_WON, GameStatus.ONGOING])
+        batch.play(20, np.random.default_rng(1))
+        for index, game_state in enumerate(batch.to_game_states()):
+            self.assertEqual(game_state.to_fen().split()[:4], batch.fen(index).split()[:4])
+            self.assertEqual(game_state.game_status(), batch.status[index])
+
+    def test_batch_evaluation(self):
+        # the tensor of a game state is the board of a batch, and the piece-square part is GameState.evaluate
+        game_states = [GameState.from_fen(position[1]) for position in perft.POSITIONS]
+        boards = batch_evaluation.stack_boards(game_states)
+        self.assertTrue((boards == batch_playouts.BoardBatch.from_fens(
+            [position[1] for position in perft.POSITIONS]).board).all())
+        self.assertEqual(batch_evaluation.taper(*batch_evaluation.piece_square_scores(boards)).tolist(),
+                         [game_state.evaluate() for game_state in game_states])
+        # the starting position is even, the colours swapped and mirrored is the same position for the other side
+        scores = batch_evaluation.evaluate_batch(boards, chunk_size=4)
+        self.assertEqual(scores.dtype, np.float64)
+        self.assertEqual(batch_evaluation.evaluate_batch(boards[:1])[0], 0.0)
+        mirrored = -boards.reshape(-1, 8, 8)[:, ::-1]
+        # up to a centipawn apart for each of the two tapers, the floor division rounds both colours down
+        self.assertLessEqual(np.abs(batch_evaluation.evaluate_batch(mirrored) + scores).max(), 2)
+        # a pawn shield in front of the king counts, a knight shut in by its own pieces can't move
+        self.assertEqual(batch_evaluation.king_safety(boards[:1])[0], 0)
+        shield = batch_evaluation.stack_boards([GameState.from_fen("6k1/8/8/8/8/8/5PPP/6K1 w - - 0 1")])
+        self.assertEqual(batch_evaluation.king_safety(shield)[0], 3 * batch_evaluation.SHIELD_BONUS)
+        self.assertEqual(batch_evaluation.mobility(batch_evaluation.stack_boards(
+            [GameState.from_fen("4k3/8/8/8/8/1PP5/PPPP4/NB2K3 w - - 0 1")]))[0], 0)
+
+    def test_move_cache(self):
+        cache = move_cache.MoveCache(capacity=2)
+        self.assertCountEqual(cache.get_valid_moves(self.__game_state, (6, 4)), [(5, 4), (4, 4)])
+        self.assertEqual(cache.game_status(self.__game_state), GameStatus.ONGOING)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # undoing a move comes back to the cached position, the same position by other moves is a hit too
+        self.play([((6, 4), (4, 4)), ((1, 4), (3, 4))])
+        self.assertIsNone(cache.get_valid_moves(self.__game_state, (4, 3)))
+        self.__game_state.undo_move()
+        self.__game_state.undo_move()
+        self.assertCountEqual(cache.get_valid_moves(self.__game_state, (7, 6)), [(5, 5), (5, 7)])
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+        self.play([((7, 6), (5, 5)), ((0, 6), (2, 5)), ((5, 5), (7, 6)), ((2, 5), (0, 6))])
+        self.assertEqual(cache.game_status(self.__game_state), GameStatus.ONGOING)
+        self.assertEqual((cache.hits, cache.misses), (3, 2))
+        # the least recently used position makes room for a new one
+        self.assertEqual(len(cache), 2)
+        self.play([((6, 5), (5, 5)), ((1, 4), (3, 4)), ((6, 6), (4, 6)), ((0, 3), (4, 7))])
+        self.assertEqual(cache.game_status(self.__game_state), GameStatus.BLACK_WON)
+        self.assertEqual((len(cache), cache.evictions), (2, 1))
+        self.assertEqual(cache.hit_rate(), 3 / 6)
+        # a game state that gets its status from the cache knows it is checkmate too
+        mated = GameState.from_fen(self.__game_state.to_fen())
+        self.assertEqual(cache.game_status(mated), GameStatus.BLACK_WON)
+        self.assertEqual((cache.hits, mated.checkmate, mated.stalemate), (4, True, False))
+
     def test_handle_white_castling(self):
         king = King("k", 7, 4, Player.PLAYER_WHITE)
         self.assertIsNone(self.__game_state.handle_white_castling(king, Player.EMPTY, (7, 4), (7, 2)))
@@ -0,0 +1,26 @@
+"""
+This module contains the throughput reporting shared by the command line tools (perft, search, lazy_smp, mcts)
+Facilitates the following:
+- Nodes per second of a run (or playouts per second, anything counted over some seconds)
+- Printing one line per worker process of a parallel run: what it did, its nodes, seconds and nodes per second
+
+Note: every tool keeps its worker statistics in its own shape and turns them into WorkerStats to print them
+"""
+
+from collections import namedtuple
+
+# what the worker did as text (like "subtrees  12" or "depth  7"), the nodes it counted and the seconds it took
+WorkerStats = namedtuple("WorkerStats", ["work", "nodes", "seconds"])
+
+
+def nodes_per_second(nodes, seconds):
+    return nodes / seconds if seconds > 0 else float("inf")
+
+
+def print_worker_stats(worker_stats):
+    """
+    prints a line for every worker of {worker: WorkerStats}, in the order of the workers
+    """
+    for worker, stats in sorted(worker_stats.items()):
+        print("  worker {:>7}  {}  nodes {:>10}  {:>8.2f}s  {:>10,.0f} nodes/s".format(
+            worker, stats.work, stats.nodes, stats.seconds, nodes_per_second(stats.nodes, stats.seconds)))
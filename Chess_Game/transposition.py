@@ -0,0 +1,213 @@
+"""
+This module contains the transposition table of the search, a fixed size hash table of searched positions
+Facilitates the following:
+- Remembering the depth, bound type, score and best move of a position under its Zobrist key
+  (GameState.position_key), so a position reached again through other moves doesn't have to be searched again
+- Keeping the memory use fixed: the table is two preallocated arrays of 64-bit integers sized in MB
+- Two entries per bucket, one kept for the deepest search (until a new search starts) and one always replaced
+- Counting probes, hits, collisions and stores
+- Sharing one table between the processes of a parallel search (SharedTranspositionTable), without locks
+
+Note: every entry is a packed integer and the key XOR that integer, the packed integer holds in bits 0-15 the
+      best move (see move_encoding, 0 for none), bits 16-39 the score plus SCORE_OFFSET, bits 40-47 the depth,
+      bits 48-49 the bound and bits 50-55 the search it was stored in, an empty slot is 0 (the score offset
+      keeps a stored entry from being 0)
+"""
+
+from array import array
+from multiprocessing import shared_memory
+
+import move_encoding
+
+# what the score of an entry is: the exact score, at least the score (a cutoff) or at most the score
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+ENTRY_BYTES = 16  # 8 for the key and 8 for the packed entry
+BUCKET_SIZE = 2  # a depth-preferred slot and an always-replace slot
+SCORE_OFFSET = 1 << 23
+DEFAULT_SIZE_MB = 16
+
+
+def pack_move(move):
+    """
+    returns the 16-bit move (see move_encoding) of a (starting square, ending square, promotion) move, 0 for None
+    """
+    if move is None:
+        return 0
+    starting_square, ending_square, promotion = move
+    flags = move_encoding.promotion_flags(promotion) if promotion else move_encoding.QUIET
+    return move_encoding.encode_move(starting_square, ending_square, flags)
+
+
+def unpack_move(packed):
+    """
+    returns the (starting square, ending square, promotion) move of pack_move, None for 0
+    """
+    if packed == 0:
+        return None
+    return move_encoding.starting_square(packed), move_encoding.ending_square(packed), \
+        move_encoding.promotion(packed)
+
+
+def _buckets(size_mb):
+    """
+    returns the number of buckets of a table of size_mb, the largest power of 2 that fits (at least 1)
+    """
+    buckets = 1
+    while buckets * 2 * BUCKET_SIZE * ENTRY_BYTES <= size_mb * (1 << 20):
+        buckets *= 2
+    return buckets
+
+
+class TranspositionTable:
+    """
+    A hash table of searched positions with a fixed number of buckets (a power of 2 that fits in size_mb)
+    the bucket of a position is picked by the low bits of its key, the whole key is kept to tell positions apart
+    """
+
+    def __init__(self, size_mb=DEFAULT_SIZE_MB):
+        buckets = _buckets(size_mb)
+        self._mask = buckets - 1
+        self.size = buckets * BUCKET_SIZE  # number of entries
+        # _keys[index] holds the key XOR the entry, see probe
+        self._keys = array('Q', bytes(8 * self.size))
+        self._entries = array('Q', bytes(8 * self.size))
+        self._age = 0
+        self.probes = 0
+        self.hits = 0
+        self.collisions = 0  # probes of a bucket that only held other positions
+        self.stores = 0
+        self.replaced = 0  # stores that overwrote another position
+
+    @property
+    def age(self):
+        """
+        the number of the current search (0 to 63), stored with every entry
+        """
+        return self._age
+
+    def new_search(self):
+        """
+        starts a new search, the depth-preferred entries of older searches can be replaced by any depth
+        """
+        self._age = (self._age + 1) & 63
+
+    def clear(self):
+        self._keys = array('Q', bytes(8 * self.size))
+        self._entries = array('Q', bytes(8 * self.size))
+        self.probes = self.hits = self.collisions = self.stores = self.replaced = 0
+
+    def _stored_key(self, index):
+        """
+        returns the key of the position in the slot, None when the slot is empty
+        """
+        entry = self._entries[index]
+        return self._keys[index] ^ entry if entry else None
+
+    def probe(self, key):
+        """
+        returns (depth, bound, score, best move) stored for the key, or None when the position isn't in the table
+        the key is stored XORed with the entry, so an entry only matches when both halves were written together,
+        a slot half overwritten by another process (see SharedTranspositionTable) is a miss and not a wrong move
+        """
+        self.probes += 1
+        slot = (key & self._mask) * BUCKET_SIZE
+        keys = self._keys
+        entries = self._entries
+        for index in (slot, slot + 1):
+            entry = entries[index]
+            if entry and keys[index] ^ entry == key:
+                self.hits += 1
+                return (entry >> 40 & 0xFF, entry >> 48 & 3, (entry >> 16 & 0xFFFFFF) - SCORE_OFFSET,
+                        unpack_move(entry & 0xFFFF))
+        if entries[slot] or entries[slot + 1]:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, bound, score, move):
+        """
+        stores the result of searching the position depth plies deep
+        the depth-preferred slot takes it when it holds the same position, a shallower one or one from an older
+        search, otherwise it goes into the always-replace slot
+        """
+        self.stores += 1
+        slot = (key & self._mask) * BUCKET_SIZE
+        keys = self._keys
+        entries = self._entries
+        deepest = entries[slot]
+        deepest_key = self._stored_key(slot)
+        if self._stored_key(slot + 1) == key:
+            index = slot + 1
+        elif deepest_key == key or deepest == 0 or deepest >> 50 != self._age or depth >= deepest >> 40 & 0xFF:
+            if deepest and deepest_key != key:
+                # the entry moving out of the depth-preferred slot is worth more than the always-replace one
+                if entries[slot + 1]:
+                    self.replaced += 1
+                keys[slot + 1], entries[slot + 1] = keys[slot], deepest
+            index = slot
+        else:
+            index = slot + 1
+            if entries[index]:
+                self.replaced += 1
+        packed = pack_move(move)
+        if packed == 0 and self._stored_key(index) == key:
+            packed = entries[index] & 0xFFFF  # keep the best move of an earlier search of the position
+        entry = packed | (score + SCORE_OFFSET) << 16 | min(depth, 0xFF) << 40 | bound << 48 | self._age << 50
+        keys[index] = key ^ entry
+        entries[index] = entry
+
+    def hashfull(self):
+        """
+        returns how full the table is in per mille, counted over the first 1000 entries like UCI engines do
+        """
+        sample = min(1000, self.size)
+        return sum(1 for index in range(sample) if self._entries[index]) * 1000 // sample
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """
+    A TranspositionTable in a multiprocessing.shared_memory block, so the searches of several processes share
+    what they found out
+    the process that creates it (name None) owns the block and unlinks it, the others attach to it by name,
+    the statistics are counted by every process on its own
+    nothing is locked: processes write a slot's two words one after the other, and probe only trusts a slot
+    whose words still belong together
+    """
+
+    def __init__(self, size_mb=DEFAULT_SIZE_MB, name=None, age=0):
+        buckets = _buckets(size_mb)
+        self._mask = buckets - 1
+        self.size = buckets * BUCKET_SIZE
+        self._owner = name is None
+        if self._owner:
+            self._memory = shared_memory.SharedMemory(create=True, size=ENTRY_BYTES * self.size)
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+        # the block can be rounded up to whole pages, only the start of it is used
+        self._keys = self._memory.buf[:8 * self.size].cast('Q')
+        self._entries = self._memory.buf[8 * self.size:ENTRY_BYTES * self.size].cast('Q')
+        self._age = age
+        self.probes = self.hits = self.collisions = self.stores = self.replaced = 0
+
+    @property
+    def name(self):
+        return self._memory.name
+
+    def clear(self):
+        self._memory.buf[:ENTRY_BYTES * self.size] = bytes(ENTRY_BYTES * self.size)
+        self.probes = self.hits = self.collisions = self.stores = self.replaced = 0
+
+    def close(self):
+        """
+        detaches from the block, the owner frees it too
+        """
+        self._keys.release()
+        self._entries.release()
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
@@ -0,0 +1,56 @@
+"""
+This module contains the random keys used for Zobrist hashing of positions
+Facilitates the following:
+- One 64-bit key per piece (entry of Player.PIECES) and square, for the side to move,
+  for each of the 6 castling flags and for the column of the en passant square
+- Computing the key of a position from scratch, GameState keeps its own key up to date move by move
+
+Note: a position's key is the XOR of the keys of everything in it, so adding or removing something
+      from the position is a single XOR and doing it twice puts the key back
+"""
+
+import random
+from enums import Player
+
+ZOBRIST_SEED = 2021
+
+_random = random.Random(ZOBRIST_SEED)
+# PIECE_KEYS[piece index][square]
+PIECE_KEYS = [[_random.getrandbits(64) for _ in range(64)] for _ in range(len(Player.PIECES))]
+# mixed in when black is to move
+BLACK_TO_MOVE_KEY = _random.getrandbits(64)
+# CASTLING_KEYS[player][i] goes with GameState.white_king_can_castle[i] / black_king_can_castle[i]
+CASTLING_KEYS = {Player.PLAYER_WHITE: [_random.getrandbits(64) for _ in range(3)],
+                 Player.PLAYER_BLACK: [_random.getrandbits(64) for _ in range(3)]}
+# EN_PASSANT_KEYS[col], the row of the en passant square always follows from the side to move
+EN_PASSANT_KEYS = [_random.getrandbits(64) for _ in range(8)]
+
+
+def castling_key(player, rights):
+    """
+    returns the key of the player's castling rights, rights is the player's list of 3 flags
+    """
+    key = 0
+    for flag, flag_key in zip(rights, CASTLING_KEYS[player]):
+        if flag:
+            key ^= flag_key
+    return key
+
+
+def compute_key(game_state):
+    """
+    returns the key of the game state's position computed from scratch
+    """
+    key = 0
+    for row in range(8):
+        for col in range(8):
+            piece = game_state.get_piece(row, col)
+            if piece != Player.EMPTY:
+                key ^= PIECE_KEYS[piece.get_piece_index()][row * 8 + col]
+    if not game_state.whose_turn():
+        key ^= BLACK_TO_MOVE_KEY
+    key ^= castling_key(Player.PLAYER_WHITE, game_state.white_king_can_castle)
+    key ^= castling_key(Player.PLAYER_BLACK, game_state.black_king_can_castle)
+    if game_state.en_passant_square is not None:
+        key ^= EN_PASSANT_KEYS[game_state.en_passant_square[1]]
+    return key